@@ -3,6 +3,9 @@ Example of how can invoke a tool for testing how it works.
 
 The tools you can test are:
 execute_terminal_command
+get_background_job_status
+tail_background_job_output
+cancel_background_job
 run_julia_code
 run_julia_linter
 get_working_directory
@@ -10,8 +13,10 @@ list_files_in_directory
 read_from_file
 write_to_file
 grep_search
+keyword_search
 retrieve_function_documentation
 retrieve_jutuldarcy_examples
+search_documentation
 
 We use the grep_search as an example here.
 
@@ -0,0 +1,23 @@
+"""
+Command line entry point, installed as `jutulgpt`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Optional
+
+from jutulgpt.rag.index_cli import add_index_parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="jutulgpt")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_index_parser(subparsers)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
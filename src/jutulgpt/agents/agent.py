@@ -11,14 +11,17 @@ from langgraph.prebuilt import ToolNode
 
 from jutulgpt.agents.agent_base import BaseAgent
 from jutulgpt.configuration import BaseConfiguration, cli_mode, mcp_mode
+from jutulgpt.julia import prefetch_function_documentation_for_code
 from jutulgpt.nodes import check_code
 from jutulgpt.state import MCPInputState, MCPOutputState, State
 from jutulgpt.tools import (
     grep_search,
+    keyword_search,
     list_files_in_directory,
     read_from_file,
     retrieve_function_documentation,
     retrieve_jutuldarcy_examples,
+    search_documentation,
     write_to_file,
 )
 from jutulgpt.utils import get_code_from_response
@@ -140,6 +143,10 @@ class Agent(BaseAgent):
 
         code_block = get_code_from_response(response=response.content)
 
+        # Warm the documentation cache for the functions used, in case the code check fails
+        if not code_block.is_empty():
+            prefetch_function_documentation_for_code(code_block.get_full_code())
+
         return {"messages": [response], "code_block": code_block, "error": False}
 
     def finalize(self, state: State, config: RunnableConfig):
@@ -159,8 +166,10 @@ agent = Agent(
         read_from_file,
         write_to_file,
         grep_search,
+        keyword_search,
         retrieve_function_documentation,
         retrieve_jutuldarcy_examples,
+        search_documentation,
     ],
     print_chat_output=True,
 )
@@ -13,15 +13,20 @@ from jutulgpt.agents.agent_base import BaseAgent
 from jutulgpt.configuration import BaseConfiguration, cli_mode, mcp_mode
 from jutulgpt.state import MCPInputState, MCPOutputState, State
 from jutulgpt.tools import (
+    cancel_background_job,
     execute_terminal_command,
+    get_background_job_status,
     get_working_directory,
     grep_search,
+    keyword_search,
     list_files_in_directory,
     read_from_file,
     retrieve_function_documentation,
     retrieve_jutuldarcy_examples,
     run_julia_code,
     run_julia_linter,
+    search_documentation,
+    tail_background_job_output,
     write_to_file,
 )
 from jutulgpt.utils import get_code_from_response
@@ -140,6 +145,9 @@ class AutonomousAgent(BaseAgent):
 autonomous_agent = AutonomousAgent(
     tools=[
         execute_terminal_command,
+        get_background_job_status,
+        tail_background_job_output,
+        cancel_background_job,
         run_julia_code,
         run_julia_linter,
         get_working_directory,
@@ -147,8 +155,10 @@ autonomous_agent = AutonomousAgent(
         read_from_file,
         write_to_file,
         grep_search,
+        keyword_search,
         retrieve_function_documentation,
         retrieve_jutuldarcy_examples,
+        search_documentation,
     ],
     print_chat_output=True,
 )
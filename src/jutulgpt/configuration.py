@@ -112,8 +112,64 @@ class BaseConfiguration:
         metadata={"description": "The vector store provider to use for retrieval."},
     )
 
+    allow_index_build_at_query_time: bool = field(
+        default=False,
+        metadata={
+            "description": "Build missing indexes and sync changed sources when a tool first searches them. Otherwise the indexes must be built with `jutulgpt index build`."
+        },
+    )
+
+    faiss_index_factory: str = field(
+        default="Flat",
+        metadata={
+            "description": "The FAISS index type, as a FAISS index factory string. F.ex. `Flat` (exact search), `HNSW32` (graph-based search) or `IVF256,PQ16` (clustered, compressed vectors). Indexes needing training are trained on the corpus."
+        },
+    )
+
+    faiss_search_params: dict[str, Any] = field(
+        default_factory=lambda: {},
+        metadata={
+            "description": "Query-time parameters of the FAISS index, f.ex. `{'efSearch': 64}` for HNSW or `{'nprobe': 8}` for IVF indexes."
+        },
+    )
+
+    faiss_mmap: bool = field(
+        default=False,
+        metadata={
+            "description": "Memory map the saved FAISS index and documents read-only, instead of reading them into memory. Processes on the same host then share the pages, and loading is nearly instant."
+        },
+    )
+
+    embedding_batch_tokens: int = field(
+        default=8000,
+        metadata={
+            "description": "Maximum number of tokens in each batch of chunks sent to the embedding model when building an index."
+        },
+    )
+
+    embedding_max_concurrency: int = field(
+        default=4,
+        metadata={
+            "description": "Maximum number of concurrent requests to the embedding model when building an index. Reduced automatically on rate limits."
+        },
+    )
+
+    local_embedding_batch_size: int = field(
+        default=32,
+        metadata={
+            "description": "Number of texts embedded at a time by a local embedding model (`local:<model directory>`)."
+        },
+    )
+
+    local_embedding_threads: int = field(
+        default=0,
+        metadata={
+            "description": "Number of CPU threads used by a local embedding model, or 0 for the default of the backend."
+        },
+    )
+
     examples_search_type: Annotated[
-        Literal["similarity", "mmr", "similarity_score_threshold"],
+        Literal["similarity", "mmr", "similarity_score_threshold", "hybrid"],
         {"__template_metadata__": {"kind": "reranker"}},
     ] = field(
         default="mmr",
@@ -129,6 +185,41 @@ class BaseConfiguration:
         },
     )
 
+    hybrid_dense_weight: float = field(
+        default=1.0,
+        metadata={
+            "description": "Weight of the dense vector search in the reciprocal rank fusion of the hybrid search type."
+        },
+    )
+
+    hybrid_lexical_weight: float = field(
+        default=1.0,
+        metadata={
+            "description": "Weight of the lexical BM25 search in the reciprocal rank fusion of the hybrid search type."
+        },
+    )
+
+    hybrid_rrf_k: int = field(
+        default=60,
+        metadata={
+            "description": "Rank constant of the reciprocal rank fusion. Larger values give the lower ranked chunks relatively more weight."
+        },
+    )
+
+    retrieval_token_budget: int = field(
+        default=3000,
+        metadata={
+            "description": "Maximum number of tokens of retrieved chunks returned by a retrieval tool. Chunks are added best first, and the last one is trimmed at a block boundary if needed."
+        },
+    )
+
+    semantic_cache_threshold: float = field(
+        default=0.95,
+        metadata={
+            "description": "Cosine similarity above which a query reuses the retrieved examples of an earlier query. Set above 1 to disable the cache."
+        },
+    )
+
     rerank_provider: Annotated[
         Literal["None", "flash"],
         {"__template_metadata__": {"kind": "reranker"}},
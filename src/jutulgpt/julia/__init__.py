@@ -1,9 +1,18 @@
 from jutulgpt.julia.get_function_documentation import (
+    get_cached_function_documentation,
     get_function_documentation,
     get_function_documentation_from_list_of_funcs,
+    prefetch_function_documentation,
+    prefetch_function_documentation_for_code,
 )
 from jutulgpt.julia.get_linting_result import get_linting_result
 from jutulgpt.julia.julia_code_runner import get_error_message, run_code
+from jutulgpt.julia.symbol_index import (
+    find_package_functions,
+    format_symbol_suggestions,
+    get_symbol_index,
+    get_symbol_suggestions_for_error,
+)
 
 __all__ = [
     "run_code",
@@ -11,4 +20,11 @@ __all__ = [
     "get_function_documentation_from_list_of_funcs",
     "get_linting_result",
     "get_function_documentation",
+    "get_cached_function_documentation",
+    "prefetch_function_documentation",
+    "prefetch_function_documentation_for_code",
+    "find_package_functions",
+    "get_symbol_index",
+    "format_symbol_suggestions",
+    "get_symbol_suggestions_for_error",
 ]
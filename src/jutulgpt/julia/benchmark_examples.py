@@ -0,0 +1,355 @@
+"""
+Benchmark for running the shipped JutulDarcy and Fimbul examples.
+
+Every example script is run through the same path as the generated code, i.e. with
+plotting removed and simulations shortened, and executed with `julia -e` in the Julia
+project. The examples are run in parallel, and the per-example timings are written to a
+JSON and a CSV report. This is used as a baseline when changing how Julia code is
+executed, and as a health check of the Julia environment.
+
+Run from the project root by
+
+```bash
+uv run python -m jutulgpt.julia.benchmark_examples --workers 4
+```
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from jutulgpt.cli import colorscheme, print_to_console
+from jutulgpt.julia.julia_code_runner import _split_stacktrace, julia_command
+from jutulgpt.rag.retriever_specs import RETRIEVER_SPECS
+from jutulgpt.utils import get_code_from_response, remove_plotting, shorter_simulations
+
+# Printed between the package imports and the rest of the example, to separate the load time from the run time.
+LOADED_MARKER = "JUTULGPT_BENCHMARK_PACKAGES_LOADED"
+
+EXAMPLE_DIRS = {
+    "jutuldarcy": RETRIEVER_SPECS["jutuldarcy"]["examples"].dir_path,
+    "fimbul": RETRIEVER_SPECS["fimbul"]["examples"].dir_path,
+}
+
+
+@dataclass
+class ExampleResult:
+    """Timings and outcome of running a single example."""
+
+    name: str
+    path: str
+    passed: bool
+    exit_code: Optional[int]
+    timed_out: bool
+    wrote_to_stderr: bool
+    # Seconds until anything was written to stdout or stderr
+    time_to_first_output: Optional[float]
+    load_time: Optional[float]  # Seconds until the packages were loaded
+    run_time: Optional[float]  # Seconds spent after the packages were loaded
+    total_time: float
+    peak_memory_mb: Optional[float]
+    error_message: str = ""
+
+
+def find_examples(name_filter: Optional[str] = None) -> list[tuple[str, str]]:
+    """
+    Find all example scripts, sorted by name.
+
+    Returns:
+        list[tuple[str, str]]: Tuples of (name, path), where the name is on the form `package/relative/path.jl`.
+    """
+    examples = []
+    for package, dir_path in EXAMPLE_DIRS.items():
+        for path in sorted(Path(dir_path).rglob("*.jl")):
+            name = f"{package}/{path.relative_to(dir_path).as_posix()}"
+            if name_filter and name_filter not in name:
+                continue
+            examples.append((name, str(path)))
+    return examples
+
+
+def prepare_example_code(code: str) -> str:
+    """
+    Remove plotting and shorten the simulations, and print a marker once the packages are loaded.
+    """
+    code = remove_plotting(code)
+    code = shorter_simulations(code)
+
+    code_block = get_code_from_response(code, within_julia_context=False)
+    return (
+        f"{code_block.imports}\n"
+        f'println("{LOADED_MARKER}"); flush(stdout)\n'
+        f"{code_block.code}\n"
+    )
+
+
+def _peak_child_memory_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def run_example(
+    name: str, path: str, project_dir: str, timeout: float
+) -> ExampleResult:
+    """
+    Run a single example and record its timings.
+
+    NOTE: The peak memory is read from the resource usage of the child processes, so each
+    worker process should only run a single example.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        code = prepare_example_code(f.read())
+
+    start_time = time.time()
+    first_output_time: Optional[float] = None
+    loaded_time: Optional[float] = None
+    stdout_lines: list[str] = []
+    stderr_lines: list[str] = []
+    lock = threading.Lock()
+
+    process = subprocess.Popen(
+        julia_command(code, project_dir),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        text=True,
+        cwd=project_dir,
+    )
+
+    def read_stream(stream, lines: list[str]):
+        nonlocal first_output_time, loaded_time
+        for line in stream:
+            now = time.time()
+            with lock:
+                if first_output_time is None:
+                    first_output_time = now
+                if loaded_time is None and line.strip() == LOADED_MARKER:
+                    loaded_time = now
+                    continue
+            lines.append(line)
+
+    readers = [
+        threading.Thread(target=read_stream, args=(process.stdout, stdout_lines)),
+        threading.Thread(target=read_stream, args=(process.stderr, stderr_lines)),
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        process.kill()
+        process.wait()
+    for reader in readers:
+        reader.join()
+    end_time = time.time()
+
+    # NOTE: Unlike the code runner, output on stderr alone is not a failure, as Julia
+    # also writes precompilation progress and warnings there.
+    stderr = "".join(stderr_lines)
+    passed = not timed_out and process.returncode == 0
+    error_message = ""
+    if timed_out:
+        error_message = f"Timed out after {timeout} seconds."
+    elif not passed:
+        error_message, _ = _split_stacktrace(stderr)
+        error_message = error_message or f"Exited with code {process.returncode}."
+
+    return ExampleResult(
+        name=name,
+        path=path,
+        passed=passed,
+        exit_code=None if timed_out else process.returncode,
+        timed_out=timed_out,
+        wrote_to_stderr=bool(stderr.strip()),
+        time_to_first_output=first_output_time - start_time
+        if first_output_time is not None
+        else None,
+        load_time=loaded_time - start_time if loaded_time is not None else None,
+        run_time=end_time - loaded_time if loaded_time is not None else None,
+        total_time=end_time - start_time,
+        peak_memory_mb=_peak_child_memory_mb(),
+        error_message=error_message[:1000],
+    )
+
+
+def run_benchmark(
+    examples: list[tuple[str, str]],
+    project_dir: str,
+    workers: int,
+    timeout: float,
+) -> list[ExampleResult]:
+    """
+    Run the examples in parallel over a process pool. The results are sorted by example name.
+    """
+    results = []
+    # One example per worker process, such that the peak memory is measured per example.
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+        futures = {
+            executor.submit(run_example, name, path, project_dir, timeout): name
+            for name, path in examples
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print_to_console(
+                text=f"`{result.name}` {'passed' if result.passed else 'FAILED'} "
+                f"in {round(result.total_time, 1)} seconds ({len(results)}/{len(examples)})",
+                title="Example benchmark",
+                border_style=colorscheme.success
+                if result.passed
+                else colorscheme.error,
+            )
+    return sorted(results, key=lambda r: r.name)
+
+
+def write_reports(
+    results: list[ExampleResult], output_dir: str, metadata: dict
+) -> tuple[str, str]:
+    """
+    Write the results to a JSON and a CSV report.
+
+    Returns:
+        tuple[str, str]: The paths to the JSON and the CSV report.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stem = f"examples_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    json_path = os.path.join(output_dir, f"{stem}.json")
+    csv_path = os.path.join(output_dir, f"{stem}.csv")
+
+    passed = [r for r in results if r.passed]
+    summary = {
+        "n_examples": len(results),
+        "n_passed": len(passed),
+        "n_failed": len(results) - len(passed),
+        "total_time": sum(r.total_time for r in results),
+    }
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "metadata": metadata,
+                "summary": summary,
+                "results": [asdict(r) for r in results],
+            },
+            f,
+            indent=2,
+        )
+
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[f.name for f in fields(ExampleResult)])
+        writer.writeheader()
+        for result in results:
+            writer.writerow(asdict(result))
+
+    return json_path, csv_path
+
+
+def _julia_version() -> str:
+    try:
+        result = subprocess.run(
+            ["julia", "--version"], capture_output=True, text=True, timeout=30
+        )
+        return result.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run the JutulDarcy and Fimbul examples and report their timings."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(4, os.cpu_count() or 1),
+        help="Number of examples to run in parallel.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=1800,
+        help="Timeout in seconds for each example.",
+    )
+    parser.add_argument(
+        "--filter",
+        default=None,
+        help="Only run the examples with names containing this string, f.ex. `fimbul/` or `validation`.",
+    )
+    parser.add_argument(
+        "--project-dir",
+        default=os.getcwd(),
+        help="The Julia project to run the examples in.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="benchmark_results",
+        help="Directory to write the JSON and CSV reports to.",
+    )
+    args = parser.parse_args(argv)
+
+    examples = find_examples(args.filter)
+    if not examples:
+        print_to_console(
+            text="No examples found.",
+            title="Example benchmark",
+            border_style=colorscheme.error,
+        )
+        return 1
+
+    print_to_console(
+        text=f"Running {len(examples)} examples using {args.workers} workers.",
+        title="Example benchmark",
+        border_style=colorscheme.message,
+    )
+    start_time = time.time()
+    results = run_benchmark(
+        examples,
+        project_dir=os.path.abspath(args.project_dir),
+        workers=args.workers,
+        timeout=args.timeout,
+    )
+    metadata = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "julia_version": _julia_version(),
+        "project_dir": os.path.abspath(args.project_dir),
+        "workers": args.workers,
+        "timeout": args.timeout,
+        "wall_time": time.time() - start_time,
+    }
+    json_path, csv_path = write_reports(results, args.output_dir, metadata)
+
+    n_passed = sum(r.passed for r in results)
+    print_to_console(
+        text=f"{n_passed}/{len(results)} examples passed in "
+        f"{round(metadata['wall_time'], 1)} seconds.\n\n"
+        f"Reports written to `{json_path}` and `{csv_path}`.",
+        title="Example benchmark",
+        border_style=colorscheme.success
+        if n_passed == len(results)
+        else colorscheme.warning,
+    )
+    return 0 if n_passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,8 @@
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Optional
+
 from jutulgpt.cli import colorscheme, print_to_console
 from jutulgpt.julia.julia_code_runner import run_julia_file
 
@@ -33,17 +38,35 @@ def _parse_julia_doc_output(output: str):
     return func_names, documentation
 
 
-def get_function_documentation(code: str) -> tuple[list[str], str]:
+def get_function_documentation(
+    code: str, verbose: bool = True
+) -> tuple[list[str], str]:
     """
     Returns:
         list[str]: A list of function names found in the code.
         str: The documentation string for the functions.
     """
+    result = _run_documentation_lookup(code, verbose=verbose)
+    return result if result is not None else ([], "")
+
 
+def _run_documentation_lookup(
+    code: str, verbose: bool = True
+) -> Optional[tuple[list[str], str]]:
+    """Like `get_function_documentation`, but returns None if the lookup itself failed."""
     try:
         res, err = run_julia_file(
             code=code, julia_file_name="julia_get_function_documentation.jl"
         )
+        if "FUNCTION NAMES:" not in res.splitlines():
+            if verbose:
+                print_to_console(
+                    text="Error retrieving function documentation: "
+                    + (str(err) if err else res),
+                    title="Function Documentation Retriever",
+                    border_style=colorscheme.error,
+                )
+            return None
         func_names, documentation = _parse_julia_doc_output(res)
 
         if func_names:
@@ -56,7 +79,7 @@ def get_function_documentation(code: str) -> tuple[list[str], str]:
             #     title="Function Documentation Retriever",
             #     border_style=colorscheme.success,
             # )
-        else:
+        elif verbose:
             print_to_console(
                 text="No function documentation found!",
                 title="Function Documentation Retriever",
@@ -71,26 +94,133 @@ def get_function_documentation(code: str) -> tuple[list[str], str]:
             title="Function Documentation Retriever",
             border_style=colorscheme.error,
         )
-        return [], ""
+        return None
 
 
 def get_function_documentation_from_list_of_funcs(
     func_names: list[str],
+    verbose: bool = True,
 ) -> tuple[list[str], str]:
     """
     Get function documentation from a list of function names.
 
     Args:
         funcs (list[str]): List of function names to get documentation for.
+        verbose (bool): Whether to print the progress to the console.
 
     Returns:
         tuple[list[str], str]: A tuple containing a list of function names and their documentation.
     """
     code = "\n".join(f"{func_name}();" for func_name in func_names)
 
-    print_to_console(
-        text="Retrieving documentation for functions: " + ", ".join(func_names),
-        title="Function Documentation Retriever",
-        border_style=colorscheme.message,
+    if verbose:
+        print_to_console(
+            text="Retrieving documentation for functions: " + ", ".join(func_names),
+            title="Function Documentation Retriever",
+            border_style=colorscheme.message,
+        )
+    return get_function_documentation(code, verbose=verbose)
+
+
+# Documentation retrieved during this process, keyed by function name. Empty if no documentation was found.
+_documentation_cache: dict[str, str] = {}
+_documentation_lock = threading.Lock()
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="jutulgpt-doc-prefetch"
+)
+_prefetch_futures: list[Future] = []
+
+_DOC_HEADER_PATTERN = re.compile(r"^# Documentation for '([^']+)':$", re.MULTILINE)
+
+
+def _split_documentation(documentation: str) -> dict[str, str]:
+    """
+    Split the documentation from julia_get_function_documentation.jl into the documentation of each function.
+    """
+    headers = list(_DOC_HEADER_PATTERN.finditer(documentation))
+    docs = {}
+    for header, next_header in zip(headers, headers[1:] + [None]):
+        end = next_header.start() if next_header else len(documentation)
+        docs[header.group(1)] = documentation[header.end() : end].strip()
+    return docs
+
+
+def _fetch_missing_documentation(func_names: list[str], verbose: bool) -> None:
+    """Retrieve the documentation of all functions not already cached in a single batched lookup."""
+    with _documentation_lock:
+        missing = [
+            name
+            for name in dict.fromkeys(func_names)
+            if name not in _documentation_cache
+        ]
+    if not missing:
+        return
+
+    if verbose:
+        print_to_console(
+            text="Retrieving documentation for functions: " + ", ".join(missing),
+            title="Function Documentation Retriever",
+            border_style=colorscheme.message,
+        )
+    result = _run_documentation_lookup(
+        "\n".join(f"{name}();" for name in missing), verbose=verbose
     )
-    return get_function_documentation(code)
+    if result is None:
+        # Not cached, such that the functions are looked up again next time
+        return
+    docs = _split_documentation(result[1])
+    with _documentation_lock:
+        for name in missing:
+            _documentation_cache[name] = docs.get(name, "")
+
+
+def prefetch_function_documentation(func_names: list[str]) -> None:
+    """
+    Start retrieving the documentation of the functions in the background.
+    """
+    if func_names:
+        _prefetch_futures.append(
+            _prefetch_executor.submit(_fetch_missing_documentation, func_names, False)
+        )
+
+
+def prefetch_function_documentation_for_code(code: str) -> None:
+    """
+    Start retrieving the documentation of the Jutul and JutulDarcy functions used in the code in the background.
+    """
+    from jutulgpt.julia.symbol_index import find_package_functions
+
+    def prefetch():
+        _fetch_missing_documentation(find_package_functions(code), verbose=False)
+
+    if code.strip():
+        _prefetch_futures.append(_prefetch_executor.submit(prefetch))
+
+
+def get_cached_function_documentation(
+    func_names: list[str], timeout: float = 300
+) -> tuple[list[str], str]:
+    """
+    Get the documentation of the functions, served from the cache where possible. Missing
+    functions are retrieved in a single batched lookup.
+
+    Returns:
+        tuple[list[str], str]: A tuple containing a list of the function names with documentation and the documentation.
+    """
+    # Let the prefetches in progress finish, as they likely cover the same functions
+    pending = [future for future in _prefetch_futures if not future.done()]
+    if pending:
+        wait(pending, timeout=timeout)
+    _prefetch_futures[:] = [future for future in _prefetch_futures if not future.done()]
+
+    _fetch_missing_documentation(func_names, verbose=True)
+
+    found_names = []
+    documentation = ""
+    with _documentation_lock:
+        for name in dict.fromkeys(func_names):
+            doc = _documentation_cache.get(name, "")
+            if doc:
+                found_names.append(name)
+                documentation += f"\n# Documentation for '{name}':\n{doc}\n"
+    return found_names, documentation.strip()
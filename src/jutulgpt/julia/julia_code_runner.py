@@ -47,6 +47,13 @@ def run_julia_file(code: str, julia_file_name: str, project_dir: str | None = No
             pass  # File might already be deleted
 
 
+def julia_command(code: str, project_dir: str) -> list[str]:
+    """
+    The command used for running a string of Julia code in the given project.
+    """
+    return ["julia", f"--project={project_dir}", "-e", code]
+
+
 def run_code_string_direct(code: str, project_dir: str | None = None):
     """
     Alternative approach: Run Julia code directly using -e flag instead of temporary file.
@@ -56,7 +63,7 @@ def run_code_string_direct(code: str, project_dir: str | None = None):
 
     try:
         result = subprocess.run(
-            ["julia", f"--project={project_dir}", "-e", code],
+            julia_command(code, project_dir),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -174,8 +174,8 @@ end;
 function extract_function_names_regex(code_string::String)
     function_names = Set{String}()
 
-    # Pattern to match function calls: identifier followed by opening parenthesis
-    pattern = Regex("\\b([a-zA-Z_][a-zA-Z0-9_]*)\\s*\\(")
+    # Pattern to match function calls: identifier, possibly ending in `!`, followed by opening parenthesis
+    pattern = Regex("\\b([a-zA-Z_][a-zA-Z0-9_]*!?)\\s*\\(")
 
     for match in eachmatch(pattern, code_string)
         func_name = match.captures[1]
@@ -0,0 +1,58 @@
+using Base;
+using Jutul, JutulDarcy;
+
+# Fimbul is optional, so we only include it if it can be loaded
+modules = Module[Jutul, JutulDarcy]
+try
+    @eval using Fimbul
+    push!(modules, Fimbul)
+catch e
+    println(stderr, "Could not load Fimbul: $e")
+end
+
+# Get a one-line signature for an exported symbol
+function get_signature(obj, name::Symbol)
+    if obj isa Function
+        ms = collect(methods(obj))
+        if isempty(ms)
+            return "$name(...)"
+        end
+        # Printed methods look like `f(x, y) @ Module file:line`, so we drop the location
+        sig = first(split(string(first(ms)), " @ "))
+        if length(ms) > 1
+            sig *= " (+$(length(ms) - 1) more methods)"
+        end
+        return sig
+    elseif obj isa Type
+        return "type $name"
+    else
+        return "$name::$(typeof(obj))"
+    end
+end
+
+function get_kind(obj)
+    if obj isa Function
+        return "function"
+    elseif obj isa Type
+        return "type"
+    elseif obj isa Module
+        return "module"
+    end
+    return "constant"
+end
+
+println("SYMBOLS:")
+for mod in modules
+    for name in names(mod)
+        if name == nameof(mod)
+            continue
+        end
+        try
+            obj = getfield(mod, name)
+            sig = replace(get_signature(obj, name), r"\s+" => " ")
+            println(join([string(nameof(mod)), string(name), get_kind(obj), sig], "\t"))
+        catch e
+            # Exported but not defined, skip it
+        end
+    end
+end
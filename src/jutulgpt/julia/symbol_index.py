@@ -0,0 +1,290 @@
+"""
+Fuzzy lookup of the exported symbols in Jutul, JutulDarcy and Fimbul.
+
+The symbols are listed once by running `julia_list_symbols.jl` and cached to disk. Lookups
+then go through a trigram index, such that we can cheaply suggest the closest real names
+when generated code uses a name that does not exist.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from difflib import SequenceMatcher
+from typing import Optional
+
+from jutulgpt.cli import colorscheme, print_to_console
+from jutulgpt.configuration import PROJECT_ROOT
+from jutulgpt.julia.julia_code_runner import run_julia_file
+
+SYMBOL_INDEX_PATH = str(PROJECT_ROOT / "rag" / "loaded_store" / "julia_symbols.json")
+
+# Seconds to wait before listing the symbols again after a failure
+SYMBOL_INDEX_RETRY_SECONDS = 600
+
+# Matches f.ex. "UndefVarError: `foo` not defined" (Julia >= 1.11), "UndefVarError: foo not defined" and
+# the linter's "Missing reference: foo".
+_UNDEFINED_NAME_PATTERNS = [
+    re.compile(r"UndefVarError: `?([^\s`]+?)`? not defined"),
+    re.compile(r"Missing reference:\s*`?([^\s`]+)`?"),
+]
+
+
+@dataclass(frozen=True)
+class JuliaSymbol:
+    module: str
+    name: str
+    kind: str  # "function", "type", "module" or "constant"
+    signature: str
+
+    def format(self) -> str:
+        return f"`{self.signature}` ({self.module})"
+
+
+def _trigrams(name: str) -> set[str]:
+    padded = f"  {name.lower()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SymbolIndex:
+    """Trigram index over symbol names, supporting fuzzy lookups."""
+
+    def __init__(self, symbols: list[JuliaSymbol]):
+        self.symbols = symbols
+        self._by_name: dict[str, list[JuliaSymbol]] = defaultdict(list)
+        for symbol in symbols:
+            self._by_name[symbol.name].append(symbol)
+
+        self._names = list(self._by_name)
+        self._name_trigrams = [_trigrams(name) for name in self._names]
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        for i, trigrams in enumerate(self._name_trigrams):
+            for trigram in trigrams:
+                self._postings[trigram].append(i)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def lookup(self, name: str) -> list[JuliaSymbol]:
+        """Get the symbols with exactly this name."""
+        return self._by_name.get(name, [])
+
+    def suggest(
+        self, name: str, n: int = 5, min_similarity: float = 0.3
+    ) -> list[JuliaSymbol]:
+        """
+        Get the symbols with names most similar to the given name.
+
+        Candidates sharing trigrams with the name are ranked by their trigram similarity,
+        with ties broken by the edit-based similarity of the names.
+        """
+        query_trigrams = _trigrams(name)
+        shared_counts: dict[int, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for i in self._postings.get(trigram, ()):
+                shared_counts[i] += 1
+
+        scored = []
+        for i, shared in shared_counts.items():
+            union = len(query_trigrams) + len(self._name_trigrams[i]) - shared
+            similarity = shared / union
+            if similarity >= min_similarity and self._names[i] != name:
+                scored.append((similarity, i))
+        scored.sort(reverse=True)
+
+        candidates = scored[: 4 * n]
+        candidates.sort(
+            key=lambda c: (
+                c[0]
+                + SequenceMatcher(None, name.lower(), self._names[c[1]].lower()).ratio()
+            ),
+            reverse=True,
+        )
+
+        suggestions = []
+        for _, i in candidates[:n]:
+            suggestions.extend(self._by_name[self._names[i]])
+        return suggestions[:n]
+
+
+def _parse_symbol_output(output: str) -> list[JuliaSymbol]:
+    lines = output.splitlines()
+    try:
+        start = lines.index("SYMBOLS:") + 1
+    except ValueError:
+        return []
+
+    symbols = []
+    for line in lines[start:]:
+        parts = line.split("\t")
+        if len(parts) == 4:
+            symbols.append(JuliaSymbol(*parts))
+    return symbols
+
+
+def julia_environment_fingerprint(project_dir: Optional[str] = None) -> str:
+    """
+    Hash the Project.toml and Manifest.toml of the Julia project the code is run in, such
+    that the cached symbols are listed again when the package versions change.
+    """
+    project_dir = project_dir or os.getcwd()
+    digest = hashlib.sha256()
+    paths = [os.path.join(project_dir, "Project.toml")] + sorted(
+        glob.glob(os.path.join(project_dir, "*Manifest*.toml"))
+    )
+    for path in paths:
+        if os.path.exists(path):
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build_symbol_index(path: str = SYMBOL_INDEX_PATH) -> SymbolIndex:
+    """
+    List the exported symbols using Julia, and cache them to disk together with the
+    fingerprint of the Julia environment.
+    """
+    print_to_console(
+        text="Listing the exported symbols of Jutul, JutulDarcy and Fimbul. This is only done once.",
+        title="Symbol Index",
+        border_style=colorscheme.message,
+    )
+    res, _ = run_julia_file(code="", julia_file_name="julia_list_symbols.jl")
+    symbols = _parse_symbol_output(res)
+
+    if symbols:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "environment": julia_environment_fingerprint(),
+                    "symbols": [asdict(symbol) for symbol in symbols],
+                },
+                f,
+            )
+    else:
+        print_to_console(
+            text="Could not list the exported symbols.",
+            title="Symbol Index",
+            border_style=colorscheme.error,
+        )
+    return SymbolIndex(symbols)
+
+
+def load_symbol_index(path: str = SYMBOL_INDEX_PATH) -> Optional[SymbolIndex]:
+    """Load the cached symbols. Returns None if missing, or listed for other package versions."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        cached = json.load(f)
+    if (
+        not isinstance(cached, dict)
+        or cached.get("environment") != julia_environment_fingerprint()
+    ):
+        return None
+    return SymbolIndex([JuliaSymbol(**symbol) for symbol in cached["symbols"]])
+
+
+_symbol_index: Optional[SymbolIndex] = None
+_symbol_index_failed_at: Optional[float] = None
+_symbol_index_lock = threading.Lock()
+
+
+def get_symbol_index() -> SymbolIndex:
+    """
+    Get the symbol index, loading it from disk or building it on first use. If the symbols
+    could not be listed, an empty index is used, and listing them is only retried after
+    `SYMBOL_INDEX_RETRY_SECONDS`.
+    """
+    global _symbol_index, _symbol_index_failed_at
+    with _symbol_index_lock:
+        retry = (
+            _symbol_index_failed_at is not None
+            and time.monotonic() - _symbol_index_failed_at > SYMBOL_INDEX_RETRY_SECONDS
+        )
+        if _symbol_index is None or retry:
+            try:
+                _symbol_index = load_symbol_index() or build_symbol_index()
+            except Exception as e:
+                print_to_console(
+                    text=f"Error loading the symbol index: {str(e)}",
+                    title="Symbol Index",
+                    border_style=colorscheme.error,
+                )
+                _symbol_index = SymbolIndex([])
+            _symbol_index_failed_at = None if len(_symbol_index) else time.monotonic()
+        return _symbol_index
+
+
+# Matches function calls such as `foo(`, `foo!(` and `Module.foo(`
+_FUNCTION_CALL_PATTERN = re.compile(r"\b([A-Za-z_][A-Za-z0-9_]*!?)\s*\(")
+
+
+def find_package_functions(
+    code: str, modules: tuple[str, ...] = ("Jutul", "JutulDarcy")
+) -> list[str]:
+    """
+    Find the exported functions from the given modules that are called in the code, in order of first use.
+    """
+    index = get_symbol_index()
+    names = []
+    for match in _FUNCTION_CALL_PATTERN.finditer(code):
+        name = match.group(1)
+        if name in names:
+            continue
+        if any(
+            symbol.kind == "function" and symbol.module in modules
+            for symbol in index.lookup(name)
+        ):
+            names.append(name)
+    return names
+
+
+def find_undefined_names(message: str) -> list[str]:
+    """
+    Find the names reported as undefined in a Julia error or linter message.
+    """
+    names = []
+    for pattern in _UNDEFINED_NAME_PATTERNS:
+        for match in pattern.finditer(message):
+            name = match.group(1).split(".")[-1]  # `Module.name` -> `name`
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def format_symbol_suggestions(names: list[str], n: int = 5) -> str:
+    """
+    Format the closest exported symbols for each of the names. Empty if there are no suggestions.
+    """
+    if not names:
+        return ""
+
+    index = get_symbol_index()
+    lines = []
+    for name in names:
+        suggestions = index.suggest(name, n=n)
+        if suggestions:
+            lines.append(f"- `{name}` is not defined. Did you mean one of:")
+            lines.extend(f"    - {symbol.format()}" for symbol in suggestions)
+
+    if not lines:
+        return ""
+    return "## Suggestions for undefined names:\n" + "\n".join(lines)
+
+
+def get_symbol_suggestions_for_error(message: str) -> str:
+    """
+    Suggest the closest exported symbols for each name reported as undefined in the message.
+    """
+    return format_symbol_suggestions(find_undefined_names(message))
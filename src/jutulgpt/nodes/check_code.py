@@ -1,11 +1,21 @@
 from __future__ import annotations
 
+import re
+
 from langchain_core.messages import HumanMessage
 from langchain_core.runnables import RunnableConfig
 
 from jutulgpt.cli import colorscheme, print_to_console
 from jutulgpt.configuration import BaseConfiguration, cli_mode
-from jutulgpt.julia import get_error_message, get_linting_result, run_code
+from jutulgpt.julia import (
+    find_package_functions,
+    get_cached_function_documentation,
+    get_error_message,
+    get_linting_result,
+    get_symbol_suggestions_for_error,
+    prefetch_function_documentation_for_code,
+    run_code,
+)
 from jutulgpt.state import State
 from jutulgpt.utils import (
     add_julia_context,
@@ -99,6 +109,26 @@ def _run_julia_code(code: str, print_code: bool = True) -> tuple[str, bool]:
     return "", False
 
 
+def _get_documentation_for_failing_functions(
+    package_functions: list[str], error_text: str
+) -> str:
+    """
+    Get the documentation of the package functions that are mentioned in the error. Empty if there are none.
+    """
+    failing_functions = [
+        name
+        for name in package_functions
+        if re.search(rf"(?<![\w.]){re.escape(name)}(?![\w!])", error_text)
+    ]
+    if not failing_functions:
+        return ""
+
+    found_names, documentation = get_cached_function_documentation(failing_functions)
+    if not found_names:
+        return ""
+    return "## Documentation for the functions involved in the error:\n" + documentation
+
+
 def check_code(
     state: State,
     config: RunnableConfig,
@@ -153,6 +183,9 @@ def check_code(
     # Then shorten the code for faster simulations
     code = shorter_simulations(code)
 
+    # Retrieve the documentation of the used functions while the code is checked
+    prefetch_function_documentation_for_code(code)
+
     # Running the linter
     linting_message, linting_issues_found = _run_linter(code, print_code=False)
 
@@ -172,6 +205,21 @@ def check_code(
     if code_running_issues_found:
         feedback_message += code_running_message
 
+    # Suggest the closest real names for functions and types that do not exist
+    symbol_suggestions = get_symbol_suggestions_for_error(
+        linting_message + "\n" + code_running_message
+    )
+    if symbol_suggestions:
+        feedback_message += "\n\n" + symbol_suggestions
+
+    # Attach the documentation of the functions the check failed on. The symbol index is
+    # loaded by now, as it is used for the suggestions and the prefetch.
+    function_documentation = _get_documentation_for_failing_functions(
+        find_package_functions(code), linting_message + "\n" + code_running_message
+    )
+    if function_documentation:
+        feedback_message += "\n\n" + function_documentation
+
     # Return the feedback messages and and error flag
     messages_list.append(HumanMessage(content=feedback_message))
 
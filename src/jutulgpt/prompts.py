@@ -18,7 +18,9 @@ When given a programming task, you should follow this strategic approach:
 Use your available retrieval tools strategically:
 - `retrieve_function_documentation`: Look up specific function signatures and usage. Use this when implementing code that uses JutulDarcy.
 - `retrieve_jutuldarcy_examples`: Semantic search for retrieving relevant JutulDarcy examples.
+- `search_documentation`: Semantic search over several collections at once (JutulDarcy and Fimbul docs and examples). Use this to cover a topic in a single call.
 - `grep_search`: Search for specific terms or patterns in the JutulDarcy documentation.
+- `keyword_search`: Ranked keyword search in the JutulDarcy documentation and examples. Use this for exact function or type names.
 - Actively go back and forth between these and other tools to gather all necessary information before writing code.
 - IMPORTANT: If the code running or linting fails, go back and retrieve more context or examples to fix the issue.
 
@@ -111,7 +113,9 @@ When given a programming task, you should follow this strategic approach:
 Use your available retrieval tools strategically:
 - `retrieve_function_documentation`: Look up specific function signatures and usage. Use this when implementing code that uses JutulDarcy.
 - `retrieve_jutuldarcy_examples`: Semantic search for retrieving relevant JutulDarcy examples.
+- `search_documentation`: Semantic search over several collections at once (JutulDarcy and Fimbul docs and examples). Use this to cover a topic in a single call.
 - `grep_search`: Search for specific terms or patterns in the JutulDarcy documentation.
+- `keyword_search`: Ranked keyword search in the JutulDarcy documentation and examples. Use this for exact function or type names.
 - Actively go back and forth between these and other tools to gather all necessary information before writing code.
 - IMPORTANT: If the code running or linting fails, go back and retrieve more context or examples to fix the issue.
 
@@ -119,7 +123,8 @@ Use your available retrieval tools strategically:
 You have access to a variety of tools for code running and code validation:
 - `run_julia_code`: Execute Julia code and return the output or error.
 - `run_julia_linter`: Run a Julia linter to check for code quality and style issues.
-- `execute_terminal_command`: Execute a command in the terminal and return the output.
+- `execute_terminal_command`: Execute a command in the terminal and return the output. For long-running commands (f.ex. full simulations), set `run_in_background=True` to get a job id back immediately.
+- `get_background_job_status`, `tail_background_job_output` and `cancel_background_job`: Follow and control background jobs. Keep retrieving documentation or writing code while a job runs, and check back on it later.
 - If the code fails, go back and retrieve more context or examples if the code fails or does not work as expected.
 
 
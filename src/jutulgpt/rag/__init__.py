@@ -1,5 +1,6 @@
+from jutulgpt.rag.registry import registry
 from jutulgpt.rag.retrieval import make_retriever
 from jutulgpt.rag.split_docs import format_docs
 from jutulgpt.rag.split_examples import format_examples
 
-__all__ = ["format_docs", "format_examples", "make_retriever"]
+__all__ = ["format_docs", "format_examples", "make_retriever", "registry"]
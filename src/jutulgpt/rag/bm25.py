@@ -0,0 +1,186 @@
+"""
+In-memory BM25 index over the split chunks, for cheap and exact keyword lookups.
+
+Dense embeddings often miss exact identifiers such as `setup_reservoir_model` or
+`ImmiscibleSystem`. The tokenizer keeps Julia identifiers whole (including a trailing `!`),
+and also indexes the parts of snake_case names, so both the full name and its parts match.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Callable, Optional
+
+from langchain_core.documents import Document
+
+BM25_INDEX_VERSION = 2
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*!?|\d+(?:\.\d+)?")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split the text into lowercase tokens, adding the parts of snake_case identifiers."""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group(0).lower()
+        tokens.append(token)
+        parts = [part for part in token.rstrip("!").split("_") if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of chunks, with the postings kept in memory.
+
+    Only the chunk ids and term counts are kept. The returned chunks are fetched with
+    `document_loader`, f.ex. from the chunk store, or else kept in memory.
+    """
+
+    def __init__(
+        self,
+        chunks: list[Document],
+        ids: Optional[list[str]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        fingerprint: str = "",
+        document_loader: Optional[Callable[[list[str]], list[Document]]] = None,
+    ):
+        ids = ids if ids is not None else [str(i) for i in range(len(chunks))]
+        if document_loader is None:
+            documents = dict(zip(ids, chunks))
+            document_loader = lambda ids: [
+                Document(
+                    id=id,
+                    page_content=documents[id].page_content,
+                    metadata=documents[id].metadata,
+                )
+                for id in ids
+            ]
+        self._setup(
+            ids,
+            [Counter(tokenize(chunk.page_content)) for chunk in chunks],
+            k1=k1,
+            b=b,
+            fingerprint=fingerprint,
+            document_loader=document_loader,
+        )
+
+    def _setup(
+        self,
+        ids: list[str],
+        term_counts: list[dict[str, int]],
+        k1: float,
+        b: float,
+        fingerprint: str,
+        document_loader: Callable[[list[str]], list[Document]],
+    ) -> None:
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        # Identifies the sources the index was built from
+        self.fingerprint = fingerprint
+        self.document_loader = document_loader
+
+        self._term_counts = term_counts
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._doc_lengths = []
+        for i, counts in enumerate(term_counts):
+            self._doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((i, tf))
+
+        n_docs = len(ids)
+        self._avg_doc_length = sum(self._doc_lengths) / n_docs if n_docs else 0.0
+        self._idf = {
+            term: math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        # The length normalization of each chunk does not depend on the query
+        self._norms = [
+            k1 * (1 - b + b * length / self._avg_doc_length)
+            if self._avg_doc_length
+            else k1
+            for length in self._doc_lengths
+        ]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, query: str) -> dict[int, float]:
+        """Get the BM25 score of every chunk containing at least one of the query terms."""
+        scores: dict[int, float] = defaultdict(float)
+        for term, query_tf in Counter(tokenize(query)).items():
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                scores[i] += query_tf * idf * tf * (self.k1 + 1) / (tf + self._norms[i])
+        return scores
+
+    def search(self, query: str, k: int = 5) -> list[tuple[Document, float]]:
+        """Get the k highest scoring chunks, with their chunk ids set, and their scores."""
+        scores = self.scores(query)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        documents = {
+            doc.id: doc for doc in self.document_loader([self.ids[i] for i, _ in best])
+        }
+        return [
+            (
+                Document(
+                    id=self.ids[i],
+                    page_content=documents[self.ids[i]].page_content,
+                    metadata=documents[self.ids[i]].metadata,
+                ),
+                score,
+            )
+            for i, score in best
+            if self.ids[i] in documents
+        ]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": BM25_INDEX_VERSION,
+                    "fingerprint": self.fingerprint,
+                    "k1": self.k1,
+                    "b": self.b,
+                    "ids": self.ids,
+                    "term_counts": self._term_counts,
+                },
+                f,
+            )
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        document_loader: Callable[[list[str]], list[Document]],
+    ) -> Optional[BM25Index]:
+        """Load the index, or return None if it is missing or in an older format."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data.get("version") != BM25_INDEX_VERSION:
+            return None
+        index = cls.__new__(cls)
+        index._setup(
+            data["ids"],
+            data["term_counts"],
+            k1=data["k1"],
+            b=data["b"],
+            fingerprint=data["fingerprint"],
+            document_loader=document_loader,
+        )
+        return index
@@ -0,0 +1,174 @@
+"""
+SQLite store of the split chunks of a retriever spec.
+
+Each chunk is stored as a row with its chunk id, the source file it was split from, its
+position within the file, its text and its metadata as JSON. Reading the store only runs
+queries, so unlike unpickling a list of documents, opening it costs the same for any corpus
+size, and only the chunks asked for by id are turned into `Document` objects.
+
+The chunks left after removing near-duplicates are also stored, together with the
+fingerprint of the sources and settings they were computed for, such that the removal only
+runs again after the chunks changed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterator, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from jutulgpt.rag.indexing import chunk_id
+
+
+class SQLiteChunkStore:
+    """Thread-safe store of the chunks, replaced one source file at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "source TEXT NOT NULL, position INTEGER NOT NULL, id TEXT NOT NULL, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL, PRIMARY KEY (source, position))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS chunks_id ON chunks (id)")
+        # Also lists the source files without any chunks
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS deduplicated ("
+            "position INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS properties (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    def replace_sources(
+        self,
+        chunks_by_source: dict[str, list[Document]],
+        removed_sources: Sequence[str] = (),
+    ) -> None:
+        """Replace the chunks of the given source files, and delete the removed ones, in one transaction."""
+        with self._lock, self._connection:
+            self._clear_deduplicated()
+            for table in ("chunks", "sources"):
+                self._connection.executemany(
+                    f"DELETE FROM {table} WHERE source = ?",
+                    [(source,) for source in [*removed_sources, *chunks_by_source]],
+                )
+            self._connection.executemany(
+                "INSERT INTO sources (source) VALUES (?)",
+                [(source,) for source in chunks_by_source],
+            )
+            self._connection.executemany(
+                "INSERT INTO chunks (source, position, id, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        source,
+                        position,
+                        chunk_id(chunk),
+                        chunk.page_content,
+                        json.dumps(chunk.metadata, default=str),
+                    )
+                    for source, chunks in chunks_by_source.items()
+                    for position, chunk in enumerate(chunks)
+                ],
+            )
+
+    def sources(self) -> set[str]:
+        with self._lock:
+            rows = self._connection.execute("SELECT source FROM sources")
+            return {source for (source,) in rows}
+
+    def ids(self) -> list[str]:
+        """Get the chunk ids, ordered by source file and position."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM chunks ORDER BY source, position"
+            ).fetchall()
+        return [id for (id,) in rows]
+
+    def get_many(self, ids: list[str]) -> list[Document]:
+        """Get the chunks with the given ids, in the same order, skipping unknown ids."""
+        found = {}
+        with self._lock:
+            # Stay below SQLite's limit on the number of parameters
+            for i in range(0, len(ids), 500):
+                batch = ids[i : i + 500]
+                rows = self._connection.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for id, text, metadata in rows:
+                    found[id] = (text, metadata)
+        return [
+            Document(
+                id=id, page_content=found[id][0], metadata=json.loads(found[id][1])
+            )
+            for id in ids
+            if id in found
+        ]
+
+    def iter_documents(self) -> Iterator[Document]:
+        """Iterate over all the chunks, ordered by source file and position, without their ids set."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT text, metadata FROM chunks ORDER BY source, position"
+            ).fetchall()
+        for text, metadata in rows:
+            yield Document(page_content=text, metadata=json.loads(metadata))
+
+    def _clear_deduplicated(self) -> None:
+        self._connection.execute("DELETE FROM deduplicated")
+        self._connection.execute(
+            "DELETE FROM properties WHERE key = 'deduplicated_fingerprint'"
+        )
+
+    def get_deduplicated(self, fingerprint: str) -> Optional[list[Document]]:
+        """Get the chunks left after removing near-duplicates, or None if they were not stored for the fingerprint."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM properties WHERE key = 'deduplicated_fingerprint'"
+            ).fetchone()
+            if row is None or row[0] != fingerprint:
+                return None
+            rows = self._connection.execute(
+                "SELECT text, metadata FROM deduplicated ORDER BY position"
+            ).fetchall()
+        return [
+            Document(page_content=text, metadata=json.loads(metadata))
+            for text, metadata in rows
+        ]
+
+    def set_deduplicated(self, fingerprint: str, chunks: list[Document]) -> None:
+        """Store the chunks left after removing near-duplicates, computed for the fingerprint."""
+        with self._lock, self._connection:
+            self._clear_deduplicated()
+            self._connection.executemany(
+                "INSERT INTO deduplicated (position, text, metadata) VALUES (?, ?, ?)",
+                [
+                    (
+                        position,
+                        chunk.page_content,
+                        json.dumps(chunk.metadata, default=str),
+                    )
+                    for position, chunk in enumerate(chunks)
+                ],
+            )
+            self._connection.execute(
+                "INSERT INTO properties (key, value) VALUES ('deduplicated_fingerprint', ?)",
+                (fingerprint,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
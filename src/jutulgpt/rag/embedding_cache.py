@@ -0,0 +1,253 @@
+"""
+Cache for query and document embeddings, placed in front of the embedding client.
+
+Queries are keyed by the embedding model and the normalized query text. Lookups first go
+through an in-memory LRU cache, and then through a persistent SQLite cache shared between
+sessions. Only queries missing from both are sent to the embedding provider.
+
+Document chunks are keyed by the embedding model and a hash of the chunk text, and only
+cached on disk. When an index is rebuilt, only new or changed chunks are embedded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.configuration import PROJECT_ROOT
+
+EMBEDDING_CACHE_PATH = str(
+    PROJECT_ROOT / "rag" / "retriever_store" / "embedding_cache.sqlite"
+)
+
+
+def normalize_query(text: str) -> str:
+    """Normalize the whitespace and casing of a query."""
+    return " ".join(text.split()).lower()
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def requests(self) -> int:
+        return self.memory_hits + self.disk_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return (
+            (self.memory_hits + self.disk_hits) / self.requests
+            if self.requests
+            else 0.0
+        )
+
+
+class SQLiteEmbeddingStore:
+    """Persistent key-value store of embeddings, saved as float32 blobs."""
+
+    def __init__(self, path: str, table: str = "query_embeddings"):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            # Stay below SQLite's limit on the number of parameters
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, embedding FROM {self.table} WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def get(self, key: str) -> Optional[list[float]]:
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: dict[str, list[float]]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, embedding) VALUES (?, ?)",
+                [
+                    (key, np.asarray(embedding, dtype=np.float32).tobytes())
+                    for key, embedding in items.items()
+                ],
+            )
+            self._connection.commit()
+
+    def set(self, key: str, embedding: list[float]) -> None:
+        self.set_many({key: embedding})
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding client with a two-tier cache for the query embeddings.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        max_memory_entries: int = 2048,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_memory_entries = max_memory_entries
+        self.stats = EmbeddingCacheStats()
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = SQLiteEmbeddingStore(cache_path) if cache_path else None
+        self._documents_disk = (
+            SQLiteEmbeddingStore(cache_path, table="document_embeddings")
+            if cache_path
+            else None
+        )
+        self.document_stats = EmbeddingCacheStats()
+
+    def _get_from_memory(self, key: str) -> Optional[list[float]]:
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+            return embedding
+
+    def _put_in_memory(self, key: str, embedding: list[float]) -> None:
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _get_cached_query(self, key: str) -> Optional[list[float]]:
+        embedding = self._get_from_memory(key)
+        if embedding is not None:
+            return embedding
+
+        if self._disk is not None:
+            embedding = self._disk.get(key)
+            if embedding is not None:
+                self._put_in_memory(key, embedding)
+                with self._lock:
+                    self.stats.disk_hits += 1
+                return embedding
+
+        with self._lock:
+            self.stats.misses += 1
+        return None
+
+    def _cache_query(self, key: str, embedding: list[float]) -> None:
+        self._put_in_memory(key, embedding)
+        if self._disk is not None:
+            self._disk.set(key, embedding)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = embedding_cache_key(self.model, normalize_query(text))
+        embedding = self._get_cached_query(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self._cache_query(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = embedding_cache_key(self.model, normalize_query(text))
+        embedding = self._get_cached_query(key)
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(text)
+            self._cache_query(key, embedding)
+        return embedding
+
+    def get_cached_documents(self, texts: list[str]) -> dict[str, list[float]]:
+        """Get the cached embeddings of the texts, keyed by the text. Texts not in the cache are left out."""
+        if self._documents_disk is None:
+            return {}
+        keys = {text: embedding_cache_key(self.model, text) for text in texts}
+        found = self._documents_disk.get_many(list(set(keys.values())))
+        return {text: found[key] for text, key in keys.items() if key in found}
+
+    def cache_documents(self, embeddings: dict[str, list[float]]) -> None:
+        """Add embeddings of texts, keyed by the text, to the cache."""
+        if self._documents_disk is not None and embeddings:
+            self._documents_disk.set_many(
+                {
+                    embedding_cache_key(self.model, text): embedding
+                    for text, embedding in embeddings.items()
+                }
+            )
+
+    def _split_cached_documents(
+        self, texts: list[str]
+    ) -> tuple[dict[str, list[float]], list[str]]:
+        cached = self.get_cached_documents(texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+        with self._lock:
+            self.document_stats.disk_hits += len(texts) - len(missing)
+            self.document_stats.misses += len(missing)
+        return cached, missing
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        cached, missing = self._split_cached_documents(texts)
+        if missing:
+            new_embeddings = dict(
+                zip(missing, self.embeddings.embed_documents(missing))
+            )
+            self.cache_documents(new_embeddings)
+            cached.update(new_embeddings)
+        return [cached[text] for text in texts]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        cached, missing = self._split_cached_documents(texts)
+        if missing:
+            new_embeddings = dict(
+                zip(missing, await self.embeddings.aembed_documents(missing))
+            )
+            self.cache_documents(new_embeddings)
+            cached.update(new_embeddings)
+        return [cached[text] for text in texts]
+
+    def cache_info(self) -> dict:
+        """Get the hit-rate metrics of the cache."""
+        disk_entries = len(self._disk) if self._disk is not None else 0
+        with self._lock:
+            return {
+                "model": self.model,
+                "memory_hits": self.stats.memory_hits,
+                "disk_hits": self.stats.disk_hits,
+                "misses": self.stats.misses,
+                "hit_rate": self.stats.hit_rate,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "document_hits": self.document_stats.disk_hits,
+                "document_misses": self.document_stats.misses,
+                "document_hit_rate": self.document_stats.hit_rate,
+            }
@@ -0,0 +1,208 @@
+"""
+Concurrent embedding of document chunks for index builds.
+
+The chunks are grouped into batches by token count and sent to the embedding provider with
+bounded concurrency. On rate limits the concurrency is reduced and the batch is retried with
+exponential backoff, and the concurrency grows back as requests succeed. Every finished
+batch is written to the document embedding cache, so an interrupted build resumes where it
+stopped, and the vector store only reads the embeddings from the cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Coroutine, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.rag.embedding_cache import CachedEmbeddings
+from jutulgpt.rag.utils import count_tokens
+
+
+def batch_by_tokens(
+    texts: list[str], max_tokens: int = 8000, max_batch_size: int = 256
+) -> list[list[str]]:
+    """
+    Group the texts into batches of at most `max_tokens` tokens and `max_batch_size` texts.
+    A text longer than `max_tokens` gets a batch of its own.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for text in texts:
+        n_tokens = count_tokens(text)
+        if batch and (
+            batch_tokens + n_tokens > max_tokens or len(batch) >= max_batch_size
+        ):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += n_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check if the error from the embedding provider is a rate limit (HTTP 429)."""
+    status_code = getattr(error, "status_code", None) or getattr(
+        getattr(error, "response", None), "status_code", None
+    )
+    return (
+        status_code == 429
+        or "RateLimit" in type(error).__name__
+        or "rate limit" in str(error).lower()
+    )
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter that halves its limit on rate limits, and increases it by one again
+    after `increase_after` consecutive successes (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, max_concurrency: int, increase_after: int = 5):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self, succeeded: bool = True, rate_limited: bool = False) -> None:
+        """
+        Release a slot after a request. A rate limit halves the limit, while other failures
+        only reset the count of consecutive successes.
+        """
+        async with self._condition:
+            self._in_flight -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            elif not succeeded:
+                self._successes = 0
+            else:
+                self._successes += 1
+                if (
+                    self._successes >= self.increase_after
+                    and self.limit < self.max_concurrency
+                ):
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+@dataclass
+class EmbeddingPipelineStats:
+    cached: int = 0
+    embedded: int = 0
+    batches: int = 0
+    rate_limited: int = 0
+
+
+async def _embed_batch(
+    embeddings: Embeddings,
+    batch: list[str],
+    limiter: AdaptiveLimiter,
+    stats: EmbeddingPipelineStats,
+    max_retries: int,
+    initial_backoff: float,
+) -> list[list[float]]:
+    for attempt in range(max_retries + 1):
+        await limiter.acquire()
+        try:
+            result = await embeddings.aembed_documents(batch)
+        except Exception as e:
+            await limiter.release(succeeded=False, rate_limited=is_rate_limit_error(e))
+            if not is_rate_limit_error(e) or attempt == max_retries:
+                raise
+            stats.rate_limited += 1
+            backoff = initial_backoff * 2**attempt
+            await asyncio.sleep(backoff + random.uniform(0, backoff))
+        else:
+            await limiter.release()
+            return result
+    raise RuntimeError("Unreachable")
+
+
+async def aembed_texts(
+    embeddings: CachedEmbeddings,
+    texts: list[str],
+    max_tokens_per_batch: int = 8000,
+    max_concurrency: int = 4,
+    max_retries: int = 6,
+    initial_backoff: float = 1.0,
+) -> EmbeddingPipelineStats:
+    """
+    Embed the texts missing from the document embedding cache, and add them to the cache.
+    """
+    stats = EmbeddingPipelineStats()
+    cached = embeddings.get_cached_documents(texts)
+    missing = list(dict.fromkeys(text for text in texts if text not in cached))
+    stats.cached = len(texts) - len(missing)
+    if not missing:
+        return stats
+
+    limiter = AdaptiveLimiter(max_concurrency)
+
+    async def embed_and_cache(batch: list[str]) -> None:
+        result = await _embed_batch(
+            embeddings.embeddings,
+            batch,
+            limiter,
+            stats,
+            max_retries=max_retries,
+            initial_backoff=initial_backoff,
+        )
+        # Checkpoint the batch, such that an interrupted build does not embed it again
+        embeddings.cache_documents(dict(zip(batch, result)))
+        stats.embedded += len(batch)
+        stats.batches += 1
+
+    await asyncio.gather(
+        *(
+            embed_and_cache(batch)
+            for batch in batch_by_tokens(missing, max_tokens=max_tokens_per_batch)
+        )
+    )
+    return stats
+
+
+def _run_coroutine(coroutine: Coroutine):
+    """Run the coroutine to completion, also when called from within a running event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def embed_chunks(
+    embeddings: Embeddings,
+    chunks: list[Document],
+    max_tokens_per_batch: int = 8000,
+    max_concurrency: int = 4,
+) -> Optional[EmbeddingPipelineStats]:
+    """
+    Embed the chunks into the document embedding cache before they are added to a vector
+    store. Does nothing if the embedding client has no cache to fill.
+    """
+    if not isinstance(embeddings, CachedEmbeddings) or not chunks:
+        return None
+    return _run_coroutine(
+        aembed_texts(
+            embeddings,
+            [chunk.page_content for chunk in chunks],
+            max_tokens_per_batch=max_tokens_per_batch,
+            max_concurrency=max_concurrency,
+        )
+    )
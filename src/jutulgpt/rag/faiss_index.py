@@ -0,0 +1,235 @@
+"""
+Building FAISS vector stores with other index types than the default flat index.
+
+The index type is given as a FAISS index factory string, f.ex. `Flat`, `HNSW32` or
+`IVF256,PQ16`. Indexes that need training are trained on the embeddings of the corpus
+before the chunks are added. Query-time parameters such as `efSearch` (HNSW) and `nprobe`
+(IVF) are set on the loaded index.
+
+In mmap mode the index is memory mapped read-only, and the documents are read from a JSON
+lines file through an offsets table, so that several processes share the same pages of the
+page cache instead of each deserializing its own copy.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import re
+from typing import Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+MMAP_DOCSTORE_FILE = "docstore.jsonl"
+MMAP_OFFSETS_FILE = "docstore_offsets.npy"
+MMAP_IDS_FILE = "docstore_ids.json"
+
+
+def index_factory_suffix(index_factory: str) -> str:
+    """A suffix for the persist path of the index, f.ex. `IVF256,PQ16` -> `IVF256_PQ16`."""
+    return re.sub(r"[^A-Za-z0-9]+", "_", index_factory).strip("_")
+
+
+def build_faiss_vectorstore(
+    docs: list[Document],
+    ids: list[str],
+    embedding_model: Embeddings,
+    index_factory: str = "Flat",
+):
+    """
+    Embed the chunks and build a FAISS vector store with an index of the given type,
+    training the index on the embeddings if needed.
+    """
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    texts = [doc.page_content for doc in docs]
+    embeddings = np.asarray(embedding_model.embed_documents(texts), dtype=np.float32)
+
+    index = faiss.index_factory(embeddings.shape[1], index_factory)
+    if not index.is_trained:
+        try:
+            index.train(embeddings)
+        except RuntimeError as e:
+            raise ValueError(
+                f"Could not train the FAISS index `{index_factory}` on {len(texts)} chunks. "
+                "Use fewer clusters (IVF) or fewer bits per code (PQ), or a flat index for small corpora."
+            ) from e
+
+    vectorstore = FAISS(
+        embedding_function=embedding_model,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    vectorstore.add_embeddings(
+        text_embeddings=list(zip(texts, embeddings.tolist())),
+        metadatas=[doc.metadata for doc in docs],
+        ids=ids,
+    )
+    return vectorstore
+
+
+def set_faiss_search_params(index, search_params: dict) -> None:
+    """Set query-time parameters such as `efSearch` or `nprobe` on the index."""
+    if not search_params:
+        return
+
+    import faiss
+
+    parameter_space = faiss.ParameterSpace()
+    for name, value in search_params.items():
+        try:
+            parameter_space.set_index_parameter(index, name, value)
+        except RuntimeError as e:
+            raise ValueError(
+                f"The FAISS index does not support the search parameter `{name}`."
+            ) from e
+
+
+def supports_removal(index) -> bool:
+    """
+    Check if chunks can be deleted from the index in place. LangChain assumes the positions
+    of the remaining vectors shift down after a removal, which only holds for flat indexes.
+    Other index types are rebuilt instead.
+    """
+    import faiss
+
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def replace_faiss_contents(vectorstore, rebuilt) -> None:
+    """Replace the index and documents of the vector store in place, keeping references to it valid."""
+    vectorstore.index = rebuilt.index
+    vectorstore.docstore = rebuilt.docstore
+    vectorstore.index_to_docstore_id = rebuilt.index_to_docstore_id
+
+
+class MmapDocstore:
+    """
+    Read-only document store backed by a memory-mapped JSON lines file. The document at
+    position i of the index is stored between `offsets[i]` and `offsets[i + 1]`.
+    """
+
+    def __init__(self, persist_path: str):
+        with open(
+            os.path.join(persist_path, MMAP_IDS_FILE), "r", encoding="utf-8"
+        ) as f:
+            self.ids: list[str] = json.load(f)
+        self._positions = {id: i for i, id in enumerate(self.ids)}
+        self._offsets = np.load(
+            os.path.join(persist_path, MMAP_OFFSETS_FILE), mmap_mode="r"
+        )
+        with open(os.path.join(persist_path, MMAP_DOCSTORE_FILE), "rb") as f:
+            self._mmap = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if os.fstat(f.fileno()).st_size
+                else b""
+            )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, search: str) -> Union[str, Document]:
+        position = self._positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        data = json.loads(self._mmap[start:end])
+        return Document(
+            id=search, page_content=data["page_content"], metadata=data["metadata"]
+        )
+
+    def add(self, texts: dict[str, Document]) -> None:
+        raise NotImplementedError("The memory-mapped document store is read-only.")
+
+    def delete(self, ids: list) -> None:
+        raise NotImplementedError("The memory-mapped document store is read-only.")
+
+
+def save_mmap_docstore(vectorstore, persist_path: str) -> None:
+    """Write the documents of the FAISS vector store in the memory-mappable format."""
+    ids = [
+        vectorstore.index_to_docstore_id[i]
+        for i in range(len(vectorstore.index_to_docstore_id))
+    ]
+    offsets = [0]
+    with open(os.path.join(persist_path, MMAP_DOCSTORE_FILE), "wb") as f:
+        for id in ids:
+            doc = vectorstore.docstore.search(id)
+            line = (
+                json.dumps(
+                    {"page_content": doc.page_content, "metadata": doc.metadata},
+                    default=str,
+                )
+                + "\n"
+            ).encode("utf-8")
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(
+        os.path.join(persist_path, MMAP_OFFSETS_FILE), np.asarray(offsets, np.int64)
+    )
+    with open(os.path.join(persist_path, MMAP_IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+
+def save_faiss_vectorstore(vectorstore, persist_path: str, mmap_mode: bool) -> None:
+    """
+    Save the vector store. In mmap mode the memory-mappable document store is also written,
+    and the files are written to a temporary directory and then moved into place, such that
+    processes that have mapped the old files keep reading valid data.
+    """
+    if not mmap_mode:
+        vectorstore.save_local(persist_path)
+        return
+
+    tmp_path = persist_path + ".tmp"
+    vectorstore.save_local(tmp_path)
+    save_mmap_docstore(vectorstore, tmp_path)
+    os.makedirs(persist_path, exist_ok=True)
+    for file_name in os.listdir(tmp_path):
+        os.replace(
+            os.path.join(tmp_path, file_name), os.path.join(persist_path, file_name)
+        )
+    os.rmdir(tmp_path)
+
+
+def load_mmap_faiss_vectorstore(persist_path: str, embedding_model: Embeddings):
+    """
+    Load the FAISS vector store with the index memory mapped read-only. Returns None if the
+    memory-mappable document store has not been written yet.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    if not os.path.exists(os.path.join(persist_path, MMAP_IDS_FILE)):
+        return None
+
+    # IO_FLAG_MMAP maps the inverted lists of IVF indexes, and IO_FLAG_MMAP_IFC the vectors
+    # of flat indexes (not available in older FAISS versions)
+    flags = (
+        faiss.IO_FLAG_MMAP
+        | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        | faiss.IO_FLAG_READ_ONLY
+    )
+    index_path = os.path.join(persist_path, "index.faiss")
+    try:
+        index = faiss.read_index(index_path, flags)
+    except RuntimeError:
+        index = faiss.read_index(index_path)
+
+    docstore = MmapDocstore(persist_path)
+    return FAISS(
+        embedding_function=embedding_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(docstore.ids)),
+    )
+
+
+def is_mmap_vectorstore(vectorstore) -> bool:
+    return isinstance(getattr(vectorstore, "docstore", None), MmapDocstore)
@@ -0,0 +1,187 @@
+"""
+Search several retriever specs at once, returning one merged ranking.
+
+With the plain similarity search and no reranker, the query is embedded once, and the vector
+stores are searched concurrently with the same embedding. The distances are converted to
+relevance scores with the relevance function of each vector store, such that FAISS and Chroma
+results can be compared.
+
+Otherwise, each spec is searched concurrently with the retriever of the configuration, as by
+the single-collection tools, and the rankings of the specs are merged with reciprocal rank
+fusion, as their scores are not comparable. The MMR search without a reranker also embeds
+the query once, and runs the MMR retriever of each spec with that embedding. The hybrid and
+reranked retrievers embed the query themselves.
+
+In both cases, the results are then deduplicated and cut to a token budget.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from jutulgpt.configuration import BaseConfiguration
+from jutulgpt.rag.hybrid import reciprocal_rank_fusion
+from jutulgpt.rag.packing import chunk_tokens
+from jutulgpt.rag.retrieval import (
+    RetrievalParams,
+    get_embedding_model,
+    get_retriever,
+    get_vectorstore,
+)
+from jutulgpt.rag.retriever_specs import RETRIEVER_SPECS, RetrieverSpec
+
+
+@dataclass
+class SearchHit:
+    doc: Document
+    # The similarity to the query, higher is better and in [0, 1] for normalized
+    # embeddings. None when the hits are ordered by reciprocal rank fusion, as the
+    # retrievers return no comparable scores.
+    relevance: Optional[float]
+    collection_name: str
+
+
+def get_retriever_specs_by_collection() -> dict[str, RetrieverSpec]:
+    """Get all retriever specs, keyed by their collection name, f.ex. `jutuldarcy_docs`."""
+    return {
+        spec.collection_name: spec
+        for specs in RETRIEVER_SPECS.values()
+        for spec in specs.values()
+    }
+
+
+def _search_by_vector(
+    vectorstore: VectorStore, embedding: list[float], k: int
+) -> list[tuple[Document, float]]:
+    """Search the vector store with the embedding, returning relevance scores (higher is better)."""
+    if hasattr(vectorstore, "similarity_search_with_score_by_vector"):  # FAISS
+        results = vectorstore.similarity_search_with_score_by_vector(embedding, k=k)
+    else:  # Chroma
+        results = vectorstore.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k
+        )
+    relevance_score_fn = vectorstore._select_relevance_score_fn()
+    return [(doc, relevance_score_fn(distance)) for doc, distance in results]
+
+
+def _search_spec(
+    configuration: BaseConfiguration,
+    spec: RetrieverSpec,
+    embedding: list[float],
+    k: int,
+) -> list[SearchHit]:
+    vectorstore = get_vectorstore(configuration, spec)
+    return [
+        SearchHit(doc=doc, relevance=score, collection_name=spec.collection_name)
+        for doc, score in _search_by_vector(vectorstore, embedding, k)
+    ]
+
+
+def _uses_plain_similarity_search(configuration: BaseConfiguration) -> bool:
+    return (
+        configuration.examples_search_type == "similarity"
+        and configuration.rerank_provider == "None"
+    )
+
+
+def _uses_mmr_search(configuration: BaseConfiguration) -> bool:
+    return (
+        configuration.examples_search_type == "mmr"
+        and configuration.rerank_provider == "None"
+    )
+
+
+def _search_with_retrievers(
+    configuration: BaseConfiguration,
+    query: str,
+    specs: list[RetrieverSpec],
+    k_per_spec: int,
+) -> list[SearchHit]:
+    """
+    Search each spec with the configured retriever, fusing the rankings of the specs. The
+    MMR retrievers are all given the same query embedding.
+    """
+    retrieval_params = RetrievalParams(
+        search_type=configuration.examples_search_type,
+        search_kwargs={**configuration.examples_search_kwargs, "k": k_per_spec},
+    )
+
+    if _uses_mmr_search(configuration):
+        embedding = get_embedding_model(configuration).embed_query(query)
+
+        def search_spec(spec: RetrieverSpec) -> list[Document]:
+            retriever = get_retriever(configuration, spec, retrieval_params)
+            return retriever.search_by_vector(embedding)
+    else:
+
+        def search_spec(spec: RetrieverSpec) -> list[Document]:
+            return get_retriever(configuration, spec, retrieval_params).invoke(query)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(specs))) as executor:
+        rankings = list(executor.map(search_spec, specs))
+
+    documents = {}
+    for spec, docs in zip(specs, rankings):
+        for rank, doc in enumerate(docs):
+            documents[(spec.collection_name, rank)] = (doc, spec.collection_name)
+    fused = reciprocal_rank_fusion(
+        [
+            [(spec.collection_name, rank) for rank in range(len(docs))]
+            for spec, docs in zip(specs, rankings)
+        ],
+        weights=[1.0] * len(specs),
+    )
+    return [
+        SearchHit(
+            doc=documents[key][0], relevance=None, collection_name=documents[key][1]
+        )
+        for key, _ in fused
+    ]
+
+
+def fan_out_search(
+    configuration: BaseConfiguration,
+    query: str,
+    specs: list[RetrieverSpec],
+    k_per_spec: int = 4,
+    token_budget: int = 3000,
+) -> list[SearchHit]:
+    """
+    Search the specs concurrently, with the search type, search kwargs and reranker of the
+    configuration. The plain similarity and MMR searches embed the query only once.
+
+    Returns:
+        list[SearchHit]: The best hits over all specs, best first, without duplicates and with
+        at most `token_budget` tokens in total. The best hit is always included.
+    """
+    if _uses_plain_similarity_search(configuration):
+        embedding = get_embedding_model(configuration).embed_query(query)
+        with ThreadPoolExecutor(max_workers=max(1, len(specs))) as executor:
+            results = executor.map(
+                lambda spec: _search_spec(configuration, spec, embedding, k_per_spec),
+                specs,
+            )
+            hits = [hit for spec_hits in results for hit in spec_hits]
+        hits.sort(key=lambda hit: hit.relevance, reverse=True)
+    else:
+        hits = _search_with_retrievers(configuration, query, specs, k_per_spec)
+
+    selected = []
+    seen = set()
+    used_tokens = 0
+    for hit in hits:
+        content = hit.doc.page_content.strip()
+        if content in seen:
+            continue
+        n_tokens = chunk_tokens(hit.doc)
+        if selected and used_tokens + n_tokens > token_budget:
+            continue  # A shorter hit further down may still fit
+        seen.add(content)
+        selected.append(hit)
+        used_tokens += n_tokens
+    return selected
@@ -0,0 +1,123 @@
+"""
+Hybrid retrieval, combining the dense vector search with the lexical BM25 search.
+
+Both searches run concurrently, and their rankings are fused with weighted reciprocal rank
+fusion (RRF). A chunk at rank r in a ranking with weight w gets the score w / (rrf_k + r),
+summed over the rankings. RRF only uses the ranks, so the dense similarities and the BM25
+scores do not need to be on the same scale.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Union
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+
+from jutulgpt.rag.bm25 import BM25Index
+from jutulgpt.rag.indexing import chunk_id
+
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid")
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[str]], weights: list[float], rrf_k: int = 60
+) -> list[tuple[str, float]]:
+    """
+    Fuse the rankings of ids with weighted reciprocal rank fusion.
+
+    Returns:
+        list[tuple[str, float]]: The ids and their fused scores, best first.
+    """
+    scores: dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] += weight / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def matches_filter(
+    metadata: dict, search_filter: Optional[Union[dict, Callable[[dict], bool]]]
+) -> bool:
+    """
+    Check if the metadata of a chunk passes the `filter` search kwarg, a function of the
+    metadata or a dict of required values (a list of values allowing any of them).
+    """
+    if search_filter is None:
+        return True
+    if callable(search_filter):
+        return search_filter(metadata)
+    for key, value in search_filter.items():
+        if key.startswith("$"):
+            raise ValueError(f"Unsupported operator in the hybrid search filter: {key}")
+        allowed = value if isinstance(value, list) else [value]
+        if metadata.get(key) not in allowed:
+            return False
+    return True
+
+
+def _document_id(doc: Document) -> str:
+    return doc.id if doc.id is not None else chunk_id(doc)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever running a dense similarity search and a BM25 search concurrently, returning the
+    `k` best chunks after reciprocal rank fusion of the `fetch_k` best chunks from each. The
+    `filter` search kwarg is passed to the vector store, and applied to the BM25 results.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: VectorStore
+    bm25_index: BM25Index
+    search_kwargs: dict[str, Any] = {"k": 2, "fetch_k": 10}
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+    rrf_k: int = 60
+
+    def _dense_search(self, query: str, fetch_k: int) -> list[Document]:
+        search_filter = self.search_kwargs.get("filter")
+        if search_filter is None:
+            return self.vectorstore.similarity_search(query, k=fetch_k)
+        return self.vectorstore.similarity_search(
+            query, k=fetch_k, filter=search_filter
+        )
+
+    def _lexical_search(self, query: str, fetch_k: int) -> list[Document]:
+        search_filter = self.search_kwargs.get("filter")
+        return [
+            doc
+            for doc, _ in self.bm25_index.search(query, k=fetch_k)
+            if matches_filter(doc.metadata, search_filter)
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        k = self.search_kwargs.get("k", 4)
+        fetch_k = max(self.search_kwargs.get("fetch_k", 4 * k), k)
+
+        dense_future = _search_executor.submit(self._dense_search, query, fetch_k)
+        lexical_docs = self._lexical_search(query, fetch_k)
+        dense_docs = dense_future.result()
+
+        # Prefer the documents from the vector store
+        documents = {}
+        for doc in lexical_docs + dense_docs:
+            documents[_document_id(doc)] = doc
+
+        fused = reciprocal_rank_fusion(
+            [
+                [_document_id(doc) for doc in dense_docs],
+                [_document_id(doc) for doc in lexical_docs],
+            ],
+            weights=[self.dense_weight, self.lexical_weight],
+            rrf_k=self.rrf_k,
+        )
+        return [documents[id] for id, _ in fused[:k]]
@@ -0,0 +1,80 @@
+"""
+Versioned index artifacts.
+
+Every built vector store directory holds an `index_manifest.json`, recording the format
+version of the saved files, the settings the index was built with and the fingerprint of
+the sources it contains. The agents only load an index with a matching manifest, and
+refuse to build one while answering a query unless explicitly allowed. The indexes are
+built ahead of time with `jutulgpt index build`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+# Increase when the saved files change in a way older versions cannot read
+INDEX_FORMAT_VERSION = 1
+INDEX_MANIFEST_FILE = "index_manifest.json"
+
+
+class IndexNotBuiltError(RuntimeError):
+    """Raised when an index is missing or outdated, and may not be built at query time."""
+
+
+@dataclass(frozen=True)
+class IndexArtifact:
+    format_version: int
+    collection_name: str
+    retriever_provider: str
+    embedding_model: str
+    faiss_index_factory: Optional[str]  # None for other providers than FAISS
+    n_chunks: int
+    sources_fingerprint: str
+    built_at: str
+    build_seconds: float
+
+    @classmethod
+    def load(cls, persist_path: str) -> Optional[IndexArtifact]:
+        """Load the manifest of the index. Returns None if it is missing or unreadable."""
+        try:
+            with open(
+                os.path.join(persist_path, INDEX_MANIFEST_FILE), "r", encoding="utf-8"
+            ) as f:
+                return cls(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, persist_path: str) -> None:
+        path = os.path.join(persist_path, INDEX_MANIFEST_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def mismatch(
+        self,
+        retriever_provider: str,
+        embedding_model: str,
+        faiss_index_factory: Optional[str],
+    ) -> Optional[str]:
+        """Describe why the index cannot be used with the given settings, or None if it can."""
+        if self.format_version != INDEX_FORMAT_VERSION:
+            return f"was built with format version {self.format_version}, expected {INDEX_FORMAT_VERSION}"
+        if self.retriever_provider != retriever_provider:
+            return f"was built for the `{self.retriever_provider}` provider"
+        if self.embedding_model != embedding_model:
+            return f"was built with the embedding model `{self.embedding_model}`"
+        if self.faiss_index_factory != faiss_index_factory:
+            return f"was built with the FAISS index type `{self.faiss_index_factory}`"
+        return None
+
+
+def directory_size(path: str) -> int:
+    """Get the total size in bytes of the files in the directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, file_name))
+        for root, _, file_names in os.walk(path)
+        for file_name in file_names
+    )
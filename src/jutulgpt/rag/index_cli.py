@@ -0,0 +1,322 @@
+"""
+Build, verify and inspect the retrieval indexes ahead of time.
+
+The indexes of all the retriever specs are built in parallel for the configured embedding
+model and vector store provider, such that the agents never build them while answering a
+query. Each index directory gets a versioned manifest, see `index_artifacts.py`.
+
+Run from the project root by (or with `python -m jutulgpt`)
+
+```bash
+uv run jutulgpt index build --workers 4
+uv run jutulgpt index verify
+uv run jutulgpt index stats
+uv run jutulgpt index prune --dry-run
+```
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from jutulgpt.cli import colorscheme, print_to_console
+from jutulgpt.configuration import BaseConfiguration
+from jutulgpt.rag.fanout import get_retriever_specs_by_collection
+from jutulgpt.rag.index_artifacts import (
+    INDEX_FORMAT_VERSION,
+    IndexArtifact,
+    directory_size,
+)
+from jutulgpt.rag.indexing import get_vectorstore_ids
+from jutulgpt.rag.retrieval import (
+    build_index,
+    check_index_artifact,
+    get_persist_path,
+    is_index_stale,
+    load_saved_vectorstore,
+)
+from jutulgpt.rag.retriever_specs import RetrieverSpec
+
+
+def _get_configuration(args: argparse.Namespace) -> BaseConfiguration:
+    overrides = {
+        "embedding_model": args.embedding_model,
+        "retriever_provider": args.retriever_provider,
+        "faiss_index_factory": args.faiss_index_factory,
+    }
+    return BaseConfiguration(
+        **{name: value for name, value in overrides.items() if value is not None}
+    )
+
+
+def _get_specs(args: argparse.Namespace) -> list[RetrieverSpec]:
+    specs = get_retriever_specs_by_collection()
+    if not args.collection:
+        return list(specs.values())
+    unknown = [name for name in args.collection if name not in specs]
+    if unknown:
+        raise SystemExit(
+            f"Unknown collections: {', '.join(unknown)}. Expected some of: {', '.join(specs)}"
+        )
+    return [specs[name] for name in args.collection]
+
+
+def build(args: argparse.Namespace) -> int:
+    configuration = _get_configuration(args)
+    specs = _get_specs(args)
+    print_to_console(
+        text=f"Building {len(specs)} indexes with `{configuration.embedding_model}` "
+        f"and `{configuration.retriever_provider}`, using {args.workers} workers.",
+        title="Index build",
+        border_style=colorscheme.message,
+    )
+
+    start_time = time.time()
+    lines = []
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(build_index, configuration, spec, args.rebuild): spec
+            for spec in specs
+        }
+        for future in as_completed(futures):
+            spec = futures[future]
+            try:
+                artifact = future.result()
+            except Exception as e:
+                failed += 1
+                lines.append(f"- `{spec.collection_name}`: failed: {e}")
+            else:
+                lines.append(
+                    f"- `{spec.collection_name}`: {artifact.n_chunks} chunks "
+                    f"in {artifact.build_seconds} seconds"
+                )
+
+    print_to_console(
+        text="\n".join(sorted(lines))
+        + f"\n\nFinished in {round(time.time() - start_time, 1)} seconds.",
+        title="Index build",
+        border_style=colorscheme.error if failed else colorscheme.success,
+    )
+    return 1 if failed else 0
+
+
+def verify(args: argparse.Namespace) -> int:
+    """
+    Check that every index is built for the configuration, up to date and complete. The index
+    directories are only read.
+    """
+    configuration = _get_configuration(args)
+
+    lines = []
+    n_problems = 0
+    for spec in _get_specs(args):
+        problem = check_index_artifact(configuration, spec)
+        if problem is None and is_index_stale(configuration, spec):
+            problem = "is out of date with the sources"
+        if problem is None:
+            artifact = IndexArtifact.load(get_persist_path(configuration, spec))
+            vectorstore = load_saved_vectorstore(configuration, spec)
+            if vectorstore is None:
+                problem = "has no memory-mapped document store"
+            else:
+                n_vectors = len(get_vectorstore_ids(vectorstore))
+                if n_vectors != artifact.n_chunks:
+                    problem = f"has {n_vectors} vectors, but the manifest lists {artifact.n_chunks} chunks"
+        if problem is None:
+            lines.append(f"- `{spec.collection_name}`: ok")
+        else:
+            n_problems += 1
+            lines.append(f"- `{spec.collection_name}`: {problem}")
+
+    if n_problems:
+        lines.append("\nRun `jutulgpt index build` to fix the indexes.")
+    print_to_console(
+        text="\n".join(lines),
+        title="Index verification",
+        border_style=colorscheme.error if n_problems else colorscheme.success,
+    )
+    return 1 if n_problems else 0
+
+
+def stats(args: argparse.Namespace) -> int:
+    configuration = _get_configuration(args)
+    lines = [
+        "| Collection | Status | Chunks | Size on disk | Built at | Build time |",
+        "| --- | --- | --- | --- | --- | --- |",
+    ]
+    for spec in _get_specs(args):
+        persist_path = get_persist_path(configuration, spec)
+        problem = check_index_artifact(configuration, spec)
+        artifact = IndexArtifact.load(persist_path)
+        if problem is not None:
+            status = problem
+        elif is_index_stale(configuration, spec):
+            status = "out of date"
+        else:
+            status = "ok"
+        size = (
+            f"{directory_size(persist_path) / 1e6:.1f} MB"
+            if os.path.exists(persist_path)
+            else "-"
+        )
+        if artifact is None:
+            lines.append(f"| {spec.collection_name} | {status} | - | {size} | - | - |")
+        else:
+            lines.append(
+                f"| {spec.collection_name} | {status} | {artifact.n_chunks} | {size} "
+                f"| {artifact.built_at} | {artifact.build_seconds} s |"
+            )
+
+    print_to_console(
+        text="\n".join(lines),
+        title=f"Indexes for `{configuration.embedding_model}` and `{configuration.retriever_provider}`",
+        border_style=colorscheme.message,
+    )
+    return 0
+
+
+def _find_prunable_indexes(
+    configuration: BaseConfiguration, unused: bool
+) -> list[tuple[str, str]]:
+    """
+    Find the index directories to delete: leftovers from interrupted builds, and indexes
+    without a manifest or with an outdated format. With `unused`, also the complete indexes
+    of other embedding models, providers or index types than the configured ones.
+    """
+    specs = get_retriever_specs_by_collection().values()
+    in_use = {get_persist_path(configuration, spec) for spec in specs}
+    store_dirs = {
+        os.path.dirname(get_persist_path(configuration, spec)) for spec in specs
+    }
+
+    prunable = []
+    for store_dir in sorted(store_dirs):
+        for name in sorted(os.listdir(store_dir)):
+            path = os.path.join(store_dir, name)
+            if not name.startswith("retriever_") or not os.path.isdir(path):
+                continue
+            if name.endswith(".tmp"):
+                prunable.append((path, "left by an interrupted build"))
+                continue
+            artifact = IndexArtifact.load(path)
+            if artifact is None:
+                prunable.append((path, "has no index manifest"))
+            elif artifact.format_version != INDEX_FORMAT_VERSION:
+                prunable.append(
+                    (path, f"has the outdated format version {artifact.format_version}")
+                )
+            elif unused and path not in in_use:
+                prunable.append((path, "is not used by the configuration"))
+    return prunable
+
+
+def prune(args: argparse.Namespace) -> int:
+    configuration = _get_configuration(args)
+    prunable = _find_prunable_indexes(configuration, args.unused)
+    if not prunable:
+        text = "Nothing to prune."
+    else:
+        freed = 0
+        lines = []
+        for path, reason in prunable:
+            freed += directory_size(path)
+            lines.append(f"- `{os.path.basename(path)}` {reason}")
+            if not args.dry_run:
+                shutil.rmtree(path)
+        action = "Would delete" if args.dry_run else "Deleted"
+        text = (
+            "\n".join(lines)
+            + f"\n\n{action} {len(prunable)} indexes, {freed / 1e6:.1f} MB."
+        )
+
+    print_to_console(
+        text=text,
+        title="Index prune",
+        border_style=colorscheme.message,
+    )
+    return 0
+
+
+def add_index_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Add the `index` command with its subcommands to the parser."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--embedding-model",
+        default=None,
+        help="The embedding model, f.ex. `openai:text-embedding-3-small`. By default the configured one.",
+    )
+    common.add_argument(
+        "--retriever-provider",
+        choices=["faiss", "chroma"],
+        default=None,
+        help="The vector store provider. By default the configured one.",
+    )
+    common.add_argument(
+        "--faiss-index-factory",
+        default=None,
+        help="The FAISS index type, f.ex. `HNSW32`. By default the configured one.",
+    )
+
+    parser = subparsers.add_parser(
+        "index", help="Build and inspect the retrieval indexes."
+    )
+    commands = parser.add_subparsers(dest="index_command", required=True)
+
+    build_parser = commands.add_parser(
+        "build",
+        parents=[common],
+        help="Build the indexes, or update them with the sources.",
+    )
+    build_parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(4, os.cpu_count() or 1),
+        help="Number of indexes to build in parallel.",
+    )
+    build_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Delete the indexes and build them from scratch. Cached embeddings are reused.",
+    )
+    build_parser.add_argument(
+        "--collection",
+        action="append",
+        help="Only build this collection, f.ex. `jutuldarcy_examples`. Can be repeated.",
+    )
+    build_parser.set_defaults(func=build)
+
+    verify_parser = commands.add_parser(
+        "verify",
+        parents=[common],
+        help="Check that the indexes are built, up to date and complete.",
+    )
+    verify_parser.add_argument("--collection", action="append")
+    verify_parser.set_defaults(func=verify)
+
+    stats_parser = commands.add_parser(
+        "stats", parents=[common], help="Show the size and status of the indexes."
+    )
+    stats_parser.add_argument("--collection", action="append")
+    stats_parser.set_defaults(func=stats)
+
+    prune_parser = commands.add_parser(
+        "prune",
+        parents=[common],
+        help="Delete incomplete and outdated index directories.",
+    )
+    prune_parser.add_argument(
+        "--unused",
+        action="store_true",
+        help="Also delete the indexes of other embedding models, providers or index types.",
+    )
+    prune_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list what would be deleted.",
+    )
+    prune_parser.set_defaults(func=prune)
@@ -0,0 +1,106 @@
+"""
+Incremental updates of the vector stores.
+
+Every chunk gets an id from a hash of its text and metadata. When the corpus changes, we
+compare the ids of the current chunks with the ids in the vector store, and only add the new
+chunks and delete the ones that disappeared. Together with the document embedding cache,
+this means a rebuild only embeds new or changed chunks.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from jutulgpt.rag.embedding_pipeline import embed_chunks
+from jutulgpt.rag.near_duplicates import PROVENANCE_KEYS
+
+
+def chunk_id(doc: Document) -> str:
+    """
+    A stable id for a chunk, from a hash of its text and metadata. The provenance of removed
+    near-duplicates is left out, such that the id matches the chunk as it was split.
+    """
+    metadata = json.dumps(
+        {k: v for k, v in doc.metadata.items() if k not in PROVENANCE_KEYS},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(f"{doc.page_content}\n{metadata}".encode("utf-8")).hexdigest()
+
+
+def with_chunk_ids(chunks: list[Document]) -> tuple[list[Document], list[str]]:
+    """
+    Get the chunk ids of the chunks. Identical chunks are only kept once, as they would get the same id.
+
+    Returns:
+        tuple[list[Document], list[str]]: The unique chunks and their ids.
+    """
+    unique_chunks = {}
+    for chunk in chunks:
+        unique_chunks.setdefault(chunk_id(chunk), chunk)
+    return list(unique_chunks.values()), list(unique_chunks.keys())
+
+
+def get_vectorstore_ids(vectorstore: VectorStore) -> set[str]:
+    """Get the ids of all chunks in a FAISS or Chroma vector store."""
+    if hasattr(vectorstore, "index_to_docstore_id"):  # FAISS
+        return set(vectorstore.index_to_docstore_id.values())
+    if hasattr(vectorstore, "_collection"):  # Chroma
+        return set(vectorstore.get(include=[])["ids"])
+    raise ValueError(f"Unsupported vector store: {type(vectorstore).__name__}")
+
+
+@dataclass
+class IndexSyncResult:
+    added: int
+    removed: int
+    unchanged: int
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def sync_vectorstore(
+    vectorstore: VectorStore,
+    chunks: list[Document],
+    batch_size: int = 256,
+    max_tokens_per_batch: int = 8000,
+    max_concurrency: int = 4,
+) -> IndexSyncResult:
+    """
+    Update the vector store in place, such that it contains exactly the given chunks. The new
+    chunks are first embedded concurrently into the embedding cache.
+    """
+    chunks, ids = with_chunk_ids(chunks)
+    existing_ids = get_vectorstore_ids(vectorstore)
+
+    removed_ids = list(existing_ids - set(ids))
+    new_chunks = [
+        (chunk, id) for chunk, id in zip(chunks, ids) if id not in existing_ids
+    ]
+
+    if removed_ids:
+        vectorstore.delete(ids=removed_ids)
+    embed_chunks(
+        vectorstore.embeddings,
+        [chunk for chunk, _ in new_chunks],
+        max_tokens_per_batch=max_tokens_per_batch,
+        max_concurrency=max_concurrency,
+    )
+    for i in range(0, len(new_chunks), batch_size):
+        batch = new_chunks[i : i + batch_size]
+        vectorstore.add_documents(
+            documents=[chunk for chunk, _ in batch], ids=[id for _, id in batch]
+        )
+
+    return IndexSyncResult(
+        added=len(new_chunks),
+        removed=len(removed_ids),
+        unchanged=len(ids) - len(new_chunks),
+    )
@@ -0,0 +1,230 @@
+"""
+Local, offline embedding of text with a sentence-embedding model on the CPU.
+
+Used for embedding models on the form `local:<model directory>`, f.ex. a
+sentence-transformers model like `BAAI/bge-small-en-v1.5` downloaded with
+`huggingface-cli download BAAI/bge-small-en-v1.5 --local-dir src/jutulgpt/rag/models/bge-small-en-v1.5`.
+If the directory contains an ONNX export of the model (`model.onnx` or `onnx/model.onnx`)
+and a `tokenizer.json`, it is run with ONNX Runtime. Otherwise it is loaded with
+transformers. Nothing is downloaded.
+
+The texts are embedded in batches of similar length to limit the padding, and pooled as
+configured by the sentence-transformers files of the model (mean pooling by default), then
+normalized. The query and document prompts of the model (f.ex. `query: ` for E5 models) are
+prepended.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.configuration import PROJECT_ROOT
+
+LOCAL_MODEL_DIR = str(PROJECT_ROOT / "rag" / "models")
+_MAX_LENGTH = 512
+
+
+def resolve_model_path(model: str) -> str:
+    """Find the model directory, given as a path or as a name in `LOCAL_MODEL_DIR`."""
+    candidates = [os.path.expanduser(model), os.path.join(LOCAL_MODEL_DIR, model)]
+    for path in candidates:
+        if os.path.isdir(path):
+            return os.path.abspath(path)
+    raise ValueError(
+        f"Local embedding model not found: `{model}`. Expected a directory, or a model "
+        f"directory in {LOCAL_MODEL_DIR}."
+    )
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _find_onnx_model(model_path: Path) -> Optional[Path]:
+    for path in (model_path / "model.onnx", model_path / "onnx" / "model.onnx"):
+        if path.is_file():
+            return path
+    return None
+
+
+def pool(
+    hidden_states: np.ndarray, attention_mask: np.ndarray, pooling: str
+) -> np.ndarray:
+    """Pool the token embeddings of each text, by its first (CLS) token or the mean of its tokens."""
+    if hidden_states.ndim == 2:  # The model already pools
+        return hidden_states
+    if pooling == "cls":
+        return hidden_states[:, 0]
+    mask = attention_mask[:, :, None].astype(hidden_states.dtype)
+    return (hidden_states * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+class _OnnxEncoder:
+    def __init__(self, onnx_path: Path, model_path: Path, num_threads: int):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(onnx_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+        tokenizer_config = _read_json(model_path / "tokenizer_config.json")
+        self.tokenizer = Tokenizer.from_file(str(model_path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=_max_length(model_path))
+        pad_token = tokenizer_config.get("pad_token", "[PAD]")
+        if isinstance(pad_token, dict):
+            pad_token = pad_token.get("content", "[PAD]")
+        pad_id = self.tokenizer.token_to_id(pad_token)
+        self.tokenizer.enable_padding(
+            pad_id=pad_id if pad_id is not None else 0, pad_token=pad_token
+        )
+
+    def __call__(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array(
+                [e.attention_mask for e in encodings], dtype=np.int64
+            ),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        outputs = self.session.run(
+            None, {name: inputs[name] for name in inputs if name in self.input_names}
+        )
+        return outputs[0], inputs["attention_mask"]
+
+
+class _TransformersEncoder:
+    def __init__(self, model_path: Path, num_threads: int):
+        try:
+            import torch
+        except ImportError as e:
+            raise ImportError(
+                f"Running the local embedding model in {model_path} without an ONNX export "
+                "needs PyTorch, which is not installed. Install it with `uv pip install "
+                "torch`, or add an ONNX export of the model (`model.onnx` or "
+                "`onnx/model.onnx`, with a `tokenizer.json`)."
+            ) from e
+        from transformers import AutoModel, AutoTokenizer
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            str(model_path), local_files_only=True
+        )
+        self.model = AutoModel.from_pretrained(
+            str(model_path), local_files_only=True
+        ).eval()
+        self.max_length = _max_length(model_path)
+
+    def __call__(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt",
+        )
+        with self.torch.inference_mode():
+            hidden_states = self.model(**inputs).last_hidden_state
+        return hidden_states.float().numpy(), inputs["attention_mask"].numpy()
+
+
+def _max_length(model_path: Path) -> int:
+    """The maximal number of tokens of the model, at most 512."""
+    lengths = [
+        _read_json(model_path / "sentence_bert_config.json").get("max_seq_length"),
+        _read_json(model_path / "tokenizer_config.json").get("model_max_length"),
+    ]
+    return min([_MAX_LENGTH] + [int(n) for n in lengths if n])
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Embeds text in-process with a local sentence-embedding model.
+
+    Args:
+        model_path: Directory of the model.
+        batch_size: Number of texts embedded at a time.
+        num_threads: Number of CPU threads used by the model, or 0 for the default.
+        backend: `onnx` or `transformers`. By default ONNX Runtime if the model has an ONNX
+            export, and otherwise transformers.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        batch_size: int = 32,
+        num_threads: int = 0,
+        backend: Optional[str] = None,
+    ):
+        path = Path(resolve_model_path(model_path))
+        self.model_path = str(path)
+        self.batch_size = max(1, batch_size)
+
+        onnx_path = _find_onnx_model(path)
+        if backend is None:
+            backend = (
+                "onnx"
+                if onnx_path is not None and (path / "tokenizer.json").is_file()
+                else "transformers"
+            )
+        self.backend = backend
+        self._encoder: Any
+        match backend:
+            case "onnx":
+                if onnx_path is None:
+                    raise ValueError(f"No ONNX export of the model in {path}")
+                self._encoder = _OnnxEncoder(onnx_path, path, num_threads)
+            case "transformers":
+                self._encoder = _TransformersEncoder(path, num_threads)
+            case _:
+                raise ValueError(f"Unsupported local embedding backend: {backend}")
+
+        pooling_config = _read_json(path / "1_Pooling" / "config.json")
+        self.pooling = "cls" if pooling_config.get("pooling_mode_cls_token") else "mean"
+        prompts = _read_json(path / "config_sentence_transformers.json").get(
+            "prompts", {}
+        )
+        self.query_prompt = prompts.get("query", "")
+        self.document_prompt = prompts.get("document", prompts.get("passage", ""))
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        # Batch texts of similar length together, to limit the padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        embeddings: list[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start : start + self.batch_size]
+            hidden_states, attention_mask = self._encoder([texts[i] for i in batch])
+            pooled = pool(hidden_states, attention_mask, self.pooling)
+            pooled = pooled / np.maximum(
+                np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12
+            )
+            for i, embedding in zip(batch, pooled):
+                embeddings[i] = embedding
+        return np.stack(embeddings).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed([self.document_prompt + text for text in texts])
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([self.query_prompt + text])[0]
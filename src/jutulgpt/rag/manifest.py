@@ -0,0 +1,170 @@
+"""
+Manifests for tracking changes to the source files of the retrievers.
+
+A manifest records the path, size, modification time and content hash of every source file
+of a retriever spec, together with the splitting function and the settings of the
+near-duplicate removal used. Comparing the manifest with the files on disk is cheap, as files
+are only hashed if their size or modification time changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional
+
+from jutulgpt.rag.near_duplicates import near_duplicates_fingerprint
+from jutulgpt.rag.retriever_specs import RetrieverSpec
+
+# Increase when the chunks of unchanged files change, f.ex. new metadata, to split and
+# index them again
+MANIFEST_VERSION = 4
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    size: int
+    mtime: float
+    sha256: str
+
+
+@dataclass
+class ManifestDiff:
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+def split_func_fingerprint(split_func: Callable) -> str:
+    """A description of the splitting function that is stable between processes."""
+    if isinstance(split_func, partial):
+        arguments = [repr(arg) for arg in split_func.args] + [
+            f"{key}={value!r}" for key, value in sorted(split_func.keywords.items())
+        ]
+        return f"{split_func_fingerprint(split_func.func)}({', '.join(arguments)})"
+    return f"{split_func.__module__}.{split_func.__qualname__}"
+
+
+def list_source_files(spec: RetrieverSpec) -> list[str]:
+    """List the source files of the spec, skipping hidden files and directories."""
+    filetypes = [spec.filetype] if isinstance(spec.filetype, str) else spec.filetype
+    root = Path(spec.dir_path)
+    paths = set()
+    for filetype in filetypes:
+        for path in root.glob(f"**/*.{filetype}"):
+            if path.is_file() and not any(
+                part.startswith(".") for part in path.relative_to(root).parts
+            ):
+                paths.add(str(path))
+    return sorted(paths)
+
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@dataclass
+class SourceManifest:
+    split_func: str
+    files: dict[str, FileEntry] = field(default_factory=dict)
+    deduplication: str = ""  # The settings of the near-duplicate removal
+
+    @classmethod
+    def scan(
+        cls, spec: RetrieverSpec, previous: Optional[SourceManifest] = None
+    ) -> SourceManifest:
+        """
+        Create a manifest of the current source files. Files with the same size and
+        modification time as in the previous manifest are not re-hashed.
+        """
+        previous_files = previous.files if previous is not None else {}
+        files = {}
+        for path in list_source_files(spec):
+            stat = os.stat(path)
+            previous_entry = previous_files.get(path)
+            if (
+                previous_entry is not None
+                and previous_entry.size == stat.st_size
+                and previous_entry.mtime == stat.st_mtime
+            ):
+                files[path] = previous_entry
+            else:
+                files[path] = FileEntry(stat.st_size, stat.st_mtime, _hash_file(path))
+        return cls(
+            split_func=split_func_fingerprint(spec.split_func),
+            files=files,
+            deduplication=near_duplicates_fingerprint(),
+        )
+
+    def diff(self, other: SourceManifest) -> ManifestDiff:
+        """
+        Get the files added, changed and removed in the other manifest compared to this one.
+        If the splitting function or the near-duplicate removal changed, every file counts as
+        changed.
+        """
+        split_func_changed = (
+            self.split_func != other.split_func
+            or self.deduplication != other.deduplication
+        )
+        diff = ManifestDiff()
+        for path, entry in other.files.items():
+            if path not in self.files:
+                diff.added.append(path)
+            elif split_func_changed or self.files[path].sha256 != entry.sha256:
+                diff.changed.append(path)
+        diff.removed = [path for path in self.files if path not in other.files]
+        return diff
+
+    def fingerprint(self) -> str:
+        """
+        A hash of the manifest version, the splitting function, the near-duplicate removal and
+        the content of every file.
+        """
+        content = json.dumps(
+            [
+                MANIFEST_VERSION,
+                self.split_func,
+                self.deduplication,
+                sorted((p, e.sha256) for p, e in self.files.items()),
+            ]
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, path: str) -> Optional[SourceManifest]:
+        """Load the manifest, or return None if it is missing or in an older format."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(
+            split_func=data["split_func"],
+            files={p: FileEntry(**entry) for p, entry in data["files"].items()},
+            deduplication=data.get("deduplication", ""),
+        )
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "split_func": self.split_func,
+                    "deduplication": self.deduplication,
+                    "files": {p: asdict(entry) for p, entry in self.files.items()},
+                },
+                f,
+                indent=1,
+            )
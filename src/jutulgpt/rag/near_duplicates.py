@@ -0,0 +1,147 @@
+"""
+Removal of near-duplicate chunks when building an index.
+
+The JutulDarcy and Fimbul examples share a lot of boilerplate, f.ex. identical setups of
+wells or plotting code. Such chunks crowd out other results and waste tokens, so only one
+chunk of each group of near-identical chunks is indexed.
+
+Each chunk is represented by the MinHash signature of its word 5-shingles. Chunks with equal
+signature values in at least one band (locality-sensitive hashing) are candidates. Going from
+the longest chunk to the shortest, each chunk joins the cluster of the candidate representative
+it is most similar to, if their estimated Jaccard similarity is at least the threshold, and
+otherwise represents a new cluster. Every chunk of a cluster is thus near-identical to its
+representative, the longest chunk of the cluster, which is kept with the sources of the others
+in its metadata.
+"""
+
+from __future__ import annotations
+
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Metadata of the kept chunk, listing the sources of the removed near-duplicates. Stored as
+# a string and an integer, as Chroma only accepts scalar metadata.
+DUPLICATE_SOURCES_KEY = "duplicate_sources"
+N_DUPLICATES_KEY = "n_duplicates"
+PROVENANCE_KEYS = (DUPLICATE_SOURCES_KEY, N_DUPLICATES_KEY)
+
+NEAR_DUPLICATE_THRESHOLD = 0.85
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16
+SEED = 1
+
+_WORD_PATTERN = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+
+def near_duplicates_fingerprint(threshold: float = NEAR_DUPLICATE_THRESHOLD) -> str:
+    """A description of the settings of the near-duplicate removal, for the source manifests."""
+    return f"threshold={threshold}, shingle_size={SHINGLE_SIZE}, num_perm={NUM_PERM}, bands={BANDS}, seed={SEED}"
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set[str]:
+    """Get the sets of k consecutive words in the text, ignoring case and punctuation."""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+
+
+class MinHasher:
+    """MinHash signatures with `num_perm` random hash functions `(a * x + b) mod p`."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # As in datasketch, a * x + b may wrap around 2**64, which only adds to the mixing
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set),
+            dtype=np.uint64,
+            count=len(shingle_set),
+        )
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+
+def find_near_duplicate_clusters(
+    texts: list[str],
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+) -> list[list[int]]:
+    """
+    Group the texts whose estimated Jaccard similarity to the longest text of the group is
+    at least `threshold`.
+
+    Returns:
+        list[list[int]]: The clusters with more than one text, as sorted indices. The
+        longest text of a cluster (the first of them if several are equally long) is its
+        representative.
+    """
+    if len(texts) < 2:
+        return []
+    hasher = MinHasher(num_perm)
+    signatures = np.stack([hasher.signature(shingles(text)) for text in texts])
+    rows = num_perm // bands
+
+    candidates = defaultdict(set)
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, key in enumerate(
+            map(bytes, signatures[:, band * rows : (band + 1) * rows])
+        ):
+            buckets[key].append(i)
+        for bucket in buckets.values():
+            for i in bucket:
+                candidates[i].update(bucket)
+
+    clusters: dict[int, list[int]] = {}
+    for i in sorted(range(len(texts)), key=lambda i: (-len(texts[i]), i)):
+        representatives = [j for j in candidates[i] if j in clusters]
+        similarities = [
+            np.mean(signatures[i] == signatures[j]) for j in representatives
+        ]
+        if similarities and max(similarities) >= threshold:
+            clusters[representatives[int(np.argmax(similarities))]].append(i)
+        else:
+            clusters[i] = [i]
+    return [sorted(cluster) for cluster in clusters.values() if len(cluster) > 1]
+
+
+def remove_near_duplicates(
+    chunks: list[Document], threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> list[Document]:
+    """
+    Keep the longest chunk of each group of near-identical chunks, in the original order. The
+    kept chunk lists the sources of the removed ones in its metadata.
+    """
+    clusters = find_near_duplicate_clusters(
+        [chunk.page_content for chunk in chunks], threshold
+    )
+    removed = set()
+    kept = {}
+    for cluster in clusters:
+        representative = max(cluster, key=lambda i: len(chunks[i].page_content))
+        others = [i for i in cluster if i != representative]
+        removed.update(others)
+        sources = dict.fromkeys(
+            str(chunks[i].metadata.get("source", "")) for i in others
+        )
+        kept[representative] = Document(
+            page_content=chunks[representative].page_content,
+            metadata={
+                **chunks[representative].metadata,
+                DUPLICATE_SOURCES_KEY: "; ".join(sources),
+                N_DUPLICATES_KEY: len(others),
+            },
+        )
+    return [kept.get(i, chunk) for i, chunk in enumerate(chunks) if i not in removed]
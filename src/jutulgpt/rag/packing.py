@@ -0,0 +1,153 @@
+"""
+Packing of retrieved chunks into a token budget.
+
+The token count of every chunk is computed when the documents are split, and stored in the
+`n_tokens` metadata field. The chunks are then added in rank order while they fit in the
+budget. A chunk that does not fit is trimmed at a block boundary if there is still room for
+a useful part of it, and otherwise dropped, such that a smaller chunk further down may
+still fit. The best chunk is always included, trimmed if needed.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+from langchain_core.documents import Document
+
+from jutulgpt.rag.utils import count_tokens
+
+N_TOKENS_KEY = "n_tokens"
+
+# Reserved for the summary of what was trimmed or left out
+_SUMMARY_TOKENS = 32
+
+# Unindented lines starting with these continue the previous block instead of starting one
+_CONTINUATION_PATTERN = re.compile(r"^(end\b|else\b|elseif\b|catch\b|finally\b|[)\]}])")
+
+
+def chunk_tokens(doc: Document) -> int:
+    """Get the token count of the chunk, from its metadata if it was counted when it was split."""
+    n_tokens = doc.metadata.get(N_TOKENS_KEY)
+    return n_tokens if n_tokens is not None else count_tokens(doc.page_content)
+
+
+def add_token_counts(chunks: list[Document]) -> list[Document]:
+    """Store the token count of each chunk in its metadata."""
+    for chunk in chunks:
+        chunk.metadata[N_TOKENS_KEY] = count_tokens(chunk.page_content)
+    return chunks
+
+
+def split_blocks(text: str) -> list[str]:
+    """
+    Split the text before every unindented line starting a new block, f.ex. a top-level Julia
+    statement, a comment or a markdown paragraph. Lines such as `end` continue their block.
+    """
+    blocks = []
+    current = []
+    for line in text.splitlines():
+        starts_block = (
+            line[:1].strip() != "" and _CONTINUATION_PATTERN.match(line) is None
+        )
+        if starts_block and current:
+            blocks.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def trim_to_tokens(text: str, max_tokens: int, marker: str) -> str:
+    """
+    Cut the text to at most `max_tokens` tokens at a block boundary, ending with the marker.
+    If even the first block is too long, it is cut at a line boundary.
+    """
+    budget = max_tokens - count_tokens(marker)
+    kept, used = [], 0
+    for block in split_blocks(text):
+        n_tokens = count_tokens(block + "\n")
+        if used + n_tokens > budget:
+            break
+        kept.append(block)
+        used += n_tokens
+    if not kept:
+        for line in text.splitlines():
+            n_tokens = count_tokens(line + "\n")
+            if used + n_tokens > budget:
+                break
+            kept.append(line)
+            used += n_tokens
+
+    trimmed = "\n".join(kept)
+    # Close a markdown code block cut in the middle
+    if trimmed.count("```") % 2:
+        trimmed += "\n```"
+    return f"{trimmed}\n{marker}".lstrip("\n")
+
+
+@dataclass
+class PackedChunks:
+    docs: list[Document]
+    n_tokens: int
+    trimmed: list[Document] = field(default_factory=list)  # The chunks before trimming
+    dropped: list[Document] = field(default_factory=list)
+
+    def summary(self) -> str:
+        """Describe what was left out, or an empty string if nothing was."""
+        parts = []
+        if self.trimmed:
+            parts.append(f"trimmed {len(self.trimmed)}")
+        if self.dropped:
+            parts.append(f"left out {len(self.dropped)}")
+        if not parts:
+            return ""
+        return f"(To stay within the token budget, {' and '.join(parts)} of the retrieved chunks.)"
+
+
+def pack_chunks(
+    docs: list[Document],
+    token_budget: int,
+    overhead: Callable[[Document], int] = lambda doc: 0,
+    min_trimmed_tokens: int = 100,
+    marker: str = "# [...]",
+) -> PackedChunks:
+    """
+    Select the chunks to include, in rank order, with at most `token_budget` tokens in total,
+    including the summary of what was left out.
+
+    Args:
+        docs: The chunks, best first.
+        token_budget: The maximal number of tokens in total.
+        overhead: The number of tokens added when formatting the chunk, f.ex. for a header.
+        min_trimmed_tokens: Chunks are only trimmed if at least this many tokens remain.
+        marker: Line appended to a trimmed chunk.
+    """
+    packed = PackedChunks(docs=[], n_tokens=0)
+    token_budget -= _SUMMARY_TOKENS
+    for doc in docs:
+        remaining = token_budget - packed.n_tokens
+        n_tokens = chunk_tokens(doc) + overhead(doc)
+        if n_tokens <= remaining:
+            packed.docs.append(doc)
+            packed.n_tokens += n_tokens
+            continue
+
+        available = remaining - overhead(doc)
+        if available >= min_trimmed_tokens or not packed.docs:
+            content = trim_to_tokens(doc.page_content, max(available, 1), marker)
+            n_content_tokens = count_tokens(content)
+            packed.docs.append(
+                Document(
+                    id=doc.id,
+                    page_content=content,
+                    metadata={**doc.metadata, N_TOKENS_KEY: n_content_tokens},
+                )
+            )
+            packed.trimmed.append(doc)
+            packed.n_tokens += n_content_tokens + overhead(doc)
+        else:
+            packed.dropped.append(doc)
+    return packed
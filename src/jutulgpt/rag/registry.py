@@ -0,0 +1,243 @@
+"""
+Process-wide registry of the loaded embedding clients, vector stores and retrievers.
+
+Loading a vector store means reading the index from disk (FAISS) or opening a client on the
+persist directory (Chroma), so we only want to do this once per process. Everything is keyed
+by the retriever spec, embedding model, vector store provider and search parameters.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+
+@dataclass(frozen=True)
+class VectorStoreKey:
+    provider: str  # The vector store provider, f.ex. "faiss" or "chroma"
+    collection_name: str
+    persist_path: str
+    embedding_model: str
+
+
+@dataclass
+class VectorStoreStats:
+    key: VectorStoreKey
+    n_vectors: int
+    dimension: Optional[int]
+    index_bytes: Optional[int]  # Estimated memory used by the vectors
+    docstore_bytes: Optional[int]  # Estimated memory used by the stored documents
+
+
+def _search_kwargs_key(search_kwargs: dict) -> str:
+    return json.dumps(search_kwargs, sort_keys=True, default=str)
+
+
+def _faiss_index_bytes(index: Any) -> int:
+    import faiss
+
+    if isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+        return index.ntotal * index.d * 4  # float32 vectors
+    # Other index types (HNSW, IVF, PQ) store graphs or compressed codes
+    return faiss.serialize_index(index).nbytes
+
+
+def _faiss_stats(key: VectorStoreKey, vectorstore: Any) -> VectorStoreStats:
+    index = vectorstore.index
+    docstore_bytes = 0
+    for doc in getattr(vectorstore.docstore, "_dict", {}).values():
+        docstore_bytes += sys.getsizeof(doc.page_content) + sys.getsizeof(
+            str(doc.metadata)
+        )
+    return VectorStoreStats(
+        key=key,
+        n_vectors=index.ntotal,
+        dimension=index.d,
+        index_bytes=_faiss_index_bytes(index),
+        docstore_bytes=docstore_bytes,
+    )
+
+
+def _chroma_stats(key: VectorStoreKey, vectorstore: Any) -> VectorStoreStats:
+    collection = vectorstore._collection
+    n_vectors = collection.count()
+    dimension = None
+    if n_vectors:
+        embeddings = collection.get(limit=1, include=["embeddings"])["embeddings"]
+        if embeddings is not None and len(embeddings):
+            dimension = len(embeddings[0])
+    return VectorStoreStats(
+        key=key,
+        n_vectors=n_vectors,
+        dimension=dimension,
+        index_bytes=n_vectors * dimension * 4 if dimension else None,
+        docstore_bytes=None,  # The documents are kept on disk by Chroma
+    )
+
+
+class VectorStoreRegistry:
+    """
+    Keeps the embedding clients, vector stores and retrievers loaded during this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._embeddings: dict[str, Embeddings] = {}
+        self._vectorstores: dict[VectorStoreKey, VectorStore] = {}
+        self._retrievers: dict[tuple[VectorStoreKey, str, str], BaseRetriever] = {}
+        self._lexical_indexes: dict[tuple[str, str], Any] = {}
+        self._embedding_matrices: dict[VectorStoreKey, Any] = {}
+        # One lock per entry being created, such that different entries load concurrently
+        self._creating: dict[tuple[int, Any], threading.Lock] = {}
+        self._generation = 0  # Incremented when entries are dropped
+
+    def _get_or_create(
+        self, entries: dict, key: Any, factory: Callable[[], Any]
+    ) -> Any:
+        """
+        Get the entry of the key, creating it with `factory()` on first use. The global lock
+        is only held to look up the entry, so creating one entry does not block the others,
+        while concurrent callers asking for the same key wait for a single `factory()` call.
+        """
+        with self._lock:
+            if key in entries:
+                return entries[key]
+            key_lock = self._creating.setdefault((id(entries), key), threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in entries:
+                    return entries[key]
+                generation = self._generation
+            try:
+                value = factory()
+            except BaseException:
+                with self._lock:
+                    self._creating.pop((id(entries), key), None)
+                raise
+            with self._lock:
+                # Do not keep an entry that was dropped while it was being created
+                if generation == self._generation:
+                    entries[key] = value
+                self._creating.pop((id(entries), key), None)
+            return value
+
+    def get_embeddings(
+        self, model: str, factory: Callable[[str], Embeddings]
+    ) -> Embeddings:
+        """Get the embedding client for the model, creating it with `factory(model)` on first use."""
+        return self._get_or_create(self._embeddings, model, lambda: factory(model))
+
+    def register_embeddings(self, model: str, embeddings: Embeddings) -> None:
+        """Use the given embedding client for the model, f.ex. a local stand-in for testing."""
+        with self._lock:
+            self._embeddings[model] = embeddings
+
+    def get_vectorstore(
+        self, key: VectorStoreKey, factory: Callable[[], VectorStore]
+    ) -> VectorStore:
+        """Get the vector store, loading or building it with `factory()` on first use."""
+        return self._get_or_create(self._vectorstores, key, factory)
+
+    def get_lexical_index(
+        self, collection_name: str, path: str, factory: Callable[[], Any]
+    ) -> Any:
+        """Get the keyword index (f.ex. BM25) of the collection, loading or building it with `factory()` on first use."""
+        key = (collection_name, path)
+        return self._get_or_create(self._lexical_indexes, key, factory)
+
+    def get_embedding_matrix(
+        self, key: VectorStoreKey, factory: Callable[[], Any]
+    ) -> Any:
+        """Get the matrix of the chunk embeddings of the vector store, creating it with `factory()` on first use."""
+        return self._get_or_create(self._embedding_matrices, key, factory)
+
+    def get_retriever(
+        self,
+        key: VectorStoreKey,
+        search_type: str,
+        search_kwargs: dict,
+        factory: Callable[[], BaseRetriever],
+    ) -> BaseRetriever:
+        """Get the retriever for the vector store and search parameters, creating it with `factory()` on first use."""
+        retriever_key = (key, search_type, _search_kwargs_key(search_kwargs))
+        return self._get_or_create(self._retrievers, retriever_key, factory)
+
+    def invalidate(
+        self,
+        collection_name: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        provider: Optional[str] = None,
+    ) -> int:
+        """
+        Drop the loaded vector stores matching all the given filters, together with their
+        retrievers. With no filters, every vector store is dropped. Keyword indexes are
+        dropped when filtering only on the collection name.
+
+        Returns:
+            int: The number of vector stores dropped.
+        """
+
+        def matches(key: VectorStoreKey) -> bool:
+            return (
+                (collection_name is None or key.collection_name == collection_name)
+                and (embedding_model is None or key.embedding_model == embedding_model)
+                and (provider is None or key.provider == provider)
+            )
+
+        with self._lock:
+            self._generation += 1
+            dropped = [key for key in self._vectorstores if matches(key)]
+            for key in dropped:
+                del self._vectorstores[key]
+            for key in [k for k in self._embedding_matrices if matches(k)]:
+                del self._embedding_matrices[key]
+            for retriever_key in [k for k in self._retrievers if matches(k[0])]:
+                del self._retrievers[retriever_key]
+            if embedding_model is None and provider is None:
+                for lexical_key in [
+                    k
+                    for k in self._lexical_indexes
+                    if collection_name is None or k[0] == collection_name
+                ]:
+                    del self._lexical_indexes[lexical_key]
+            return len(dropped)
+
+    def clear(self) -> None:
+        """Drop everything, including the embedding clients."""
+        with self._lock:
+            self._generation += 1
+            self._embeddings.clear()
+            self._vectorstores.clear()
+            self._retrievers.clear()
+            self._lexical_indexes.clear()
+            self._embedding_matrices.clear()
+
+    def stats(self) -> list[VectorStoreStats]:
+        """Get the size and estimated memory use of each loaded vector store."""
+        with self._lock:
+            items = list(self._vectorstores.items())
+
+        stats = []
+        for key, vectorstore in items:
+            if key.provider == "faiss":
+                stats.append(_faiss_stats(key, vectorstore))
+            elif key.provider == "chroma":
+                stats.append(_chroma_stats(key, vectorstore))
+            else:
+                stats.append(VectorStoreStats(key, 0, None, None, None))
+        return stats
+
+    def memory_usage(self) -> int:
+        """Get the estimated total memory in bytes used by the loaded vector stores."""
+        return sum((s.index_bytes or 0) + (s.docstore_bytes or 0) for s in self.stats())
+
+
+registry = VectorStoreRegistry()
@@ -0,0 +1,142 @@
+"""
+Local reranking of the retrieved chunks with FlashRank.
+
+The base retriever fetches a wider set of candidates, which are scored against the query by
+a small cross-encoder running on the CPU, and only the best `top_n` are returned. The
+candidates not seen before for the query are scored in a single batch, and the scores are
+kept in an LRU cache keyed by the model, the query and the chunk id.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from jutulgpt.configuration import PROJECT_ROOT
+from jutulgpt.rag.embedding_cache import normalize_query
+from jutulgpt.rag.indexing import chunk_id
+
+DEFAULT_RERANK_MODEL = "ms-marco-MiniLM-L-12-v2"
+RERANK_MODEL_DIR = str(PROJECT_ROOT / "rag" / "retriever_store" / "flashrank")
+
+
+@lru_cache(maxsize=None)
+def get_ranker(model: str = DEFAULT_RERANK_MODEL, max_length: int = 512) -> Any:
+    """Load the FlashRank model once per process. The model is downloaded on first use."""
+    from flashrank import Ranker
+
+    return Ranker(model_name=model, cache_dir=RERANK_MODEL_DIR, max_length=max_length)
+
+
+class RerankScoreCache:
+    """Thread-safe LRU cache of the (model, query, chunk id) scores."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._scores: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, model: str, query: str, ids: list[str]) -> dict[str, float]:
+        found = {}
+        with self._lock:
+            for id in ids:
+                key = (model, query, id)
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[id] = self._scores[key]
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+        return found
+
+    def set_many(self, model: str, query: str, scores: dict[str, float]) -> None:
+        with self._lock:
+            for id, score in scores.items():
+                self._scores[(model, query, id)] = score
+                self._scores.move_to_end((model, query, id))
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+score_cache = RerankScoreCache()
+
+
+def _document_id(doc: Document) -> str:
+    return doc.id if doc.id is not None else chunk_id(doc)
+
+
+class FlashRerankRetriever(BaseRetriever):
+    """
+    Retriever reranking the candidates from the base retriever with FlashRank, and returning
+    the `top_n` best chunks with a score above `score_threshold`.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base_retriever: BaseRetriever
+    model: str = DEFAULT_RERANK_MODEL
+    top_n: int = 3
+    score_threshold: Optional[float] = None
+    ranker: Any = None  # Loaded with `get_ranker` if not given
+
+    def score(self, query: str, documents: list[Document]) -> list[float]:
+        """Score the documents against the query, only running the model on the uncached ones."""
+        from flashrank import RerankRequest
+
+        normalized_query = normalize_query(query)
+        ids = [_document_id(doc) for doc in documents]
+        scores = score_cache.get_many(self.model, normalized_query, ids)
+
+        missing = [
+            {"id": id, "text": doc.page_content}
+            for id, doc in dict(zip(ids, documents)).items()
+            if id not in scores
+        ]
+        if missing:
+            ranker = self.ranker or get_ranker(self.model)
+            results = ranker.rerank(RerankRequest(query=query, passages=missing))
+            new_scores = {result["id"]: float(result["score"]) for result in results}
+            score_cache.set_many(self.model, normalized_query, new_scores)
+            scores.update(new_scores)
+
+        return [scores[id] for id in ids]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        candidates = self.base_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        if not candidates:
+            return []
+
+        scored = sorted(
+            zip(candidates, self.score(query, candidates)),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        documents = []
+        for doc, score in scored:
+            if self.score_threshold is not None and score < self.score_threshold:
+                break
+            documents.append(
+                Document(
+                    id=doc.id,
+                    page_content=doc.page_content,
+                    metadata={**doc.metadata, "relevance_score": score},
+                )
+            )
+            if len(documents) == self.top_n:
+                break
+        return documents
@@ -1,16 +1,55 @@
+import multiprocessing
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager
-from typing import Generator, TypedDict
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import Callable, Generator, Optional, TypedDict
 
-# from langchain.retrievers import ContextualCompressionRetriever
-# from langchain.retrievers.document_compressors import FlashrankRerank
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.runnables import RunnableConfig
-from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.vectorstores import VectorStore
 
-# from langchain_core.documents import BaseDocumentCompressor
 from jutulgpt.configuration import BaseConfiguration
+from jutulgpt.rag.bm25 import BM25Index
+from jutulgpt.rag.chunk_store import SQLiteChunkStore
+from jutulgpt.rag.embedding_cache import CachedEmbeddings
+from jutulgpt.rag.embedding_pipeline import embed_chunks
+from jutulgpt.rag.faiss_index import (
+    build_faiss_vectorstore,
+    index_factory_suffix,
+    is_mmap_vectorstore,
+    load_mmap_faiss_vectorstore,
+    replace_faiss_contents,
+    save_faiss_vectorstore,
+    set_faiss_search_params,
+    supports_removal,
+)
+from jutulgpt.rag.hybrid import HybridRetriever
+from jutulgpt.rag.index_artifacts import (
+    INDEX_FORMAT_VERSION,
+    IndexArtifact,
+    IndexNotBuiltError,
+)
+from jutulgpt.rag.indexing import (
+    IndexSyncResult,
+    get_vectorstore_ids,
+    sync_vectorstore,
+    with_chunk_ids,
+)
+from jutulgpt.rag.manifest import SourceManifest
+from jutulgpt.rag.mmr import EmbeddingMatrix, MMRRetriever
+from jutulgpt.rag.near_duplicates import remove_near_duplicates
+from jutulgpt.rag.packing import add_token_counts
+from jutulgpt.rag.registry import VectorStoreKey, registry
+from jutulgpt.rag.rerank import DEFAULT_RERANK_MODEL, FlashRerankRetriever
 from jutulgpt.rag.retriever_specs import RetrieverSpec
+from jutulgpt.rag.semantic_cache import result_cache_namespace
 from jutulgpt.utils import get_provider_and_model
 
 
@@ -19,82 +58,197 @@ class RetrievalParams(TypedDict):
     search_kwargs: dict
 
 
-def make_text_encoder(model: str) -> Embeddings:
-    """Connect to the configured text encoder."""
+def make_text_encoder(
+    model: str, local_batch_size: int = 32, local_threads: int = 0
+) -> Embeddings:
+    """
+    Connect to the configured text encoder, with a cache for the query embeddings. Models on
+    the form `local:<model directory>` are run in-process, see `local_embeddings.py`.
+    """
+    fully_specified_name = model
     provider, model = model.split(":", maxsplit=1)
     match provider:
         case "openai":
             from langchain_openai import OpenAIEmbeddings
 
-            return OpenAIEmbeddings(model=model)
+            embeddings = OpenAIEmbeddings(model=model)
         case "ollama":
             from langchain_ollama import OllamaEmbeddings
 
-            return OllamaEmbeddings(model=model)
+            embeddings = OllamaEmbeddings(model=model)
+        case "local":
+            from jutulgpt.rag.local_embeddings import LocalEmbeddings
+
+            embeddings = LocalEmbeddings(
+                model, batch_size=local_batch_size, num_threads=local_threads
+            )
 
         case _:
             raise ValueError(f"Unsupported embedding provider: {provider}")
 
+    return CachedEmbeddings(embeddings, model=fully_specified_name)
 
-def _load_and_split_docs(spec: RetrieverSpec) -> list:
-    import pickle
 
-    from langchain_community.document_loaders import DirectoryLoader, TextLoader
+def _manifest_path(spec: RetrieverSpec) -> str:
+    return os.path.splitext(spec.cache_path)[0] + "_manifest.json"
 
-    # Load or cache documents
-    if isinstance(spec.filetype, str):
-        filetypes = [spec.filetype]
-    else:
-        filetypes = spec.filetype
 
-    loaders = []
-    for filetype in filetypes:
-        loader = DirectoryLoader(
-            path=spec.dir_path,
-            glob=f"**/*.{filetype}",
-            show_progress=True,
-            loader_cls=TextLoader,
-        )
-        loaders.append(loader)
+def _vectorstore_manifest_path(persist_path: str) -> str:
+    return os.path.join(persist_path, "sources_manifest.json")
 
-    if os.path.exists(spec.cache_path):
-        with open(spec.cache_path, "rb") as f:
-            docs = pickle.load(f)
-    else:
-        docs = []
-        for loader in loaders:
-            docs.extend(loader.load())
 
-        with open(spec.cache_path, "wb") as f:
-            pickle.dump(docs, f)
+def _bm25_index_path(spec: RetrieverSpec) -> str:
+    # Kept next to the vector stores, but shared between the embedding models
+    return spec.persist_path("bm25") + ".json"
+
+
+def _load_and_split_file(split_func: Callable, path: str) -> list[Document]:
+    from langchain_community.document_loaders import TextLoader
 
-    # Split documents
     chunks = []
-    for doc in docs:
-        chunks.extend(spec.split_func(doc))
+    for doc in TextLoader(path).load():
+        chunks.extend(split_func(doc))
+    return add_token_counts(chunks)
+
+
+# Below this number of files, starting the worker processes takes longer than the splitting
+_MIN_FILES_FOR_PROCESS_POOL = 8
+
+
+def _load_and_split_files(
+    spec: RetrieverSpec, paths: list[str], max_workers: Optional[int] = None
+) -> list[list[Document]]:
+    """
+    Load and split the files in a process pool. The chunks are returned in the order of the paths.
+    """
+    from rich.progress import track
+
+    # Rich shows one progress bar at a time, so parallel index builds do not show any
+    show_progress = threading.current_thread() is threading.main_thread()
+    description = f"Loading and splitting {spec.collection_name}"
+    load_and_split = partial(_load_and_split_file, spec.split_func)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+
+    if len(paths) < _MIN_FILES_FOR_PROCESS_POOL or max_workers <= 1:
+        return [
+            load_and_split(path)
+            for path in track(
+                paths,
+                description=description,
+                transient=True,
+                disable=not show_progress,
+            )
+        ]
+
+    # Spawn the workers, as forking a process with other threads running (f.ex. parallel
+    # index builds) can deadlock the workers
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return list(
+            track(
+                executor.map(load_and_split, paths),
+                total=len(paths),
+                description=description,
+                transient=True,
+                disable=not show_progress,
+            )
+        )
+
+
+@lru_cache(maxsize=None)
+def _open_chunk_store(path: str) -> SQLiteChunkStore:
+    return SQLiteChunkStore(path)
+
+
+def get_chunk_store(spec: RetrieverSpec) -> SQLiteChunkStore:
+    """
+    Get the chunk store of the spec, up to date with the sources. Only the files that changed
+    since the last call are loaded and split again.
+    """
+    store = _open_chunk_store(spec.cache_path)
+    manifest_path = _manifest_path(spec)
+    previous_manifest = SourceManifest.load(manifest_path)
+    # The manifest belongs to another store, f.ex. a deleted one
+    if previous_manifest is not None and store.sources() != set(
+        previous_manifest.files
+    ):
+        previous_manifest = None
+
+    manifest = SourceManifest.scan(spec, previous_manifest)
+    diff = (
+        previous_manifest
+        or SourceManifest(manifest.split_func, deduplication=manifest.deduplication)
+    ).diff(manifest)
+
+    if not diff.is_empty or previous_manifest is None:
+        removed = sorted(store.sources() - set(manifest.files))
+        paths = sorted(
+            manifest.files if previous_manifest is None else diff.added + diff.changed
+        )
+        store.replace_sources(
+            dict(zip(paths, _load_and_split_files(spec, paths))),
+            removed_sources=removed,
+        )
+    if manifest != previous_manifest:
+        manifest.save(manifest_path)
+    return store
+
+
+def _load_and_split_docs(spec: RetrieverSpec) -> list[Document]:
+    """
+    Get the chunks of the spec to index, loading and splitting only the changed files. Of
+    each group of near-identical chunks, only one is kept. The result is kept in the chunk
+    store until the chunks change.
+    """
+    store = get_chunk_store(spec)
+    fingerprint = SourceManifest.load(_manifest_path(spec)).fingerprint()
+    chunks = store.get_deduplicated(fingerprint)
+    if chunks is None:
+        chunks = remove_near_duplicates(list(store.iter_documents()))
+        store.set_deduplicated(fingerprint, chunks)
     return chunks
 
 
-@contextmanager
-def make_faiss_retriever(
+def _embed_chunks_for_index(
+    configuration: BaseConfiguration,
+    embedding_model: Embeddings,
+    docs: list[Document],
+) -> None:
+    """Embed the chunks concurrently into the embedding cache, before building the index from them."""
+    stats = embed_chunks(
+        embedding_model,
+        docs,
+        max_tokens_per_batch=configuration.embedding_batch_tokens,
+        max_concurrency=configuration.embedding_max_concurrency,
+    )
+    if stats is not None:
+        print(
+            f"Embedded {stats.embedded} chunks in {stats.batches} batches ({stats.cached} cached)"
+        )
+
+
+def load_faiss_vectorstore(
     configuration: BaseConfiguration,
     spec: RetrieverSpec,
     embedding_model: Embeddings,
-    search_type: str,
-    search_kwargs: dict,
-) -> Generator[VectorStoreRetriever, None, None]:
+    persist_path: Optional[str] = None,
+) -> VectorStore:
     """
-    Create or load a FAISS retriever, saving the index locally to avoid re-indexing.
-    Uses configuration to determine file paths and splitting functions.
+    Load a FAISS vector store, or create it and save the index locally to avoid re-indexing.
+    Uses configuration to determine file paths, splitting functions and the index type,
+    unless another `persist_path` is given.
     """
-    import os
-
     from langchain_community.vectorstores import FAISS
 
-    # Get the persist path by checking what is the specified embedding model
-    persist_path = spec.persist_path(
-        get_provider_and_model(configuration.embedding_model)[0]
-    )
+    # Get the persist path by checking what is the specified embedding model and index type
+    persist_path = persist_path or get_persist_path(configuration, spec)
+
+    # Memory map the saved index and documents, instead of reading them into memory
+    if configuration.faiss_mmap and os.path.exists(persist_path):
+        vectorstore = load_mmap_faiss_vectorstore(persist_path, embedding_model)
+        if vectorstore is not None:
+            return vectorstore
 
     # Load or create FAISS index
     if os.path.exists(persist_path):
@@ -103,43 +257,39 @@ def make_faiss_retriever(
             embedding_model,
             allow_dangerous_deserialization=True,
         )
+        if configuration.faiss_mmap:
+            save_faiss_vectorstore(vectorstore, persist_path, mmap_mode=True)
     else:
-        print(f"Creating new FAISS index at {spec.persist_path}")
-        docs = _load_and_split_docs(spec)
-        vectorstore = FAISS.from_documents(
-            documents=docs,
-            embedding=embedding_model,
+        print(f"Creating new FAISS index at {persist_path}")
+        docs, ids = with_chunk_ids(_load_and_split_docs(spec))
+        _embed_chunks_for_index(configuration, embedding_model, docs)
+        vectorstore = build_faiss_vectorstore(
+            docs, ids, embedding_model, configuration.faiss_index_factory
         )
-        vectorstore.save_local(persist_path)
+        save_faiss_vectorstore(vectorstore, persist_path, configuration.faiss_mmap)
 
-    yield vectorstore.as_retriever(
-        search_type=search_type,
-        search_kwargs={**search_kwargs},
-    )
+    if configuration.faiss_mmap:
+        return load_mmap_faiss_vectorstore(persist_path, embedding_model)
+    return vectorstore
 
 
-@contextmanager
-def make_chroma_retriever(
+def load_chroma_vectorstore(
     configuration: BaseConfiguration,
     spec: RetrieverSpec,
     embedding_model: Embeddings,
-    search_type: str,
-    search_kwargs: dict,
-) -> Generator[VectorStoreRetriever, None, None]:
+    persist_path: Optional[str] = None,
+) -> VectorStore:
     """
-    Create or load a FAISS retriever, saving the index locally to avoid re-indexing.
-    Uses configuration to determine file paths and splitting functions.
+    Open a Chroma vector store, or create it in the persist directory to avoid re-indexing.
+    Uses configuration to determine file paths and splitting functions, unless another
+    `persist_path` is given.
     """
-    import os
-
     from langchain_chroma import Chroma
 
     # Get the persist path by checking what is the specified embedding model
-    persist_path = spec.persist_path(
-        get_provider_and_model(configuration.embedding_model)[0]
-    )
+    persist_path = persist_path or get_persist_path(configuration, spec)
 
-    # Load or create FAISS index
+    # Load or create Chroma index
     if os.path.exists(persist_path):
         vectorstore = Chroma(
             embedding_function=embedding_model,
@@ -149,74 +299,133 @@ def make_chroma_retriever(
 
     else:
         print(f"Creating new Chroma index at {persist_path}")
-        docs = _load_and_split_docs(spec)
+        docs, ids = with_chunk_ids(_load_and_split_docs(spec))
+        _embed_chunks_for_index(configuration, embedding_model, docs)
 
         vectorstore = Chroma.from_documents(
             documents=docs,
             embedding=embedding_model,
+            ids=ids,
             persist_directory=persist_path,
             collection_name=spec.collection_name,
         )
 
-    yield vectorstore.as_retriever(
-        search_type=search_type,
-        search_kwargs={**search_kwargs},
+    return vectorstore
+
+
+def get_persist_path(configuration: BaseConfiguration, spec: RetrieverSpec) -> str:
+    """
+    Get where the vector store is saved. Depends on the embedding provider and the vector
+    store provider, and for FAISS on the index type.
+    """
+    persist_path = spec.persist_path(
+        get_provider_and_model(configuration.embedding_model)[0]
+    )
+    if configuration.retriever_provider == "chroma":
+        persist_path += "_chroma"
+    elif configuration.faiss_index_factory != "Flat":
+        persist_path += "_" + index_factory_suffix(configuration.faiss_index_factory)
+    return persist_path
+
+
+def _get_faiss_index_factory(configuration: BaseConfiguration) -> Optional[str]:
+    if configuration.retriever_provider == "faiss":
+        return configuration.faiss_index_factory
+    return None
+
+
+def check_index_artifact(
+    configuration: BaseConfiguration, spec: RetrieverSpec
+) -> Optional[str]:
+    """
+    Check that the index of the spec is built for the configuration. Returns a description
+    of the problem, or None if the index can be loaded.
+    """
+    persist_path = get_persist_path(configuration, spec)
+    if not os.path.exists(persist_path):
+        return "has not been built"
+    artifact = IndexArtifact.load(persist_path)
+    if artifact is None:
+        return "has no index manifest"
+    return artifact.mismatch(
+        retriever_provider=configuration.retriever_provider,
+        embedding_model=configuration.embedding_model,
+        faiss_index_factory=_get_faiss_index_factory(configuration),
     )
 
 
-# def apply_flash_reranker(
-#     configuration: BaseConfiguration, retriever: VectorStoreRetriever
-# ):
-#     compressor = FlashrankRerank(**configuration.rerank_kwargs)
-#
-#     return ContextualCompressionRetriever(
-#         base_compressor=compressor, base_retriever=retriever
-#     )
+def is_index_stale(configuration: BaseConfiguration, spec: RetrieverSpec) -> bool:
+    """Check if the source files changed since the index was last synced. Only stats the files."""
+    previous_manifest = SourceManifest.load(
+        _vectorstore_manifest_path(get_persist_path(configuration, spec))
+    )
+    if previous_manifest is None:
+        return True
+    return not previous_manifest.diff(
+        SourceManifest.scan(spec, previous_manifest)
+    ).is_empty
 
 
-@contextmanager
-def make_retriever(
-    config: RunnableConfig,
+def _write_index_artifact(
+    configuration: BaseConfiguration,
     spec: RetrieverSpec,
-    retrieval_params: RetrievalParams = RetrievalParams(
-        search_type="mmr",
-        search_kwargs={"k": 3, "fetch_k": 15, "lambda_mult": 0.5},
-    ),
-) -> Generator[VectorStoreRetriever, None, None]:
-    """
-    Create a retriever for the agent, based on the current configuration.
+    vectorstore: VectorStore,
+    build_seconds: float,
+    persist_path: Optional[str] = None,
+) -> IndexArtifact:
+    persist_path = persist_path or get_persist_path(configuration, spec)
+    sources_manifest = SourceManifest.load(_vectorstore_manifest_path(persist_path))
+    artifact = IndexArtifact(
+        format_version=INDEX_FORMAT_VERSION,
+        collection_name=spec.collection_name,
+        retriever_provider=configuration.retriever_provider,
+        embedding_model=configuration.embedding_model,
+        faiss_index_factory=_get_faiss_index_factory(configuration),
+        n_chunks=len(get_vectorstore_ids(vectorstore)),
+        sources_fingerprint=sources_manifest.fingerprint()
+        if sources_manifest is not None
+        else "",
+        built_at=datetime.now().isoformat(timespec="seconds"),
+        build_seconds=round(build_seconds, 2),
+    )
+    artifact.save(persist_path)
+    return artifact
 
-    Args:
-        config: The runnable configuration
-        spec: The retriever specification
-        **retrieval_overrides: Override any retrieval parameters (search_type, search_kwargs, etc.)
+
+def get_embedding_model(configuration: BaseConfiguration) -> Embeddings:
     """
-    configuration = BaseConfiguration.from_runnable_config(config)
+    Get the process-wide embedding client for the configured embedding model. The settings
+    of local models are taken from the configuration the model is first loaded with.
+    """
+    return registry.get_embeddings(
+        configuration.embedding_model,
+        partial(
+            make_text_encoder,
+            local_batch_size=configuration.local_embedding_batch_size,
+            local_threads=configuration.local_embedding_threads,
+        ),
+    )
+
+
+def get_vectorstore_key(
+    configuration: BaseConfiguration, spec: RetrieverSpec
+) -> VectorStoreKey:
+    return VectorStoreKey(
+        provider=configuration.retriever_provider,
+        collection_name=spec.collection_name,
+        persist_path=get_persist_path(configuration, spec),
+        embedding_model=configuration.embedding_model,
+    )
 
-    embedding_model = make_text_encoder(configuration.embedding_model)
 
-    # Get the retriever
-    selected_retriever = None
+def _get_vectorstore_loader(
+    configuration: BaseConfiguration,
+) -> Callable[..., VectorStore]:
     match configuration.retriever_provider:
         case "faiss":
-            with make_faiss_retriever(
-                configuration,
-                spec,
-                embedding_model,
-                retrieval_params["search_type"],
-                retrieval_params["search_kwargs"],
-            ) as retriever:
-                selected_retriever = retriever
+            return load_faiss_vectorstore
         case "chroma":
-            with make_chroma_retriever(
-                configuration,
-                spec,
-                embedding_model,
-                retrieval_params["search_type"],
-                retrieval_params["search_kwargs"],
-            ) as retriever:
-                selected_retriever = retriever
-
+            return load_chroma_vectorstore
         case _:
             raise ValueError(
                 "Unrecognized retriever_provider in configuration. "
@@ -224,13 +433,513 @@ def make_retriever(
                 f"Got: {configuration.retriever_provider}"
             )
 
-    # Apply the reranker
+
+def load_vectorstore(
+    configuration: BaseConfiguration, spec: RetrieverSpec
+) -> VectorStore:
+    """Load the saved vector store of the spec, without keeping it in the registry."""
+    return _get_vectorstore_loader(configuration)(
+        configuration, spec, get_embedding_model(configuration)
+    )
+
+
+def load_saved_vectorstore(
+    configuration: BaseConfiguration, spec: RetrieverSpec
+) -> Optional[VectorStore]:
+    """
+    Load the saved vector store of the spec without writing to the index directory, f.ex. to
+    check it. Unlike `load_vectorstore`, a missing memory-mapped document store is not
+    written, and None is returned instead.
+    """
+    if configuration.retriever_provider == "faiss" and configuration.faiss_mmap:
+        return load_mmap_faiss_vectorstore(
+            get_persist_path(configuration, spec), get_embedding_model(configuration)
+        )
+    return load_vectorstore(configuration, spec)
+
+
+def get_vectorstore(
+    configuration: BaseConfiguration, spec: RetrieverSpec
+) -> VectorStore:
+    """
+    Get the process-wide vector store for the spec, loading it on first use.
+
+    Raises:
+        IndexNotBuiltError: If the index is missing or built with other settings, and
+            `allow_index_build_at_query_time` is not set.
+    """
+    loader = _get_vectorstore_loader(configuration)
+    embedding_model = get_embedding_model(configuration)
+
+    def load_fresh_vectorstore() -> VectorStore:
+        problem = check_index_artifact(configuration, spec)
+        if problem is not None:
+            if not configuration.allow_index_build_at_query_time:
+                raise IndexNotBuiltError(
+                    f"The {spec.collection_name} index {problem}. "
+                    "Build the indexes with `jutulgpt index build`."
+                )
+            build_index(configuration, spec)
+
+        vectorstore = loader(configuration, spec, embedding_model)
+        if configuration.allow_index_build_at_query_time:
+            start_time = time.perf_counter()
+            result = _sync_vectorstore_with_sources(configuration, spec, vectorstore)
+            if result.changed:
+                _write_index_artifact(
+                    configuration,
+                    spec,
+                    vectorstore,
+                    build_seconds=time.perf_counter() - start_time,
+                )
+                _invalidate_loaded_indexes(spec)
+        elif is_index_stale(configuration, spec):
+            print(
+                f"The {spec.collection_name} index is out of date with the sources. "
+                "Update it with `jutulgpt index build`."
+            )
+        return vectorstore
+
+    vectorstore = registry.get_vectorstore(
+        get_vectorstore_key(configuration, spec), load_fresh_vectorstore
+    )
+    if configuration.retriever_provider == "faiss":
+        set_faiss_search_params(vectorstore.index, configuration.faiss_search_params)
+    return vectorstore
+
+
+def _rebuild_faiss_vectorstore_if_needed(
+    configuration: BaseConfiguration, vectorstore: VectorStore, chunks: list[Document]
+) -> Optional[IndexSyncResult]:
+    """
+    Rebuild a FAISS index not supporting removals (f.ex. HNSW or IVF) in place, if chunks were
+    removed. The unchanged chunks are read from the embedding cache. Returns None if nothing
+    was removed, in which case the new chunks can simply be added.
+    """
+    docs, ids = with_chunk_ids(chunks)
+    existing_ids = get_vectorstore_ids(vectorstore)
+    if existing_ids <= set(ids):
+        return None
+
+    embedding_model = vectorstore.embeddings
+    _embed_chunks_for_index(configuration, embedding_model, docs)
+    replace_faiss_contents(
+        vectorstore,
+        build_faiss_vectorstore(
+            docs, ids, embedding_model, configuration.faiss_index_factory
+        ),
+    )
+    return IndexSyncResult(
+        added=len(set(ids) - existing_ids),
+        removed=len(existing_ids - set(ids)),
+        unchanged=len(set(ids) & existing_ids),
+    )
+
+
+def _sync_vectorstore_with_sources(
+    configuration: BaseConfiguration,
+    spec: RetrieverSpec,
+    vectorstore: VectorStore,
+    force: bool = False,
+    persist_path: Optional[str] = None,
+) -> IndexSyncResult:
+    """
+    Sync the vector store with the current documents if the source files changed since the
+    vector store was last synced. The check only stats the files, unless they changed.
+    """
+    persist_path = persist_path or get_persist_path(configuration, spec)
+    manifest_path = _vectorstore_manifest_path(persist_path)
+    previous_manifest = SourceManifest.load(manifest_path)
+    manifest = SourceManifest.scan(spec, previous_manifest)
+
+    if (
+        not force
+        and previous_manifest is not None
+        and previous_manifest.diff(manifest).is_empty
+    ):
+        if manifest != previous_manifest:
+            manifest.save(manifest_path)
+        return IndexSyncResult(added=0, removed=0, unchanged=0)
+
+    # A memory-mapped vector store is read-only, so we modify an in-memory copy, save it, and
+    # map the saved files again
+    target = vectorstore
+    if is_mmap_vectorstore(vectorstore):
+        from langchain_community.vectorstores import FAISS
+
+        target = FAISS.load_local(
+            persist_path, vectorstore.embeddings, allow_dangerous_deserialization=True
+        )
+
+    chunks = _load_and_split_docs(spec)
+    if configuration.retriever_provider == "faiss" and not supports_removal(
+        target.index
+    ):
+        result = _rebuild_faiss_vectorstore_if_needed(configuration, target, chunks)
+    else:
+        result = None
+    if result is None:
+        result = sync_vectorstore(
+            target,
+            chunks,
+            max_tokens_per_batch=configuration.embedding_batch_tokens,
+            max_concurrency=configuration.embedding_max_concurrency,
+        )
+    if result.changed:
+        print(
+            f"Updated {spec.collection_name}: {result.added} chunks added, {result.removed} removed"
+        )
+        if configuration.retriever_provider == "faiss":
+            save_faiss_vectorstore(target, persist_path, configuration.faiss_mmap)
+        if target is not vectorstore:
+            replace_faiss_contents(
+                vectorstore,
+                load_mmap_faiss_vectorstore(persist_path, vectorstore.embeddings),
+            )
+    manifest.save(manifest_path)
+    return result
+
+
+def _invalidate_loaded_indexes(spec: RetrieverSpec) -> None:
+    """
+    Drop everything loaded for the collection earlier in this process, as it is out of date
+    with the synced sources: the vector stores of every embedding model and provider, with
+    their retrievers and embedding matrices, and the BM25 index.
+    """
+    registry.invalidate(collection_name=spec.collection_name)
+
+
+def _release_chroma_clients(*paths: str) -> None:
+    """
+    Close the Chroma clients of the directories. Chroma shares one client between the stores
+    of a directory and keeps it open, so it has to be closed before the directory is moved.
+    The clients of other directories are left open.
+    """
+    from chromadb.api.client import SharedSystemClient
+
+    for path in paths:
+        system = SharedSystemClient._identifier_to_system.pop(path, None)
+        getattr(SharedSystemClient, "_identifier_to_refcount", {}).pop(path, None)
+        if system is not None:
+            system.stop()
+
+
+def _switch_to_built_index(build_path: str, persist_path: str) -> None:
+    """
+    Replace the index directory with the one built in `build_path`. The directories are
+    renamed, such that the index is at no point partially written.
+    """
+    old_path = persist_path + ".old.tmp"
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    if os.path.exists(persist_path):
+        os.rename(persist_path, old_path)
+    os.rename(build_path, persist_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def build_index(
+    configuration: BaseConfiguration, spec: RetrieverSpec, rebuild: bool = False
+) -> IndexArtifact:
+    """
+    Build the vector store and the BM25 index of the spec, or bring them up to date with the
+    sources, and write the index manifest. An index built with other settings (or when
+    `rebuild` is set) is built from scratch, reading unchanged chunks from the embedding
+    cache.
+
+    The vector store is built in a separate directory, from a copy of the current index if
+    it can be updated, and only replaces the current index once it is complete. A failed
+    build leaves the current index as it was.
+    """
+    start_time = time.perf_counter()
+    persist_path = get_persist_path(configuration, spec)
+    build_path = persist_path + ".build.tmp"
+    if os.path.exists(build_path):
+        shutil.rmtree(build_path)  # Left by an interrupted build
+    if (
+        not rebuild
+        and os.path.exists(persist_path)
+        and check_index_artifact(configuration, spec) is None
+    ):
+        shutil.copytree(persist_path, build_path)
+
+    vectorstore = _get_vectorstore_loader(configuration)(
+        configuration, spec, get_embedding_model(configuration), persist_path=build_path
+    )
+    _sync_vectorstore_with_sources(
+        configuration, spec, vectorstore, persist_path=build_path
+    )
+    load_bm25_index(spec)
+    artifact = _write_index_artifact(
+        configuration,
+        spec,
+        vectorstore,
+        build_seconds=time.perf_counter() - start_time,
+        persist_path=build_path,
+    )
+
+    del vectorstore
+    if configuration.retriever_provider == "chroma":
+        _release_chroma_clients(build_path, persist_path)
+    _switch_to_built_index(build_path, persist_path)
+    _invalidate_loaded_indexes(spec)
+    return artifact
+
+
+def update_vectorstore(
+    configuration: BaseConfiguration, spec: RetrieverSpec
+) -> IndexSyncResult:
+    """
+    Update the vector store in place with the current documents. Only new or changed chunks
+    are embedded, and chunks that disappeared are deleted.
+    """
+    start_time = time.perf_counter()
+    vectorstore = get_vectorstore(configuration, spec)
+    result = _sync_vectorstore_with_sources(
+        configuration, spec, vectorstore, force=True
+    )
+    if result.changed:
+        _write_index_artifact(
+            configuration,
+            spec,
+            vectorstore,
+            build_seconds=time.perf_counter() - start_time,
+        )
+        _invalidate_loaded_indexes(spec)
+    return result
+
+
+@lru_cache(maxsize=64)
+def _read_manifest_fingerprint(path: str, mtime_ns: int, size: int) -> str:
+    manifest = SourceManifest.load(path)
+    return manifest.fingerprint() if manifest is not None else ""
+
+
+def get_index_version(configuration: BaseConfiguration, spec: RetrieverSpec) -> str:
+    """
+    Get the version of the vector store, i.e. the fingerprint of the sources it was last
+    synced with. Only stats the manifest file, unless it changed.
+    """
+    path = _vectorstore_manifest_path(get_persist_path(configuration, spec))
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return ""
+    return _read_manifest_fingerprint(path, stat.st_mtime_ns, stat.st_size)
+
+
+def get_result_cache_namespace(
+    configuration: BaseConfiguration,
+    spec: RetrieverSpec,
+    retrieval_params: RetrievalParams,
+) -> str:
+    """Combine the settings the retrieved chunks depend on, for the semantic result cache."""
+    return result_cache_namespace(
+        get_vectorstore_key(configuration, spec),
+        retrieval_params,
+        configuration.faiss_search_params,
+        configuration.rerank_provider,
+        configuration.rerank_kwargs,
+        configuration.hybrid_dense_weight,
+        configuration.hybrid_lexical_weight,
+        configuration.hybrid_rrf_k,
+    )
+
+
+def load_bm25_index(spec: RetrieverSpec, allow_build: bool = True) -> BM25Index:
+    """
+    Load the BM25 index of the spec, or build and save it if it is missing or the source files changed.
+
+    Raises:
+        IndexNotBuiltError: If the index is missing or out of date with the chunk store, and
+            `allow_build` is not set.
+    """
+    path = _bm25_index_path(spec)
+    if not allow_build:
+        # Neither split the changed files into the chunk store nor build the index
+        store = _open_chunk_store(spec.cache_path)
+        manifest = SourceManifest.load(_manifest_path(spec))
+        index = BM25Index.load(path, document_loader=store.get_many)
+        if index is None or manifest is None:
+            problem = "has not been built"
+        elif index.fingerprint != manifest.fingerprint():
+            problem = "is out of date with the chunk store"
+        else:
+            if not manifest.diff(SourceManifest.scan(spec, manifest)).is_empty:
+                print(
+                    f"The {spec.collection_name} keyword index is out of date with the "
+                    "sources. Update it with `jutulgpt index build`."
+                )
+            return index
+        raise IndexNotBuiltError(
+            f"The {spec.collection_name} keyword index {problem}. "
+            "Build the indexes with `jutulgpt index build`."
+        )
+
+    store = get_chunk_store(spec)
+    fingerprint = SourceManifest.load(_manifest_path(spec)).fingerprint()
+
+    # The index only keeps the chunk ids, and reads the returned chunks from the chunk store
+    index = BM25Index.load(path, document_loader=store.get_many)
+    if index is None or index.fingerprint != fingerprint:
+        chunks, ids = with_chunk_ids(_load_and_split_docs(spec))
+        index = BM25Index(
+            chunks, ids, fingerprint=fingerprint, document_loader=store.get_many
+        )
+        index.save(path)
+    return index
+
+
+def get_bm25_index(configuration: BaseConfiguration, spec: RetrieverSpec) -> BM25Index:
+    """
+    Get the process-wide BM25 index for the spec, loading it on first use.
+
+    Raises:
+        IndexNotBuiltError: If the index is missing or out of date, and
+            `allow_index_build_at_query_time` is not set.
+    """
+    return registry.get_lexical_index(
+        spec.collection_name,
+        _bm25_index_path(spec),
+        lambda: load_bm25_index(
+            spec, allow_build=configuration.allow_index_build_at_query_time
+        ),
+    )
+
+
+def _get_base_retriever(
+    configuration: BaseConfiguration,
+    spec: RetrieverSpec,
+    search_type: str,
+    search_kwargs: dict,
+) -> BaseRetriever:
+    vectorstore = get_vectorstore(configuration, spec)
+    if search_type == "hybrid":
+        return registry.get_retriever(
+            get_vectorstore_key(configuration, spec),
+            "hybrid",
+            {
+                **search_kwargs,
+                "dense_weight": configuration.hybrid_dense_weight,
+                "lexical_weight": configuration.hybrid_lexical_weight,
+                "rrf_k": configuration.hybrid_rrf_k,
+            },
+            lambda: HybridRetriever(
+                vectorstore=vectorstore,
+                bm25_index=get_bm25_index(configuration, spec),
+                search_kwargs={**search_kwargs},
+                dense_weight=configuration.hybrid_dense_weight,
+                lexical_weight=configuration.hybrid_lexical_weight,
+                rrf_k=configuration.hybrid_rrf_k,
+            ),
+        )
+    if search_type == "mmr":
+        key = get_vectorstore_key(configuration, spec)
+        return registry.get_retriever(
+            key,
+            "mmr",
+            search_kwargs,
+            lambda: MMRRetriever(
+                vectorstore=vectorstore,
+                embedding_matrix=registry.get_embedding_matrix(
+                    key, lambda: EmbeddingMatrix.from_vectorstore(vectorstore)
+                ),
+                search_kwargs={**search_kwargs},
+            ),
+        )
+    return registry.get_retriever(
+        get_vectorstore_key(configuration, spec),
+        search_type,
+        search_kwargs,
+        lambda: vectorstore.as_retriever(
+            search_type=search_type, search_kwargs={**search_kwargs}
+        ),
+    )
+
+
+def _get_flash_rerank_retriever(
+    configuration: BaseConfiguration,
+    spec: RetrieverSpec,
+    search_type: str,
+    search_kwargs: dict,
+) -> BaseRetriever:
+    """
+    Rerank a wider set of candidates with FlashRank, returning the `k` best. The number of
+    candidates is set with `candidates` in `rerank_kwargs`, and defaults to four times `k`.
+    """
+    rerank_kwargs = configuration.rerank_kwargs
+    top_n = rerank_kwargs.get("top_n", search_kwargs.get("k", 4))
+    n_candidates = max(rerank_kwargs.get("candidates", 4 * top_n), top_n)
+    candidate_kwargs = {
+        **search_kwargs,
+        "k": n_candidates,
+        "fetch_k": max(search_kwargs.get("fetch_k", n_candidates), n_candidates),
+    }
+    base_retriever = _get_base_retriever(
+        configuration, spec, search_type, candidate_kwargs
+    )
+    return registry.get_retriever(
+        get_vectorstore_key(configuration, spec),
+        f"{search_type}+flash",
+        {**candidate_kwargs, **rerank_kwargs, "top_n": top_n},
+        lambda: FlashRerankRetriever(
+            base_retriever=base_retriever,
+            model=rerank_kwargs.get("model", DEFAULT_RERANK_MODEL),
+            top_n=top_n,
+            score_threshold=rerank_kwargs.get("score_threshold"),
+        ),
+    )
+
+
+def get_retriever(
+    configuration: BaseConfiguration,
+    spec: RetrieverSpec,
+    retrieval_params: RetrievalParams,
+) -> BaseRetriever:
+    """Get the retriever for the spec, with the search and the reranker of the configuration."""
     match configuration.rerank_provider:
         case "None":
-            yield selected_retriever
+            return _get_base_retriever(
+                configuration,
+                spec,
+                retrieval_params["search_type"],
+                retrieval_params["search_kwargs"],
+            )
+        case "flash":
+            return _get_flash_rerank_retriever(
+                configuration,
+                spec,
+                retrieval_params["search_type"],
+                retrieval_params["search_kwargs"],
+            )
         case _:
             raise ValueError(
                 "Unrecognized rerank_provider in configuration. "
                 f"Expected one of: {', '.join(BaseConfiguration.__annotations__['rerank_provider'].__args__)}\n"
                 f"Got: {configuration.rerank_provider}"
             )
+
+
+@contextmanager
+def make_retriever(
+    config: RunnableConfig,
+    spec: RetrieverSpec,
+    retrieval_params: RetrievalParams = RetrievalParams(
+        search_type="mmr",
+        search_kwargs={"k": 3, "fetch_k": 15, "lambda_mult": 0.5},
+    ),
+) -> Generator[BaseRetriever, None, None]:
+    """
+    Create a retriever for the agent, based on the current configuration.
+
+    The vector store and retriever are kept in the process-wide registry, so repeated calls
+    with the same configuration do not touch the disk.
+
+    Args:
+        config: The runnable configuration
+        spec: The retriever specification
+        retrieval_params: The search type and search kwargs used by the retriever
+    """
+    yield get_retriever(
+        BaseConfiguration.from_runnable_config(config), spec, retrieval_params
+    )
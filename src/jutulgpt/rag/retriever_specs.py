@@ -31,7 +31,7 @@ RETRIEVER_SPECS = {
                 / f"retriever_jutuldarcy_docs_{retriever_dir_name}"
             ),
             cache_path=str(
-                PROJECT_ROOT / "rag" / "loaded_store" / "loaded_jutuldarcy_docs.pkl"
+                PROJECT_ROOT / "rag" / "loaded_store" / "loaded_jutuldarcy_docs.sqlite"
             ),
             collection_name="jutuldarcy_docs",
             filetype="md",
@@ -46,13 +46,18 @@ RETRIEVER_SPECS = {
                 / f"retriever_jutuldarcy_examples_{retriever_dir_name}"
             ),
             cache_path=str(
-                PROJECT_ROOT / "rag" / "loaded_store" / "loaded_jutuldarcy_examples.pkl"
+                PROJECT_ROOT
+                / "rag"
+                / "loaded_store"
+                / "loaded_jutuldarcy_examples.sqlite"
             ),
             collection_name="jutuldarcy_examples",
             filetype="jl",
             split_func=partial(
-                split_examples.split_examples,
-                header_to_split_on=1,  # Split on `# #`
+                split_examples.split_julia_examples,
+                header_to_split_on=1,  # Always split on `# #`
+                min_tokens=80,
+                max_tokens=600,
             ),
         ),
     },
@@ -66,7 +71,7 @@ RETRIEVER_SPECS = {
                 / f"retriever_fimbul_docs_{retriever_dir_name}"
             ),
             cache_path=str(
-                PROJECT_ROOT / "rag" / "loaded_store" / "loaded_fimbul_docs.pkl"
+                PROJECT_ROOT / "rag" / "loaded_store" / "loaded_fimbul_docs.sqlite"
             ),
             collection_name="fimbul_docs",
             filetype="md",
@@ -81,13 +86,15 @@ RETRIEVER_SPECS = {
                 / f"retriever_fimbul_examples_{retriever_dir_name}"
             ),
             cache_path=str(
-                PROJECT_ROOT / "rag" / "loaded_store" / "loaded_fimbul_examples.pkl"
+                PROJECT_ROOT / "rag" / "loaded_store" / "loaded_fimbul_examples.sqlite"
             ),
             collection_name="fimbul_examples",
             filetype="jl",
             split_func=partial(
-                split_examples.split_examples,
-                header_to_split_on=1,  # Split on `# #`
+                split_examples.split_julia_examples,
+                header_to_split_on=1,  # Always split on `# #`
+                min_tokens=80,
+                max_tokens=600,
             ),
         ),
     },
@@ -0,0 +1,107 @@
+"""
+Cache of retrieval results, keyed by the query embedding.
+
+Generated queries vary slightly between turns, f.ex. "set up CO2 injection well" and "CO2
+injection well setup", so an exact-match cache misses most of them. Instead we compare the
+embedding of a new query with the embeddings of the cached queries, and reuse the results
+of the closest one if the cosine similarity is above a threshold.
+
+Results are cached per namespace (vector store, search parameters and reranker), and a
+namespace is cleared when the version of its index changes.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+def result_cache_namespace(*parts: Any) -> str:
+    """Combine the parameters the results depend on into a namespace."""
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+@dataclass
+class _Namespace:
+    version: Hashable
+    embeddings: list[np.ndarray] = field(default_factory=list)  # Unit vectors
+    results: list[list[Document]] = field(default_factory=list)
+
+
+class SemanticResultCache:
+    """
+    Thread-safe cache of retrieval results, with at most `max_entries_per_namespace` queries
+    in each of the `max_namespaces` most recently used namespaces.
+    """
+
+    def __init__(self, max_namespaces: int = 32, max_entries_per_namespace: int = 256):
+        self.max_namespaces = max_namespaces
+        self.max_entries_per_namespace = max_entries_per_namespace
+        self.hits = 0
+        self.misses = 0
+        self._namespaces: OrderedDict[str, _Namespace] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_namespace(self, namespace: str, version: Hashable) -> _Namespace:
+        entry = self._namespaces.get(namespace)
+        if entry is None or entry.version != version:
+            entry = _Namespace(version=version)
+            self._namespaces[namespace] = entry
+        self._namespaces.move_to_end(namespace)
+        while len(self._namespaces) > self.max_namespaces:
+            self._namespaces.popitem(last=False)
+        return entry
+
+    def lookup(
+        self,
+        namespace: str,
+        version: Hashable,
+        embedding: list[float],
+        threshold: float,
+    ) -> Optional[list[Document]]:
+        """
+        Get the results of the most similar cached query, if its cosine similarity with the
+        embedding is at least `threshold`.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            entry = self._get_namespace(namespace, version)
+            if entry.embeddings:
+                similarities = np.stack(entry.embeddings) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= threshold:
+                    self.hits += 1
+                    return list(entry.results[best])
+            self.misses += 1
+            return None
+
+    def add(
+        self,
+        namespace: str,
+        version: Hashable,
+        embedding: list[float],
+        results: list[Document],
+    ) -> None:
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            entry = self._get_namespace(namespace, version)
+            entry.embeddings.append(query)
+            entry.results.append(list(results))
+            if len(entry.embeddings) > self.max_entries_per_namespace:
+                del entry.embeddings[0]
+                del entry.results[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._namespaces.clear()
+
+
+result_cache = SemanticResultCache()
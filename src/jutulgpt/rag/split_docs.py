@@ -1,5 +1,6 @@
 import re
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 
 from langchain_core.documents import Document
 from langchain_text_splitters import (
@@ -7,16 +8,37 @@ from langchain_text_splitters import (
     RecursiveCharacterTextSplitter,
 )
 
+from jutulgpt.rag.packing import pack_chunks
+from jutulgpt.rag.utils import count_tokens
 from jutulgpt.utils import deduplicate_document_chunks, get_file_source
 
+_HEADER_ANCHOR_PATTERN = re.compile(r"\s*\{#[^}]*\}")
+
+
+@lru_cache(maxsize=None)
+def _get_splitters(
+    headers_to_split_on: tuple[tuple[str, str], ...],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> tuple[MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter]:
+    """The splitters are stateless, so we only create them once per process."""
+    markdown_splitter = MarkdownHeaderTextSplitter(
+        headers_to_split_on=list(headers_to_split_on),
+        strip_headers=True,
+    )
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    return markdown_splitter, text_splitter
+
 
 def split_docs(
     document: Document,
-    headers_to_split_on=[
+    headers_to_split_on=(
         ("#", "Header 1"),
         ("##", "Header 2"),
         ("###", "Header 3"),
-    ],
+    ),
     chunk_size: int = 1000,
     chunk_overlap: int = 200,
 ) -> List[Document]:
@@ -26,11 +48,13 @@ def split_docs(
     # Some processing
     content = preprocess_content(content)
 
-    # Split documents
-    markdown_splitter = MarkdownHeaderTextSplitter(
-        headers_to_split_on=headers_to_split_on,
-        strip_headers=True,
+    markdown_splitter, text_splitter = _get_splitters(
+        tuple(tuple(header) for header in headers_to_split_on),
+        chunk_size,
+        chunk_overlap,
     )
+
+    # Split documents
     splits = markdown_splitter.split_text(content)
 
     processed_docs = []
@@ -41,16 +65,13 @@ def split_docs(
         for key in ["Header 1", "Header 2", "Header 3"]:
             if key in split.metadata and split.metadata[key]:
                 # Remove '{#...}' from the header value
-                split.metadata[key] = re.sub(
-                    r"\s*\{#[^}]*\}", "", split.metadata[key]
+                split.metadata[key] = _HEADER_ANCHOR_PATTERN.sub(
+                    "", split.metadata[key]
                 ).strip()
 
         processed_docs.append(split)
 
     # Merge small splits for minimum context size
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, chunk_overlap=chunk_overlap
-    )
     final_docs = []
     for doc in text_splitter.split_documents(processed_docs):
         doc.metadata.update(document_metadata)  # reapply original metadata
@@ -94,16 +115,34 @@ def get_section_path(doc: Document, for_ui_printing: bool = False) -> str:
     return section_path
 
 
-def format_docs(docs, remove_duplicates: bool = True):
+def format_docs(
+    docs, remove_duplicates: bool = True, token_budget: Optional[int] = None
+):
+    """
+    Format the documentation chunks, best first. With a `token_budget`, the chunks are packed
+    into the budget, and a note says how many were trimmed or left out.
+    """
     if remove_duplicates:
         docs = deduplicate_document_chunks(docs)
 
+    def header(doc: Document) -> str:
+        return f"# From `{get_file_source(doc)}`: Section `{get_section_path(doc)}`\n"
+
+    summary = ""
+    if token_budget is not None:
+        packed = pack_chunks(
+            docs,
+            token_budget,
+            overhead=lambda doc: count_tokens(header(doc) + "\n\n"),
+            marker="[...]",
+        )
+        docs, summary = packed.docs, packed.summary()
+
     formatted = []
     for doc in docs:
-        doc_string = ""
-        file_source = get_file_source(doc)
-        section_path = get_section_path(doc)
-        doc_string += f"# From `{file_source}`: Section `{section_path}`\n"
+        doc_string = header(doc)
         doc_string += f"{format_doc(doc)}"
         formatted.append(doc_string)
+    if summary:
+        formatted.append(summary)
     return "\n\n".join(formatted)
@@ -1,8 +1,11 @@
 import re
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 
 from langchain_core.documents import Document
 
+from jutulgpt.rag.packing import pack_chunks
+from jutulgpt.rag.utils import count_tokens
 from jutulgpt.utils import deduplicate_document_chunks, get_file_source
 
 
@@ -32,10 +35,9 @@ def split_examples(document: Document, header_to_split_on: int = 2) -> List[Docu
                     )
                 )
 
+    heading_pattern = _heading_pattern(header_to_split_on)
     for line in lines:
-        heading_match = re.match(
-            rf"^#\s+(#{{1,{header_to_split_on}}})\s+(.*)", line.strip()
-        )
+        heading_match = heading_pattern.match(line.strip())
         if heading_match:
             # Finalize the previous chunk
             finalize_chunk()
@@ -50,22 +52,216 @@ def split_examples(document: Document, header_to_split_on: int = 2) -> List[Docu
     return chunks
 
 
+@lru_cache(maxsize=None)
+def _heading_pattern(max_level: int) -> re.Pattern:
+    """Matches headings such as `# # Title` (level 1) or `# ## Title` (level 2) up to `max_level`."""
+    return re.compile(rf"^#\s+(#{{1,{max_level}}})\s+(.*)")
+
+
+# Keywords opening a block closed by `end`. `struct` also covers `mutable struct`, and
+# `type` covers `abstract type` and `primitive type`
+_BLOCK_KEYWORDS = frozenset(
+    ("function", "macro", "module", "baremodule", "struct", "quote", "let", "begin")
+    + ("for", "while", "if", "try", "do", "type")
+)
+# Strings, comments, keywords and brackets, in the order they are matched
+_JULIA_TOKEN_PATTERN = re.compile(
+    r'"""|"(?:\\.|[^"\\])*"|#=|=#|#.*'
+    r"|\b(?:function|macro|baremodule|module|struct|quote|let|begin|for|while|if|try|do|end)\b"
+    r"|(?<=abstract )type\b|(?<=primitive )type\b|[(\[{]|[)\]}]"
+)
+
+
+class _JuliaDepthTracker:
+    """
+    Tracks the nesting depth of blocks and brackets over the lines of a Julia script, ignoring
+    strings and comments. `for` and `if` inside brackets (comprehensions) and `end` inside
+    brackets (indexing) do not change the block depth.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.brackets = 0
+        self.in_string = False  # Inside a triple-quoted string
+        self.in_comment = False  # Inside a `#= ... =#` comment
+
+    def update(self, line: str) -> int:
+        for match in _JULIA_TOKEN_PATTERN.finditer(line):
+            token = match.group(0)
+            if self.in_string:
+                self.in_string = token != '"""'
+            elif self.in_comment:
+                self.in_comment = token != "=#"
+            elif token == '"""':
+                self.in_string = True
+            elif token == "#=":
+                self.in_comment = True
+            elif token[0] in '"#=':
+                continue
+            elif token in "([{":
+                self.brackets += 1
+            elif token in ")]}":
+                self.brackets = max(0, self.brackets - 1)
+            elif self.brackets:
+                continue
+            elif token == "end":
+                self.depth = max(0, self.depth - 1)
+            elif token in _BLOCK_KEYWORDS:
+                self.depth += 1
+        return self.depth + self.brackets
+
+    @property
+    def at_top_level(self) -> bool:
+        return (
+            self.depth == 0
+            and self.brackets == 0
+            and not self.in_string
+            and not self.in_comment
+        )
+
+
+def _split_top_level_units(lines: list[str]) -> list[list[str]]:
+    """
+    Group the lines into complete top-level expressions. Comment lines are kept together with
+    the expression following them, as they usually describe it.
+    """
+    units = []
+    current = []
+    tracker = _JuliaDepthTracker()
+    for line in lines:
+        current.append(line)
+        tracker.update(line)
+        is_comment = line.lstrip().startswith("#")
+        if tracker.at_top_level and not is_comment:
+            units.append(current)
+            current = []
+    if current:
+        units.append(current)
+    return units
+
+
+def _n_tokens(lines: list[str]) -> int:
+    return count_tokens("\n".join(lines))
+
+
+def _pack_groups(groups: list[list[str]], max_tokens: int) -> list[list[str]]:
+    """Greedily join consecutive groups of lines into pieces of at most `max_tokens` tokens."""
+    pieces = []
+    current = []
+    for group in groups:
+        if current and _n_tokens(current + group) > max_tokens:
+            pieces.append(current)
+            current = []
+        current = current + group
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_julia_examples(
+    document: Document,
+    header_to_split_on: int = 1,
+    min_tokens: int = 80,
+    max_tokens: int = 600,
+) -> List[Document]:
+    """
+    Split a Julia script into chunks of at most `max_tokens` tokens, only cutting between
+    complete top-level expressions (f.ex. a whole `function ... end` or `for ... end` block).
+    Headings like `# #` up to level `header_to_split_on` always start a new chunk, and each
+    chunk gets the nearest heading above it as `heading` metadata. A chunk shorter than
+    `min_tokens` is merged into the previous chunk if that is in the same section (under the
+    same heading) and has room, such that merging never changes the heading of any code.
+
+    An expression longer than `max_tokens` is split at line boundaries.
+    """
+    heading_pattern = _heading_pattern(header_to_split_on)
+
+    # The sections between the headings, with their heading
+    sections: list[tuple[Optional[str], list[str]]] = [(None, [])]
+    for line in document.page_content.splitlines():
+        if not line.strip():
+            continue
+        heading_match = heading_pattern.match(line.strip())
+        if heading_match:
+            sections.append((heading_match.group(2), []))
+        sections[-1][1].append(line)
+
+    # The pieces of each section, with the index of the section
+    pieces: list[tuple[int, list[str]]] = []
+    for section_index, (_, section_lines) in enumerate(sections):
+        groups = []
+        for unit in _split_top_level_units(section_lines):
+            if _n_tokens(unit) > max_tokens:
+                groups.extend(_pack_groups([[line] for line in unit], max_tokens))
+            else:
+                groups.append(unit)
+        pieces.extend(
+            (section_index, piece) for piece in _pack_groups(groups, max_tokens)
+        )
+
+    # Merge small pieces into the previous piece of the same section
+    merged: list[tuple[int, list[str]]] = []
+    for section_index, piece_lines in pieces:
+        if (
+            merged
+            and merged[-1][0] == section_index
+            and _n_tokens(piece_lines) < min_tokens
+            and _n_tokens(merged[-1][1] + piece_lines) <= max_tokens
+        ):
+            merged[-1] = (section_index, merged[-1][1] + piece_lines)
+        else:
+            merged.append((section_index, piece_lines))
+
+    return [
+        Document(
+            page_content="\n".join(piece_lines),
+            metadata={**document.metadata, "heading": sections[section_index][0]},
+        )
+        for section_index, piece_lines in merged
+    ]
+
+
+def get_section_path(doc: Document, for_ui_printing: bool = False) -> str:
+    """Get the heading the example chunk belongs to."""
+    return doc.metadata.get("heading") or "Root"
+
+
 def format_doc(doc: Document, within_julia_context: bool = True) -> str:
     if within_julia_context:
         return f"```julia\n{doc.page_content.strip()}\n```"
     return doc.page_content.strip()
 
 
-def format_examples(docs: List[Document], remove_duplicates: bool = True) -> str:
+def format_examples(
+    docs: List[Document],
+    remove_duplicates: bool = True,
+    token_budget: Optional[int] = None,
+) -> str:
+    """
+    Format the examples, best first. With a `token_budget`, the examples are packed into the
+    budget, and a note says how many were trimmed or left out.
+    """
     if remove_duplicates:
         docs = deduplicate_document_chunks(docs)
 
+    def header(doc: Document) -> str:
+        return f"# From `{get_file_source(doc)}`:\n"
+
+    summary = ""
+    if token_budget is not None:
+        packed = pack_chunks(
+            docs,
+            token_budget,
+            overhead=lambda doc: count_tokens(header(doc) + "```julia\n\n```\n\n"),
+        )
+        docs, summary = packed.docs, packed.summary()
+
     formatted = []
     for doc in docs:
-        example_string = ""
-        file_source = get_file_source(doc)
-        example_string += f"# From `{file_source}`:\n"
+        example_string = header(doc)
         example_string += f"{format_doc(doc, within_julia_context=True)}"
         formatted.append(example_string)
+    if summary:
+        formatted.append(summary)
 
     return "\n\n".join(formatted)
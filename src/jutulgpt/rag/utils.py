@@ -7,3 +7,24 @@ def modify_doc_content(doc: Document, new_content: str) -> Document:
     """
     doc.page_content = new_content.strip()
     return doc
+
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in the text with the `cl100k_base` encoding. Falls back to an estimate of
+    four characters per token if tiktoken is not available.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
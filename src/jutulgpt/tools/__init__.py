@@ -1,7 +1,10 @@
 from jutulgpt.tools.execution import (
+    cancel_background_job,
     execute_terminal_command,
+    get_background_job_status,
     run_julia_code,
     run_julia_linter,
+    tail_background_job_output,
 )
 from jutulgpt.tools.other import (
     get_working_directory,
@@ -11,12 +14,17 @@ from jutulgpt.tools.other import (
 )
 from jutulgpt.tools.retrieve import (
     grep_search,
+    keyword_search,
     retrieve_function_documentation,
     retrieve_jutuldarcy_examples,
+    search_documentation,
 )
 
 __all__ = [
     "execute_terminal_command",
+    "get_background_job_status",
+    "tail_background_job_output",
+    "cancel_background_job",
     "run_julia_code",
     "run_julia_linter",
     "get_working_directory",
@@ -24,6 +32,8 @@ __all__ = [
     "read_from_file",
     "write_to_file",
     "grep_search",
+    "keyword_search",
     "retrieve_function_documentation",
     "retrieve_jutuldarcy_examples",
+    "search_documentation",
 ]
@@ -4,7 +4,13 @@ from __future__ import annotations
 
 import os
 import re
+import signal
 import subprocess
+import tempfile
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
@@ -55,16 +61,127 @@ def run_julia_linter(code: str):
     return "Linter found no issues!"
 
 
+@dataclass
+class BackgroundJob:
+    """A terminal command running in the background, with its output written to a log file."""
+
+    job_id: str
+    command: str
+    process: subprocess.Popen
+    log_path: str
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancelled: bool = False
+
+    def poll(self) -> Optional[int]:
+        """Return the exit code if the job has finished, otherwise None."""
+        returncode = self.process.poll()
+        if returncode is not None and self.finished_at is None:
+            self.finished_at = time.time()
+        return returncode
+
+    def runtime(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+    def tail(self, n_lines: int) -> list[str]:
+        """Return the last `n_lines` lines written by the job."""
+        try:
+            with open(self.log_path, "r", encoding="utf-8", errors="replace") as f:
+                return [line.rstrip("\n") for line in deque(f, maxlen=n_lines)]
+        except FileNotFoundError:
+            return []
+
+
+# Background jobs started during this process, keyed by job id.
+_background_jobs: dict[str, BackgroundJob] = {}
+
+# Finished jobs kept for looking up their status and output. Older ones are dropped, and
+# their log files deleted, when new jobs are started.
+_MAX_FINISHED_JOBS = 20
+
+
+def _evict_finished_jobs() -> None:
+    """Drop the finished jobs beyond the `_MAX_FINISHED_JOBS` most recent, with their log files."""
+    finished = sorted(
+        (job for job in _background_jobs.values() if job.poll() is not None),
+        key=lambda job: job.finished_at,
+    )
+    for job in finished[: max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+        del _background_jobs[job.job_id]
+        try:
+            os.remove(job.log_path)
+        except OSError:
+            pass
+
+
+def _start_background_job(command: str, working_directory: str) -> BackgroundJob:
+    _evict_finished_jobs()
+    job_id = uuid.uuid4().hex[:8]
+    log_dir = Path(tempfile.gettempdir()) / "jutulgpt_jobs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = str(log_dir / f"{job_id}.log")
+
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        # The child keeps its own handle to the log file, so we can close ours.
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            cwd=working_directory,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True,  # Own process group, so cancelling also stops children
+        )
+
+    job = BackgroundJob(
+        job_id=job_id, command=command, process=process, log_path=log_path
+    )
+    _background_jobs[job_id] = job
+    return job
+
+
+def _get_background_job(job_id: str) -> Optional[BackgroundJob]:
+    return _background_jobs.get(job_id.strip())
+
+
+def _unknown_job_message(job_id: str) -> str:
+    known = ", ".join(_background_jobs) if _background_jobs else "none"
+    return f"ERROR: No background job with id `{job_id}`. Known job ids: {known}."
+
+
+def _job_status_text(job: BackgroundJob) -> str:
+    returncode = job.poll()
+    if job.cancelled:
+        status = "cancelled"
+    elif returncode is None:
+        status = "running"
+    elif returncode == 0:
+        status = "finished"
+    else:
+        status = "failed"
+
+    text = f"Job `{job.job_id}`: {status} after {round(job.runtime(), 1)} seconds.\n"
+    text += f"Command: `{job.command}`\n"
+    if returncode is not None:
+        text += f"EXIT CODE: {returncode}\n"
+    return text
+
+
 @tool("execute_terminal_command", parse_docstring=True)
-def execute_terminal_command(command: str) -> str:
+def execute_terminal_command(command: str, run_in_background: bool = False) -> str:
     """
     Execute a terminal command and return the output. Remember to include the project directory in the command when running the julia command. I.e. write f.ex. `julia --project=. my_script.jl`
 
+    Commands running in the foreground are stopped after 60 seconds. For long-running commands, such as full simulations or precompilation, set `run_in_background` to True. The command then returns a job id immediately, and you can use `get_background_job_status`, `tail_background_job_output` and `cancel_background_job` to follow the job while doing other work.
+
     Args:
         command: The command to execute. IMPORTANT to remember to add the project directory to the command when running Julia!
+        run_in_background: Whether to start the command as a background job and return its job id instead of waiting for it to finish.
 
     Returns:
-        str: The output from executing the command (stdout and stderr combined)
+        str: The output from executing the command (stdout and stderr combined), or the job id of the background job
     """
 
     from jutulgpt.human_in_the_loop import cli
@@ -76,6 +193,28 @@ def execute_terminal_command(command: str) -> str:
 
     working_directory = os.getcwd()
 
+    if run_in_background:
+        try:
+            job = _start_background_job(command, working_directory)
+        except Exception as e:
+            print_to_console(
+                text=f"ERROR: Failed to start background job: {str(e)}",
+                title="Run error",
+                border_style=colorscheme.error,
+            )
+            return f"ERROR: Failed to start background job: {str(e)}"
+
+        print_to_console(
+            text=f"Started background job `{job.job_id}`:\n\n`{command}`",
+            title="Background job",
+            border_style=colorscheme.message,
+        )
+        return (
+            f"Started background job with id `{job.job_id}`. "
+            "Use `get_background_job_status`, `tail_background_job_output` and "
+            "`cancel_background_job` with this id to follow the job."
+        )
+
     try:
         # Execute the command
         result = subprocess.run(
@@ -116,7 +255,10 @@ def execute_terminal_command(command: str) -> str:
             border_style=colorscheme.success,
         )
 
-        return "ERROR: Command execution timed out after 60 seconds."
+        return (
+            "ERROR: Command execution timed out after 60 seconds. "
+            "Use `run_in_background=True` for long-running commands."
+        )
     except Exception as e:
         print_to_console(
             text=f"ERROR: Failed to execute command: {str(e)}",
@@ -126,6 +268,96 @@ def execute_terminal_command(command: str) -> str:
         return f"ERROR: Failed to execute command: {str(e)}"
 
 
+@tool("get_background_job_status", parse_docstring=True)
+def get_background_job_status(job_id: str) -> str:
+    """
+    Get the status of a background job started with `execute_terminal_command`.
+
+    Args:
+        job_id: The id of the background job.
+
+    Returns:
+        str: Whether the job is running, finished, failed or cancelled, together with its runtime and exit code
+    """
+    job = _get_background_job(job_id)
+    if job is None:
+        return _unknown_job_message(job_id)
+    return _job_status_text(job).strip()
+
+
+@tool("tail_background_job_output", parse_docstring=True)
+def tail_background_job_output(job_id: str, n_lines: int = 50) -> str:
+    """
+    Get the last lines of output (stdout and stderr combined) from a background job.
+
+    Args:
+        job_id: The id of the background job.
+        n_lines: The number of lines to return from the end of the output.
+
+    Returns:
+        str: The status of the job followed by the last lines of its output
+    """
+    job = _get_background_job(job_id)
+    if job is None:
+        return _unknown_job_message(job_id)
+
+    lines = job.tail(max(1, n_lines))
+    output = _job_status_text(job)
+    if lines:
+        output += f"\n# LAST {len(lines)} LINES:\n\n```text\n" + "\n".join(lines)
+        output += "\n```"
+    else:
+        output += "\nThe job has not written any output yet."
+
+    print_to_console(
+        text=output,
+        title=f"Background job {job.job_id}",
+        border_style=colorscheme.message,
+    )
+    return output
+
+
+@tool("cancel_background_job", parse_docstring=True)
+def cancel_background_job(job_id: str) -> str:
+    """
+    Cancel a running background job.
+
+    Args:
+        job_id: The id of the background job.
+
+    Returns:
+        str: Confirmation message or error
+    """
+    job = _get_background_job(job_id)
+    if job is None:
+        return _unknown_job_message(job_id)
+
+    if job.poll() is not None:
+        return f"Job `{job.job_id}` has already stopped.\n" + _job_status_text(job)
+
+    try:
+        os.killpg(job.process.pid, signal.SIGTERM)
+        try:
+            job.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(job.process.pid, signal.SIGKILL)
+            job.process.wait()
+    except ProcessLookupError:
+        pass  # The job stopped on its own in the meantime
+    except Exception as e:
+        return f"ERROR: Failed to cancel job `{job.job_id}`: {str(e)}"
+
+    job.cancelled = True
+    job.poll()
+
+    print_to_console(
+        text=f"Cancelled background job `{job.job_id}`",
+        title="Background job",
+        border_style=colorscheme.warning,
+    )
+    return f"Cancelled job `{job.job_id}`.\n" + _job_status_text(job)
+
+
 @tool
 def list_directory_contents(directory_path: str) -> str:
     """
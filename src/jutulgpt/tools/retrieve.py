@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import subprocess
 from functools import partial
-from typing import Annotated, List, Optional
+from typing import Annotated, List, Literal, Optional
 
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool, InjectedToolArg, tool
@@ -10,11 +10,19 @@ from pydantic import BaseModel, Field
 
 # from jutulgpt import configuration
 import jutulgpt.rag.retrieval as retrieval
+import jutulgpt.rag.split_docs as split_docs
 import jutulgpt.rag.split_examples as split_examples
 from jutulgpt.cli import colorscheme, print_to_console
 from jutulgpt.configuration import PROJECT_ROOT, BaseConfiguration, cli_mode
-from jutulgpt.julia import get_function_documentation_from_list_of_funcs
+from jutulgpt.julia import (
+    format_symbol_suggestions,
+    get_cached_function_documentation,
+)
+from jutulgpt.rag.fanout import fan_out_search, get_retriever_specs_by_collection
+from jutulgpt.rag.hybrid import reciprocal_rank_fusion
+from jutulgpt.rag.index_artifacts import IndexNotBuiltError
 from jutulgpt.rag.retriever_specs import RETRIEVER_SPECS
+from jutulgpt.rag.semantic_cache import result_cache
 from jutulgpt.utils import get_file_source
 
 
@@ -54,16 +62,46 @@ def make_retrieve_tool(
         if not query.strip():
             return "The query is empty."
 
-        # Retrieve examples
-        with retrieval.make_retriever(
-            config=config,
-            spec=RETRIEVER_SPECS[doc_key]["examples"],
-            retrieval_params=retrieval.RetrievalParams(
-                search_type=configuration.examples_search_type,
-                search_kwargs=configuration.examples_search_kwargs,
-            ),
-        ) as retriever:
-            retrieved_examples = retriever.invoke(query)
+        # Retrieve examples, reusing the results of a near-identical earlier query
+        spec = RETRIEVER_SPECS[doc_key]["examples"]
+        retrieval_params = retrieval.RetrievalParams(
+            search_type=configuration.examples_search_type,
+            search_kwargs=configuration.examples_search_kwargs,
+        )
+        namespace = retrieval.get_result_cache_namespace(
+            configuration, spec, retrieval_params
+        )
+        index_version = retrieval.get_index_version(configuration, spec)
+        try:
+            query_embedding = retrieval.get_embedding_model(configuration).embed_query(
+                query
+            )
+            retrieved_examples = result_cache.lookup(
+                namespace,
+                index_version,
+                query_embedding,
+                threshold=configuration.semantic_cache_threshold,
+            )
+        except Exception:
+            # Without the query embedding, retrieve without the cache
+            query_embedding = None
+            retrieved_examples = None
+        if retrieved_examples is None:
+            try:
+                with retrieval.make_retriever(
+                    config=config, spec=spec, retrieval_params=retrieval_params
+                ) as retriever:
+                    retrieved_examples = retriever.invoke(query)
+            except IndexNotBuiltError as e:
+                return str(e)
+            if query_embedding is not None:
+                # Loading the vector store may have synced it with changed sources
+                result_cache.add(
+                    namespace,
+                    retrieval.get_index_version(configuration, spec),
+                    query_embedding,
+                    retrieved_examples,
+                )
 
         # Human interaction: filter docs/examples
         if configuration.human_interaction.retrieved_examples:
@@ -93,7 +131,9 @@ def make_retrieve_tool(
                         action_name=f"Modify retrieved {doc_label} examples",
                     )
 
-        examples = split_examples.format_examples(retrieved_examples)
+        examples = split_examples.format_examples(
+            retrieved_examples, token_budget=configuration.retrieval_token_budget
+        )
 
         format_str = lambda s: s if s != "" else "(empty)"
         out = format_str(examples)
@@ -146,14 +186,23 @@ def retrieve_function_documentation(
     function_names: List[str],
     config: Annotated[RunnableConfig, InjectedToolArg],
 ) -> str:
-    _, retrieved_signatures = get_function_documentation_from_list_of_funcs(
+    found_names, retrieved_signatures = get_cached_function_documentation(
         func_names=function_names
     )
 
+    # Suggest the closest real names for the functions we could not find
+    missing_names = [name for name in function_names if name not in found_names]
+    symbol_suggestions = format_symbol_suggestions(missing_names)
+
     if retrieved_signatures:
+        if symbol_suggestions:
+            return retrieved_signatures + "\n\n" + symbol_suggestions
         return retrieved_signatures
 
-    return "No function signatures found for the provided function names."
+    out = "No function signatures found for the provided function names."
+    if symbol_suggestions:
+        out += "\n\n" + symbol_suggestions
+    return out
 
 
 class GrepSearchInput(BaseModel):
@@ -233,3 +282,141 @@ def grep_search(
 
     except Exception as e:
         return f"Error during text search: {str(e)}"
+
+
+class KeywordSearchInput(BaseModel):
+    """Input for keyword search tool."""
+
+    query: str = Field(
+        description="The keywords to search for, f.ex. exact function or type names such as `setup_reservoir_model`."
+    )
+    k: int = Field(default=5, description="The number of chunks to return.")
+
+
+@tool(
+    "keyword_search",
+    description="Do a ranked keyword search over the JutulDarcy documentation and examples. Use this tool to find exact function, type or keyword names, which the semantic search can miss.",
+    args_schema=KeywordSearchInput,
+)
+def keyword_search(
+    query: str, config: Annotated[RunnableConfig, InjectedToolArg], k: int = 5
+) -> str:
+    configuration = BaseConfiguration.from_runnable_config(config)
+    specs = list(RETRIEVER_SPECS["jutuldarcy"].values())
+    try:
+        rankings = [
+            [
+                doc
+                for doc, _ in retrieval.get_bm25_index(configuration, spec).search(
+                    query, k=k
+                )
+            ]
+            for spec in specs
+        ]
+    except IndexNotBuiltError as e:
+        return str(e)
+    except Exception as e:
+        return f"Error during keyword search: {str(e)}"
+
+    # The BM25 scores depend on the term statistics of each index, so the rankings of the
+    # indexes are merged by rank instead of by score
+    fused = reciprocal_rank_fusion(
+        [[(i, rank) for rank in range(len(docs))] for i, docs in enumerate(rankings)],
+        weights=[1.0] * len(rankings),
+    )[:k]
+    if not fused:
+        return f"No matches found for: {query}"
+
+    match_results = []
+    for (i, rank), _ in fused:
+        doc = rankings[i][rank]
+        section = doc.metadata.get("heading") or split_docs.get_section_path(doc)
+        match_results.append(
+            f"# From `{get_file_source(doc)}`: Section `{section}` "
+            f"({specs[i].collection_name})\n"
+            f"{doc.page_content.strip()}"
+        )
+
+    out_text = f"Found {len(match_results)} matches:\n\n" + "\n\n".join(match_results)
+    print_to_console(
+        text=out_text[:500] + "...",
+        title=f"Keyword search: {query}",
+        border_style=colorscheme.message,
+    )
+    return out_text
+
+
+Collection = Literal[
+    "jutuldarcy_docs", "jutuldarcy_examples", "fimbul_docs", "fimbul_examples"
+]
+
+
+class SearchDocumentationInput(BaseModel):
+    """Input for the search documentation tool."""
+
+    query: str = Field(description="The query used for the semantic search.")
+    collections: List[Collection] = Field(
+        default=["jutuldarcy_docs", "jutuldarcy_examples"],
+        description="The documentation and example collections to search.",
+    )
+
+
+@tool(
+    "search_documentation",
+    description="Do a semantic search over several documentation and example collections at once, returning one ranked list. Use this tool to cover a topic across the JutulDarcy and Fimbul docs and examples in a single call.",
+    args_schema=SearchDocumentationInput,
+)
+def search_documentation(
+    query: str,
+    config: Annotated[RunnableConfig, InjectedToolArg],
+    collections: List[Collection] = ["jutuldarcy_docs", "jutuldarcy_examples"],
+) -> str:
+    configuration = BaseConfiguration.from_runnable_config(config)
+    if not query.strip():
+        return "The query is empty."
+
+    specs_by_collection = get_retriever_specs_by_collection()
+    try:
+        hits = fan_out_search(
+            configuration,
+            query,
+            [
+                specs_by_collection[collection]
+                for collection in dict.fromkeys(collections)
+            ],
+            token_budget=configuration.retrieval_token_budget,
+        )
+    except IndexNotBuiltError as e:
+        return str(e)
+    except (ValueError, OSError) as e:
+        return f"Error during documentation search: {str(e)}"
+
+    if not hits:
+        return f"No results found for: {query}"
+
+    formatted = []
+    for hit in hits:
+        # The hits are ordered best first, but only have a relevance score with the plain
+        # similarity search
+        details = hit.collection_name
+        if hit.relevance is not None:
+            details += f", relevance {hit.relevance:.3f}"
+        if hit.collection_name.endswith("_examples"):
+            formatted.append(
+                f"# From `{get_file_source(hit.doc)}` ({details}):\n"
+                f"{split_examples.format_doc(hit.doc)}"
+            )
+        else:
+            formatted.append(
+                f"# From `{get_file_source(hit.doc)}`: Section `{split_docs.get_section_path(hit.doc)}` "
+                f"({details})\n"
+                f"{split_docs.format_doc(hit.doc)}"
+            )
+
+    out_text = "\n\n".join(formatted)
+    print_to_console(
+        text=f"**Query:** `{query}`\n\nFound {len(hits)} results in {', '.join(collections)}.",
+        title="Searching documentation",
+        border_style=colorscheme.message,
+    )
+    return out_text
@@ -0,0 +1,303 @@
+"""
+Retrieval quality and latency benchmark.
+
+Runs a fixed set of JutulDarcy and Fimbul queries, with the source files (and optionally the
+section) expected among the results, against several retriever configurations, and reports
+recall@k, MRR, p50 and p95 latency and the number of tokens returned for each.
+
+In CI the chunks are embedded with `HashingEmbeddings`, a deterministic local stand-in for
+the embedding model, so the absolute numbers only reflect lexical overlap. They are still
+useful for comparing changes to chunking, search kwargs and index types. The indexes are
+built in a temporary directory, from the bundled sources.
+
+Run the benchmark and show the report with
+
+```bash
+uv run pytest tests/integration_tests/test_retrieval_benchmark.py -s
+```
+
+or with a real embedding model (needs the API key, and embeds the whole corpus) by
+
+```bash
+uv run python tests/integration_tests/test_retrieval_benchmark.py --embedding-model openai:text-embedding-3-small
+```
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.configuration import BaseConfiguration
+from jutulgpt.rag import split_docs
+from jutulgpt.rag.fanout import get_retriever_specs_by_collection
+from jutulgpt.rag.packing import chunk_tokens
+from jutulgpt.rag.registry import registry
+from jutulgpt.rag.retrieval import RetrievalParams, build_index, make_retriever
+from jutulgpt.rag.retriever_specs import RetrieverSpec
+
+QUERIES_PATH = Path(__file__).parent / "retrieval_benchmark_queries.json"
+HASHING_EMBEDDING_MODEL = "hashing:bow-512"
+K = 5
+
+# The configurations to compare, as overrides of the configuration, and the search type
+# and kwargs passed to the retriever
+CONFIGURATIONS: dict[str, dict[str, Any]] = {
+    "faiss-flat-similarity": {
+        "configurable": {"retriever_provider": "faiss"},
+        "search_type": "similarity",
+        "search_kwargs": {"k": K},
+    },
+    "faiss-flat-mmr": {
+        "configurable": {"retriever_provider": "faiss"},
+        "search_type": "mmr",
+        "search_kwargs": {"k": K, "fetch_k": 4 * K, "lambda_mult": 0.5},
+    },
+    "faiss-flat-hybrid": {
+        "configurable": {"retriever_provider": "faiss"},
+        "search_type": "hybrid",
+        "search_kwargs": {"k": K},
+    },
+    "faiss-hnsw-similarity": {
+        "configurable": {
+            "retriever_provider": "faiss",
+            "faiss_index_factory": "HNSW32",
+            "faiss_search_params": {"efSearch": 64},
+        },
+        "search_type": "similarity",
+        "search_kwargs": {"k": K},
+    },
+    "chroma-similarity": {
+        "configurable": {"retriever_provider": "chroma"},
+        "search_type": "similarity",
+        "search_kwargs": {"k": K},
+    },
+}
+
+# Lowest recall@k accepted for any configuration with the hashing embedder
+MIN_RECALL = 0.5
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings: the words and word pairs of the text are hashed
+    into `size` signed buckets, and the vector is normalized. Needs no model or network.
+    """
+
+    def __init__(self, size: int = 512):
+        self.size = size
+
+    def _embed(self, text: str) -> list[float]:
+        words = _WORD_PATTERN.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.size] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+@dataclass
+class BenchmarkQuery:
+    collection: str
+    query: str
+    expected_sources: list[str]  # Path suffixes of the expected source files
+    expected_section: Optional[str] = None  # Part of the expected heading or section
+
+    def is_relevant(self, doc: Document, expected_source: str) -> bool:
+        source = str(doc.metadata.get("source", "")).replace(os.sep, "/")
+        if not source.endswith(expected_source):
+            return False
+        if self.expected_section is None:
+            return True
+        section = doc.metadata.get("heading") or split_docs.get_section_path(doc)
+        return self.expected_section.lower() in str(section).lower()
+
+
+@dataclass
+class BenchmarkResult:
+    configuration: str
+    recall: float
+    mrr: float
+    p50_ms: float
+    p95_ms: float
+    mean_tokens: float
+
+    def row(self) -> str:
+        return (
+            f"| {self.configuration} | {self.recall:.2f} | {self.mrr:.2f} "
+            f"| {self.p50_ms:.1f} | {self.p95_ms:.1f} | {self.mean_tokens:.0f} |"
+        )
+
+
+def load_queries(path: Path = QUERIES_PATH) -> list[BenchmarkQuery]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [BenchmarkQuery(**query) for query in json.load(f)]
+
+
+def make_benchmark_specs(store_dir: str) -> dict[str, RetrieverSpec]:
+    """The retriever specs of the bundled sources, with the chunks and indexes in `store_dir`."""
+    return {
+        name: dataclasses.replace(
+            spec,
+            persist_path=lambda retriever_dir_name, name=name: os.path.join(
+                store_dir, f"retriever_{name}_{retriever_dir_name}"
+            ),
+            cache_path=os.path.join(store_dir, f"loaded_{name}.sqlite"),
+        )
+        for name, spec in get_retriever_specs_by_collection().items()
+    }
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_benchmark(
+    configuration_name: str,
+    queries: list[BenchmarkQuery],
+    specs: dict[str, RetrieverSpec],
+    embedding_model: str,
+) -> BenchmarkResult:
+    """Build the indexes for the configuration if needed, and run all the queries against it."""
+    settings = CONFIGURATIONS[configuration_name]
+    configurable = {**settings["configurable"], "embedding_model": embedding_model}
+    config = {"configurable": configurable}
+    configuration = BaseConfiguration(**configurable)
+    retrieval_params = RetrievalParams(
+        search_type=settings["search_type"], search_kwargs=settings["search_kwargs"]
+    )
+    for collection in {query.collection for query in queries}:
+        build_index(configuration, specs[collection])
+
+    recalls, reciprocal_ranks, latencies, tokens = [], [], [], []
+    warmed_up = set()
+    for query in queries:
+        spec = specs[query.collection]
+        if query.collection not in warmed_up:
+            # Loading the index and the retriever is not part of the search latency
+            with make_retriever(config, spec, retrieval_params) as retriever:
+                retriever.invoke(query.query)
+            warmed_up.add(query.collection)
+
+        start_time = time.perf_counter()
+        with make_retriever(config, spec, retrieval_params) as retriever:
+            docs = retriever.invoke(query.query)[:K]
+        latencies.append(1000 * (time.perf_counter() - start_time))
+
+        found = {
+            expected
+            for expected in query.expected_sources
+            if any(query.is_relevant(doc, expected) for doc in docs)
+        }
+        recalls.append(len(found) / len(query.expected_sources))
+        first_relevant = next(
+            (
+                rank
+                for rank, doc in enumerate(docs, start=1)
+                if any(query.is_relevant(doc, e) for e in query.expected_sources)
+            ),
+            None,
+        )
+        reciprocal_ranks.append(1 / first_relevant if first_relevant else 0.0)
+        tokens.append(sum(chunk_tokens(doc) for doc in docs))
+
+    return BenchmarkResult(
+        configuration=configuration_name,
+        recall=statistics.mean(recalls),
+        mrr=statistics.mean(reciprocal_ranks),
+        p50_ms=_percentile(latencies, 50),
+        p95_ms=_percentile(latencies, 95),
+        mean_tokens=statistics.mean(tokens),
+    )
+
+
+def format_report(results: list[BenchmarkResult]) -> str:
+    lines = [
+        f"| Configuration | Recall@{K} | MRR | p50 (ms) | p95 (ms) | Tokens |",
+        "| --- | --- | --- | --- | --- | --- |",
+    ]
+    return "\n".join(lines + [result.row() for result in results])
+
+
+@pytest.fixture(scope="module")
+def benchmark_specs(tmp_path_factory) -> dict[str, RetrieverSpec]:
+    registry.register_embeddings(HASHING_EMBEDDING_MODEL, HashingEmbeddings())
+    yield make_benchmark_specs(str(tmp_path_factory.mktemp("retrieval_benchmark")))
+    registry.clear()
+
+
+def test_queries_reference_existing_sources():
+    specs = get_retriever_specs_by_collection()
+    for query in load_queries():
+        assert query.collection in specs
+        for expected in query.expected_sources:
+            assert (Path(specs[query.collection].dir_path) / expected).is_file()
+
+
+def test_hashing_embeddings_are_deterministic():
+    embeddings = HashingEmbeddings()
+    first = embeddings.embed_query("Add a well to the model")
+    assert first == HashingEmbeddings().embed_query("Add a well to the model")
+    assert np.isclose(np.linalg.norm(first), 1.0)
+
+
+def test_retrieval_benchmark(benchmark_specs):
+    queries = load_queries()
+    results = [
+        run_benchmark(name, queries, benchmark_specs, HASHING_EMBEDDING_MODEL)
+        for name in CONFIGURATIONS
+    ]
+    print("\n" + format_report(results))
+    for result in results:
+        assert result.recall >= MIN_RECALL, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--embedding-model",
+        default=HASHING_EMBEDDING_MODEL,
+        help="The embedding model, by default the local hashing stand-in.",
+    )
+    parser.add_argument(
+        "--configuration",
+        action="append",
+        choices=list(CONFIGURATIONS),
+        help="Only run this configuration. Can be repeated.",
+    )
+    args = parser.parse_args()
+
+    registry.register_embeddings(HASHING_EMBEDDING_MODEL, HashingEmbeddings())
+    with tempfile.TemporaryDirectory() as store_dir:
+        specs = make_benchmark_specs(store_dir)
+        queries = load_queries()
+        results = [
+            run_benchmark(name, queries, specs, args.embedding_model)
+            for name in args.configuration or CONFIGURATIONS
+        ]
+    print(format_report(results))
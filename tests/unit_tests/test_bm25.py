@@ -0,0 +1,54 @@
+from langchain_core.documents import Document
+
+from jutulgpt.rag.bm25 import BM25Index, tokenize
+
+
+def _index() -> BM25Index:
+    return BM25Index(
+        [
+            Document(page_content="model = setup_reservoir_model(domain, sys)"),
+            Document(page_content="Plot the well results of the simulation."),
+            Document(page_content="simulate_reservoir!(state, model) runs the model"),
+        ],
+        ids=["setup", "plot", "simulate"],
+    )
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    tokens = tokenize("setup_reservoir_model and simulate!")
+    assert "setup_reservoir_model" in tokens
+    assert {"setup", "reservoir", "model"} <= set(tokens)
+    assert "simulate!" in tokens
+
+
+def test_search_finds_exact_identifier():
+    results = _index().search("setup_reservoir_model", k=2)
+    assert results[0][0].id == "setup"
+    assert results[0][1] > 0
+
+
+def test_scores_only_chunks_with_query_terms():
+    index = _index()
+    assert set(index.scores("well plot")) == {1}
+    assert index.scores("nonexistent") == {}
+
+
+def test_rarer_terms_score_higher():
+    index = _index()
+    # "model" is in two chunks, "domain" only in one
+    assert index.scores("domain")[0] > index.scores("model")[0]
+
+
+def test_save_and_load(tmp_path):
+    index = _index()
+    path = str(tmp_path / "bm25.json")
+    index.save(path)
+    documents = {"setup": Document(id="setup", page_content="loaded")}
+    loaded = BM25Index.load(
+        path, document_loader=lambda ids: [documents[id] for id in ids]
+    )
+    assert loaded is not None
+    assert loaded.scores("setup_reservoir_model") == index.scores(
+        "setup_reservoir_model"
+    )
+    assert loaded.search("setup_reservoir_model", k=1)[0][0].page_content == "loaded"
@@ -0,0 +1,32 @@
+from langchain_core.documents import Document
+
+from jutulgpt.rag.chunk_store import SQLiteChunkStore
+from jutulgpt.rag.indexing import chunk_id
+
+
+def _chunks(source: str, *texts: str) -> list[Document]:
+    return [Document(page_content=text, metadata={"source": source}) for text in texts]
+
+
+def test_replace_sources(tmp_path):
+    store = SQLiteChunkStore(str(tmp_path / "chunks.sqlite"))
+    store.replace_sources({"a.jl": _chunks("a.jl", "1", "2"), "b.jl": []})
+    store.replace_sources({"c.jl": _chunks("c.jl", "3")}, removed_sources=["a.jl"])
+    assert store.sources() == {"b.jl", "c.jl"}
+    assert [doc.page_content for doc in store.iter_documents()] == ["3"]
+
+    chunk = _chunks("c.jl", "3")[0]
+    assert store.get_many([chunk_id(chunk), "unknown"])[0].page_content == "3"
+
+
+def test_deduplicated_chunks_are_kept_until_the_chunks_change(tmp_path):
+    store = SQLiteChunkStore(str(tmp_path / "chunks.sqlite"))
+    store.replace_sources({"a.jl": _chunks("a.jl", "1", "2")})
+    assert store.get_deduplicated("v1") is None
+
+    store.set_deduplicated("v1", _chunks("a.jl", "1"))
+    assert [doc.page_content for doc in store.get_deduplicated("v1")] == ["1"]
+    assert store.get_deduplicated("v2") is None
+
+    store.replace_sources({"b.jl": _chunks("b.jl", "3")})
+    assert store.get_deduplicated("v1") is None
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.rag.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.queries = []
+        self.documents = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.documents.extend(texts)
+        return [[float(len(text)), 0.0] for text in texts]
+
+
+def test_query_memory_tier(tmp_path):
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "model", cache_path=str(tmp_path / "cache.sqlite"))
+    first = cached.embed_query("Add a well")
+    # Normalized whitespace and casing hit the same entry
+    assert cached.embed_query("  add a   WELL ") == first
+    assert inner.queries == ["Add a well"]
+    assert (cached.stats.memory_hits, cached.stats.misses) == (1, 1)
+
+
+def test_query_disk_tier_is_shared_between_sessions(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    CachedEmbeddings(CountingEmbeddings(), "model", cache_path=path).embed_query("q")
+
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "model", cache_path=path)
+    assert cached.embed_query("q") == [1.0, 1.0]
+    assert inner.queries == []
+    assert cached.stats.disk_hits == 1
+    # Promoted to the memory tier
+    cached.embed_query("q")
+    assert cached.stats.memory_hits == 1
+
+
+def test_memory_tier_evicts_least_recently_used():
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "model", cache_path=None, max_memory_entries=2)
+    for query in ["a", "b", "a", "c", "a", "b"]:
+        cached.embed_query(query)
+    assert inner.queries == ["a", "b", "c", "b"]
+
+
+def test_keyed_by_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    CachedEmbeddings(CountingEmbeddings(), "model-a", cache_path=path).embed_query("q")
+    inner = CountingEmbeddings()
+    CachedEmbeddings(inner, "model-b", cache_path=path).embed_query("q")
+    assert inner.queries == ["q"]
+
+
+def test_documents_only_embed_missing_texts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "model", cache_path=path)
+    assert cached.embed_documents(["a", "bb"]) == [[1.0, 0.0], [2.0, 0.0]]
+    assert cached.embed_documents(["bb", "ccc"]) == [[2.0, 0.0], [3.0, 0.0]]
+    assert inner.documents == ["a", "bb", "ccc"]
+    assert cached.document_stats.disk_hits == 1
+    assert cached.document_stats.misses == 3
+
+
+def test_duplicate_documents_are_embedded_once():
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "model", cache_path=None)
+    assert cached.embed_documents(["a", "a"]) == [[1.0, 0.0], [1.0, 0.0]]
+    assert inner.documents == ["a"]
+
+
+def test_stats_count_every_concurrent_lookup(tmp_path):
+    cached = CachedEmbeddings(
+        CountingEmbeddings(), "model", cache_path=str(tmp_path / "cache.sqlite")
+    )
+    queries = [f"query {i % 10}" for i in range(400)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(cached.embed_query, queries))
+    info = cached.cache_info()
+    assert info["memory_hits"] + info["disk_hits"] + info["misses"] == len(queries)
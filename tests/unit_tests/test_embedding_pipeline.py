@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.rag import embedding_pipeline
+from jutulgpt.rag.embedding_cache import CachedEmbeddings
+from jutulgpt.rag.embedding_pipeline import (
+    AdaptiveLimiter,
+    aembed_texts,
+    batch_by_tokens,
+)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(
+        embedding_pipeline, "count_tokens", lambda text: len(text.split())
+    )
+
+
+def test_batch_by_tokens():
+    texts = ["a b", "c d e", "f", "g h i j"]
+    assert batch_by_tokens(texts, max_tokens=5) == [["a b", "c d e"], ["f", "g h i j"]]
+    assert batch_by_tokens(texts, max_tokens=100, max_batch_size=3) == [
+        ["a b", "c d e", "f"],
+        ["g h i j"],
+    ]
+
+
+def test_long_text_gets_its_own_batch():
+    assert batch_by_tokens(["a", "b c d e f g", "h"], max_tokens=3) == [
+        ["a"],
+        ["b c d e f g"],
+        ["h"],
+    ]
+    assert batch_by_tokens([]) == []
+
+
+def _release_all(limiter: AdaptiveLimiter, n: int, **kwargs) -> None:
+    async def run():
+        for _ in range(n):
+            await limiter.acquire()
+            await limiter.release(**kwargs)
+
+    asyncio.run(run())
+
+
+def test_limiter_grows_after_consecutive_successes():
+    limiter = AdaptiveLimiter(max_concurrency=8, increase_after=2)
+    limiter.limit = 2
+    _release_all(limiter, 4)
+    assert limiter.limit == 4
+    _release_all(limiter, 20)
+    assert limiter.limit == 8
+
+
+def test_limiter_halves_on_rate_limits():
+    limiter = AdaptiveLimiter(max_concurrency=8)
+    _release_all(limiter, 1, succeeded=False, rate_limited=True)
+    assert limiter.limit == 4
+    _release_all(limiter, 5, succeeded=False, rate_limited=True)
+    assert limiter.limit == 1
+
+
+def test_limiter_does_not_grow_on_other_errors():
+    limiter = AdaptiveLimiter(max_concurrency=8, increase_after=2)
+    limiter.limit = 2
+    _release_all(limiter, 1)
+    _release_all(limiter, 4, succeeded=False)
+    _release_all(limiter, 1)
+    assert limiter.limit == 2
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class FlakyEmbeddings(Embeddings):
+    """Fails the first call with a rate limit, and then embeds the texts."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if self.calls == 1:
+            raise RateLimitError("429 Too Many Requests")
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [float(len(text))]
+
+
+def test_aembed_texts_retries_rate_limits(tmp_path):
+    embeddings = CachedEmbeddings(
+        FlakyEmbeddings(), "flaky", cache_path=str(tmp_path / "cache.sqlite")
+    )
+    stats = asyncio.run(
+        aembed_texts(embeddings, ["a", "b c", "a"], initial_backoff=0.0)
+    )
+    assert (stats.embedded, stats.cached, stats.rate_limited) == (2, 1, 1)
+    assert embeddings.get_cached_documents(["a", "b c"]) == {
+        "a": [1.0],
+        "b c": [3.0],
+    }
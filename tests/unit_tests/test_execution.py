@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+from jutulgpt.tools import execution
+from jutulgpt.tools.execution import (
+    cancel_background_job,
+    get_background_job_status,
+    tail_background_job_output,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_jobs(monkeypatch):
+    monkeypatch.setattr(execution, "_background_jobs", {})
+
+
+def _start(command: str, tmp_path) -> execution.BackgroundJob:
+    return execution._start_background_job(command, str(tmp_path))
+
+
+def _wait(job: execution.BackgroundJob, timeout: float = 10) -> None:
+    deadline = time.time() + timeout
+    while job.poll() is None and time.time() < deadline:
+        time.sleep(0.05)
+
+
+def test_tail_finished_job(tmp_path):
+    job = _start("echo first; echo second; echo third", tmp_path)
+    _wait(job)
+
+    status = get_background_job_status.invoke({"job_id": job.job_id})
+    assert "finished" in status
+    output = tail_background_job_output.invoke({"job_id": job.job_id, "n_lines": 2})
+    assert output.endswith("# LAST 2 LINES:\n\n```text\nsecond\nthird\n```")
+
+
+def test_failed_job_reports_exit_code(tmp_path):
+    job = _start("echo oops >&2; exit 3", tmp_path)
+    _wait(job)
+    status = get_background_job_status.invoke({"job_id": job.job_id})
+    assert "failed" in status and "EXIT CODE: 3" in status
+    assert "oops" in tail_background_job_output.invoke({"job_id": job.job_id})
+
+
+def test_cancel_running_job(tmp_path):
+    job = _start("echo started; sleep 30", tmp_path)
+    assert job.poll() is None
+
+    result = cancel_background_job.invoke({"job_id": job.job_id})
+    assert "Cancelled" in result
+    assert job.poll() is not None
+    assert "cancelled" in get_background_job_status.invoke({"job_id": job.job_id})
+    assert "already stopped" in cancel_background_job.invoke({"job_id": job.job_id})
+
+
+def test_unknown_job():
+    assert "No background job" in get_background_job_status.invoke({"job_id": "nope"})
+
+
+def test_finished_jobs_are_evicted_with_their_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(execution, "_MAX_FINISHED_JOBS", 1)
+    old = _start("echo old", tmp_path)
+    _wait(old)
+    recent = _start("echo recent", tmp_path)
+    _wait(recent)
+    running = _start("sleep 30", tmp_path)
+    try:
+        assert _start("echo new", tmp_path).job_id in execution._background_jobs
+        assert old.job_id not in execution._background_jobs
+        assert not os.path.exists(old.log_path)
+        assert recent.job_id in execution._background_jobs
+        assert os.path.exists(recent.log_path)
+        assert running.job_id in execution._background_jobs
+    finally:
+        cancel_background_job.invoke({"job_id": running.job_id})
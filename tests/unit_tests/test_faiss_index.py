@@ -0,0 +1,98 @@
+import os
+import zlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.rag.faiss_index import (
+    MMAP_IDS_FILE,
+    build_faiss_vectorstore,
+    is_mmap_vectorstore,
+    load_mmap_faiss_vectorstore,
+    save_faiss_vectorstore,
+    set_faiss_search_params,
+    supports_removal,
+)
+from jutulgpt.rag.indexing import get_vectorstore_ids
+
+
+class RandomEmbeddings(Embeddings):
+    """Deterministic random unit vectors, one per text."""
+
+    def __init__(self, dimension: int = 16):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> list[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        vector = rng.standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def _chunks(n: int) -> tuple[list[Document], list[str]]:
+    docs = [
+        Document(page_content=f"chunk {i}", metadata={"source": f"{i % 3}.md"})
+        for i in range(n)
+    ]
+    return docs, [f"id{i}" for i in range(n)]
+
+
+def test_mmap_round_trip(tmp_path):
+    embeddings = RandomEmbeddings()
+    docs, ids = _chunks(20)
+    vectorstore = build_faiss_vectorstore(docs, ids, embeddings)
+    path = str(tmp_path / "index")
+
+    save_faiss_vectorstore(vectorstore, path, mmap_mode=False)
+    assert load_mmap_faiss_vectorstore(path, embeddings) is None
+
+    save_faiss_vectorstore(vectorstore, path, mmap_mode=True)
+    assert os.path.exists(os.path.join(path, MMAP_IDS_FILE))
+    assert not os.path.exists(path + ".tmp")
+    loaded = load_mmap_faiss_vectorstore(path, embeddings)
+    assert is_mmap_vectorstore(loaded)
+    assert get_vectorstore_ids(loaded) == set(ids)
+
+    query = "chunk 7"
+    expected = vectorstore.similarity_search(query, k=3)
+    found = loaded.similarity_search(query, k=3)
+    assert [doc.page_content for doc in found] == [doc.page_content for doc in expected]
+    assert [doc.metadata for doc in found] == [doc.metadata for doc in expected]
+    assert loaded.docstore.search("id4").page_content == "chunk 4"
+
+
+@pytest.mark.parametrize(
+    "index_factory, removable",
+    [("Flat", True), ("HNSW8", False), ("IVF4,PQ4x4", False)],
+)
+def test_build_index_types(index_factory, removable):
+    import faiss
+
+    embeddings = RandomEmbeddings()
+    docs, ids = _chunks(64)
+    vectorstore = build_faiss_vectorstore(docs, ids, embeddings, index_factory)
+    index = vectorstore.index
+    assert index.is_trained
+    assert index.ntotal == 64
+    assert supports_removal(index) == removable
+    if index_factory.startswith("IVF"):
+        assert isinstance(faiss.extract_index_ivf(index), faiss.IndexIVF)
+        set_faiss_search_params(index, {"nprobe": 4})
+    assert get_vectorstore_ids(vectorstore) == set(ids)
+
+    # The nearest chunk of a stored chunk is itself, also for the approximate indexes
+    found = vectorstore.similarity_search("chunk 7", k=1)
+    assert found[0].page_content == "chunk 7"
+
+
+def test_build_index_with_too_few_chunks_to_train():
+    docs, ids = _chunks(8)
+    with pytest.raises(ValueError, match="Could not train the FAISS index"):
+        build_faiss_vectorstore(docs, ids, RandomEmbeddings(), "IVF64,Flat")
@@ -0,0 +1,78 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.configuration import BaseConfiguration
+from jutulgpt.rag import split_docs
+from jutulgpt.rag.fanout import fan_out_search
+from jutulgpt.rag.registry import registry
+from jutulgpt.rag.retrieval import build_index
+from jutulgpt.rag.retriever_specs import RetrieverSpec
+
+EMBEDDING_MODEL = "fake:fanout"
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.queries: list[str] = []
+
+    def _embed(self, text: str) -> list[float]:
+        return [float(len(text)), float(text.count("e")), 1.0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return self._embed(text)
+
+
+@pytest.fixture
+def embeddings():
+    embeddings = CountingEmbeddings()
+    registry.register_embeddings(EMBEDDING_MODEL, embeddings)
+    yield embeddings
+    registry.clear()
+
+
+def _make_spec(tmp_path, name: str) -> RetrieverSpec:
+    source_dir = tmp_path / "sources" / name
+    source_dir.mkdir(parents=True)
+    for i in range(3):
+        (source_dir / f"page_{i}.md").write_text(
+            f"# Page {i}\n\nThe {name} page about wells and {'reservoirs ' * i}.\n"
+        )
+    return RetrieverSpec(
+        dir_path=str(source_dir),
+        persist_path=lambda retriever_dir_name: str(
+            tmp_path / "store" / f"retriever_{name}_{retriever_dir_name}"
+        ),
+        cache_path=str(tmp_path / "store" / f"loaded_{name}.sqlite"),
+        collection_name=name,
+        filetype="md",
+        split_func=split_docs.split_docs,
+    )
+
+
+@pytest.mark.parametrize("search_type", ["similarity", "mmr"])
+def test_query_is_embedded_once(tmp_path, embeddings, search_type):
+    configuration = BaseConfiguration(
+        embedding_model=EMBEDDING_MODEL,
+        retriever_provider="faiss",
+        rerank_provider="None",
+        examples_search_type=search_type,
+        examples_search_kwargs={"k": 2, "fetch_k": 4, "lambda_mult": 0.5},
+    )
+    specs = [_make_spec(tmp_path, name) for name in ("docs", "examples")]
+    for spec in specs:
+        build_index(configuration, spec)
+    embeddings.queries.clear()
+
+    hits = fan_out_search(configuration, "wells", specs, k_per_spec=2)
+
+    assert embeddings.queries == ["wells"]
+    assert {hit.collection_name for hit in hits} == {"docs", "examples"}
+    if search_type == "similarity":
+        assert all(hit.relevance is not None for hit in hits)
+    else:
+        # The fused rank scores are not reported as relevance
+        assert all(hit.relevance is None for hit in hits)
@@ -0,0 +1,93 @@
+import re
+import sys
+import threading
+
+import pytest
+
+import jutulgpt.julia.get_function_documentation  # noqa: F401
+
+# The package exports a function with the name of the module
+documentation = sys.modules["jutulgpt.julia.get_function_documentation"]
+
+
+def _lookup_output(names: list[str]) -> tuple[list[str], str]:
+    return names, "\n\n".join(
+        f"# Documentation for '{name}':\n{name}(args) does things." for name in names
+    )
+
+
+class FakeLookup:
+    """Stands in for the Julia documentation lookup, recording the looked up names."""
+
+    def __init__(self, fail_first: bool = False):
+        self.calls: list[list[str]] = []
+        self.fail_first = fail_first
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, code: str, verbose: bool = True):
+        names = re.findall(r"(\S+)\(\);", code)
+        self.calls.append(names)
+        self.release.wait(timeout=5)
+        if self.fail_first and len(self.calls) == 1:
+            return None
+        return _lookup_output(names)
+
+
+@pytest.fixture
+def lookup(monkeypatch):
+    lookup = FakeLookup()
+    monkeypatch.setattr(documentation, "_run_documentation_lookup", lookup)
+    monkeypatch.setattr(documentation, "_documentation_cache", {})
+    monkeypatch.setattr(documentation, "_prefetch_futures", [])
+    return lookup
+
+
+def test_cache_hit(lookup):
+    names, docs = documentation.get_cached_function_documentation(["setup_well"])
+    assert names == ["setup_well"]
+    assert "# Documentation for 'setup_well':\nsetup_well(args) does things." in docs
+
+    again = documentation.get_cached_function_documentation(["setup_well", "si_unit"])
+    assert again[0] == ["setup_well", "si_unit"]
+    # Only the function not already cached is looked up
+    assert lookup.calls == [["setup_well"], ["si_unit"]]
+
+
+def test_missing_documentation_is_cached_as_empty(lookup, monkeypatch):
+    monkeypatch.setattr(
+        documentation, "_run_documentation_lookup", lambda code, verbose: ([], "")
+    )
+    assert documentation.get_cached_function_documentation(["nothing"]) == ([], "")
+    assert documentation._documentation_cache == {"nothing": ""}
+
+
+def test_prefetch_hit(lookup):
+    lookup.release.clear()
+    documentation.prefetch_function_documentation(["setup_well", "simulate_reservoir"])
+    lookup.release.set()
+
+    names, _ = documentation.get_cached_function_documentation(["simulate_reservoir"])
+    assert names == ["simulate_reservoir"]
+    # Waited for the prefetch instead of looking the function up again
+    assert lookup.calls == [["setup_well", "simulate_reservoir"]]
+
+
+def test_failed_lookup_is_retried(monkeypatch, lookup):
+    failing = FakeLookup(fail_first=True)
+    monkeypatch.setattr(documentation, "_run_documentation_lookup", failing)
+
+    assert documentation.get_cached_function_documentation(["setup_well"]) == ([], "")
+    assert "setup_well" not in documentation._documentation_cache
+
+    names, _ = documentation.get_cached_function_documentation(["setup_well"])
+    assert names == ["setup_well"]
+    assert failing.calls == [["setup_well"], ["setup_well"]]
+
+
+def test_split_documentation():
+    _, text = _lookup_output(["a", "b!"])
+    assert documentation._split_documentation(text) == {
+        "a": "a(args) does things.",
+        "b!": "b!(args) does things.",
+    }
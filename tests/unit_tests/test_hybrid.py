@@ -0,0 +1,31 @@
+import pytest
+
+from jutulgpt.rag.hybrid import matches_filter, reciprocal_rank_fusion
+
+
+def test_reciprocal_rank_fusion_sums_weighted_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b"], ["b", "c"]], [1.0, 1.0], rrf_k=60))
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["c"] == pytest.approx(1 / 62)
+
+
+def test_reciprocal_rank_fusion_orders_best_first():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], [1.0, 1.0])
+    assert [id for id, _ in fused] == ["b", "a", "c"]
+
+
+def test_reciprocal_rank_fusion_weights():
+    fused = reciprocal_rank_fusion([["a"], ["b"]], [1.0, 2.0])
+    assert [id for id, _ in fused] == ["b", "a"]
+
+
+def test_matches_filter():
+    metadata = {"source": "a.jl", "heading": "Setup"}
+    assert matches_filter(metadata, None)
+    assert matches_filter(metadata, {"source": "a.jl"})
+    assert matches_filter(metadata, {"source": ["b.jl", "a.jl"]})
+    assert not matches_filter(metadata, {"source": "b.jl"})
+    assert not matches_filter(metadata, lambda m: m["heading"] == "Run")
+    with pytest.raises(ValueError):
+        matches_filter(metadata, {"$or": [{"source": "a.jl"}]})
@@ -0,0 +1,166 @@
+import argparse
+import dataclasses
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.rag import index_cli, retrieval, split_docs
+from jutulgpt.rag.registry import registry
+from jutulgpt.rag.retriever_specs import RetrieverSpec
+
+EMBEDDING_MODEL = "fake:index-cli"
+
+
+class LengthEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [float(len(text)), float(text.count(" ")), 1.0]
+
+
+def _make_spec(tmp_path, name: str, n_files: int) -> RetrieverSpec:
+    source_dir = tmp_path / "sources" / name
+    source_dir.mkdir(parents=True)
+    for i in range(n_files):
+        (source_dir / f"page_{i}.md").write_text(
+            f"# Page {i}\n\nThe {name} page number {i}.\n"
+        )
+    store_dir = tmp_path / "store"
+    return RetrieverSpec(
+        dir_path=str(source_dir),
+        persist_path=lambda retriever_dir_name: str(
+            store_dir / f"retriever_{name}_{retriever_dir_name}"
+        ),
+        cache_path=str(store_dir / f"loaded_{name}.sqlite"),
+        collection_name=name,
+        filetype="md",
+        split_func=split_docs.split_docs,
+    )
+
+
+@pytest.fixture
+def specs(tmp_path, monkeypatch):
+    n_files = retrieval._MIN_FILES_FOR_PROCESS_POOL
+    specs = {name: _make_spec(tmp_path, name, n_files) for name in ("docs", "guide")}
+    (tmp_path / "store").mkdir()
+    monkeypatch.setattr(index_cli, "get_retriever_specs_by_collection", lambda: specs)
+    registry.register_embeddings(EMBEDDING_MODEL, LengthEmbeddings())
+    yield specs
+    registry.clear()
+
+
+def _run(*argv: str, provider: str = "faiss") -> int:
+    parser = argparse.ArgumentParser()
+    index_cli.add_index_parser(parser.add_subparsers())
+    args = parser.parse_args(
+        ["index", *argv, "--embedding-model", EMBEDDING_MODEL]
+        + ["--retriever-provider", provider]
+    )
+    return args.func(args)
+
+
+def _configuration(provider: str = "faiss"):
+    return index_cli._get_configuration(
+        argparse.Namespace(
+            embedding_model=EMBEDDING_MODEL,
+            retriever_provider=provider,
+            faiss_index_factory=None,
+        )
+    )
+
+
+def test_split_in_process_pool_from_a_thread(specs):
+    spec = specs["docs"]
+    paths = sorted(
+        os.path.join(spec.dir_path, name) for name in os.listdir(spec.dir_path)
+    )
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        chunks = executor.submit(
+            retrieval._load_and_split_files, spec, paths, max_workers=2
+        ).result(timeout=120)
+    expected = retrieval._load_and_split_files(spec, paths, max_workers=1)
+    assert [[c.page_content for c in file] for file in chunks] == [
+        [c.page_content for c in file] for file in expected
+    ]
+
+
+def test_build_then_verify(specs):
+    assert _run("verify") == 1
+    assert _run("build", "--workers", "2") == 0
+    assert _run("verify") == 0
+
+    configuration = _configuration()
+    for spec in specs.values():
+        persist_path = retrieval.get_persist_path(configuration, spec)
+        assert os.path.isdir(persist_path)
+        assert not os.path.exists(persist_path + ".build.tmp")
+
+
+def test_verify_finds_changed_sources(specs):
+    assert _run("build", "--collection", "docs") == 0
+    with open(os.path.join(specs["docs"].dir_path, "page_0.md"), "a") as f:
+        f.write("\nA new paragraph.\n")
+    assert _run("verify", "--collection", "docs") == 1
+    assert _run("build", "--collection", "docs") == 0
+    assert _run("verify", "--collection", "docs") == 0
+
+
+def test_chroma_build_keeps_other_clients_open(specs):
+    from chromadb.api.client import SharedSystemClient
+
+    configuration = _configuration("chroma")
+    assert _run("build", "--collection", "guide", provider="chroma") == 0
+    guide = retrieval.load_vectorstore(configuration, specs["guide"])
+    n_guide = len(guide.get(include=[])["ids"])
+
+    assert _run("build", "--collection", "docs", provider="chroma") == 0
+    guide_path = retrieval.get_persist_path(configuration, specs["guide"])
+    docs_path = retrieval.get_persist_path(configuration, specs["docs"])
+    assert guide_path in SharedSystemClient._identifier_to_system
+    assert docs_path not in SharedSystemClient._identifier_to_system
+    assert len(guide.get(include=[])["ids"]) == n_guide
+    assert _run("verify", provider="chroma") == 0
+
+
+def _snapshot(directory) -> dict[str, int]:
+    return {
+        os.path.join(root, name): os.stat(os.path.join(root, name)).st_mtime_ns
+        for root, _, names in os.walk(directory)
+        for name in names
+    }
+
+
+def test_verify_does_not_write_the_mmap_files(specs, tmp_path, monkeypatch):
+    assert _run("build", "--collection", "docs") == 0
+    get_configuration = index_cli._get_configuration
+    monkeypatch.setattr(
+        index_cli,
+        "_get_configuration",
+        lambda args: dataclasses.replace(get_configuration(args), faiss_mmap=True),
+    )
+    before = _snapshot(tmp_path / "store")
+    assert _run("verify", "--collection", "docs") == 1
+    assert _snapshot(tmp_path / "store") == before
+
+    assert _run("build", "--collection", "docs") == 0
+    before = _snapshot(tmp_path / "store")
+    assert _run("verify", "--collection", "docs") == 0
+    assert _snapshot(tmp_path / "store") == before
+
+
+def test_prune(specs, tmp_path):
+    assert _run("build", "--collection", "docs") == 0
+    leftover = tmp_path / "store" / "retriever_docs_other.build.tmp"
+    leftover.mkdir()
+    no_manifest = tmp_path / "store" / "retriever_docs_other"
+    no_manifest.mkdir()
+
+    assert _run("prune", "--dry-run") == 0
+    assert leftover.exists() and no_manifest.exists()
+
+    assert _run("prune") == 0
+    assert not leftover.exists() and not no_manifest.exists()
+    assert _run("verify", "--collection", "docs") == 0
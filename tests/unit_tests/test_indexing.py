@@ -0,0 +1,75 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from jutulgpt.rag.indexing import (
+    chunk_id,
+    get_vectorstore_ids,
+    sync_vectorstore,
+    with_chunk_ids,
+)
+from jutulgpt.rag.near_duplicates import DUPLICATE_SOURCES_KEY, N_DUPLICATES_KEY
+
+
+def test_chunk_id_is_stable_and_depends_on_text_and_metadata():
+    doc = Document(page_content="x = 1", metadata={"source": "a.jl", "heading": "H"})
+    same = Document(page_content="x = 1", metadata={"heading": "H", "source": "a.jl"})
+    assert chunk_id(doc) == chunk_id(same)
+    assert chunk_id(doc) != chunk_id(
+        Document(page_content="x = 2", metadata=doc.metadata)
+    )
+    assert chunk_id(doc) != chunk_id(
+        Document(page_content="x = 1", metadata={"source": "b.jl", "heading": "H"})
+    )
+
+
+def test_chunk_id_ignores_duplicate_provenance():
+    doc = Document(page_content="x = 1", metadata={"source": "a.jl"})
+    kept = Document(
+        page_content="x = 1",
+        metadata={"source": "a.jl", DUPLICATE_SOURCES_KEY: "b.jl", N_DUPLICATES_KEY: 1},
+    )
+    assert chunk_id(doc) == chunk_id(kept)
+
+
+def test_with_chunk_ids_drops_identical_chunks():
+    docs = [
+        Document(page_content="x = 1", metadata={"source": "a.jl"}),
+        Document(page_content="x = 1", metadata={"source": "a.jl"}),
+        Document(page_content="x = 2", metadata={"source": "a.jl"}),
+    ]
+    chunks, ids = with_chunk_ids(docs)
+    assert len(chunks) == len(ids) == 2
+    assert ids == [chunk_id(chunk) for chunk in chunks]
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.documents: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.documents.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [float(len(text)), 1.0]
+
+
+def test_sync_vectorstore_only_embeds_new_chunks():
+    embeddings = CountingEmbeddings()
+    a = Document(page_content="x = 1", metadata={"source": "a.jl"})
+    b = Document(page_content="y = 2", metadata={"source": "b.jl"})
+    c = Document(page_content="z = 3", metadata={"source": "c.jl"})
+    vectorstore = FAISS.from_documents(
+        [a, b], embeddings, ids=[chunk_id(a), chunk_id(b)]
+    )
+    embeddings.documents.clear()
+
+    result = sync_vectorstore(vectorstore, [a, c])
+    assert (result.added, result.removed, result.unchanged) == (1, 1, 1)
+    assert result.changed
+    assert embeddings.documents.count("z = 3") >= 1
+    assert "x = 1" not in embeddings.documents
+    assert get_vectorstore_ids(vectorstore) == {chunk_id(a), chunk_id(c)}
+
+    assert not sync_vectorstore(vectorstore, [a, c]).changed
@@ -0,0 +1,44 @@
+from langchain_core.documents import Document
+
+from jutulgpt.rag import retrieval
+from jutulgpt.rag.bm25 import BM25Index
+from jutulgpt.tools.retrieve import keyword_search
+
+
+def _index(source: str, texts: list[str]) -> BM25Index:
+    return BM25Index(
+        [Document(page_content=text, metadata={"source": source}) for text in texts]
+    )
+
+
+def test_results_of_the_indexes_are_fused_by_rank(monkeypatch):
+    # The term is rare in the examples and common in the docs, so the raw scores of the
+    # examples are much higher
+    indexes = {
+        "jutuldarcy_docs": _index(
+            "docs.md", ["Use setup_well first", "setup_well again", "setup_well"]
+        ),
+        "jutuldarcy_examples": _index(
+            "example.jl",
+            ["w = setup_well(model)", "setup_well(g, 1)"]
+            + [f"unrelated text {i}" for i in range(20)],
+        ),
+    }
+    monkeypatch.setattr(
+        retrieval,
+        "get_bm25_index",
+        lambda configuration, spec: indexes[spec.collection_name],
+    )
+    docs_scores = [
+        score for _, score in indexes["jutuldarcy_docs"].search("setup_well")
+    ]
+    examples_scores = [
+        score for _, score in indexes["jutuldarcy_examples"].search("setup_well")
+    ]
+    assert min(examples_scores) > max(docs_scores)
+
+    result = keyword_search.invoke({"query": "setup_well", "k": 2})
+    # The best chunk of each index, instead of the two best examples
+    assert result.count("# From") == 2
+    assert "(jutuldarcy_docs)" in result
+    assert "(jutuldarcy_examples)" in result
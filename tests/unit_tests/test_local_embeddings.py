@@ -0,0 +1,93 @@
+import json
+from functools import partial
+
+import numpy as np
+import pytest
+
+from jutulgpt.rag import local_embeddings, retrieval
+from jutulgpt.rag.embedding_cache import CachedEmbeddings
+from jutulgpt.rag.local_embeddings import LocalEmbeddings, pool
+
+
+class FakeOnnxEncoder:
+    """
+    Stands in for the ONNX model. Returns three token embeddings per text, with the length
+    of the text in the first token, and records the batches.
+    """
+
+    instances: list["FakeOnnxEncoder"] = []
+
+    def __init__(self, onnx_path, model_path, num_threads):
+        self.onnx_path = onnx_path
+        self.num_threads = num_threads
+        self.batches: list[list[str]] = []
+        FakeOnnxEncoder.instances.append(self)
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        hidden_states = np.zeros((len(texts), 3, 2), dtype=np.float32)
+        for i, text in enumerate(texts):
+            hidden_states[i, 0] = [len(text), 1.0]
+            hidden_states[i, 1:] = [0.0, 1.0]
+        return hidden_states, np.ones((len(texts), 3), dtype=np.int64)
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    model_dir = tmp_path / "bge-small"
+    (model_dir / "onnx").mkdir(parents=True)
+    (model_dir / "onnx" / "model.onnx").write_bytes(b"")
+    (model_dir / "tokenizer.json").write_text("{}")
+    (model_dir / "1_Pooling").mkdir()
+    (model_dir / "1_Pooling" / "config.json").write_text(
+        json.dumps({"pooling_mode_cls_token": True})
+    )
+    (model_dir / "config_sentence_transformers.json").write_text(
+        json.dumps({"prompts": {"query": "query: ", "passage": "passage: "}})
+    )
+    FakeOnnxEncoder.instances = []
+    monkeypatch.setattr(local_embeddings, "_OnnxEncoder", FakeOnnxEncoder)
+    monkeypatch.setattr(
+        retrieval,
+        "CachedEmbeddings",
+        partial(CachedEmbeddings, cache_path=str(tmp_path / "cache.sqlite")),
+    )
+    return model_dir
+
+
+def test_make_text_encoder_with_local_model(model_dir):
+    encoder = retrieval.make_text_encoder(
+        f"local:{model_dir}", local_batch_size=2, local_threads=3
+    )
+    assert isinstance(encoder, CachedEmbeddings)
+    assert encoder.model == f"local:{model_dir}"
+    local = encoder.embeddings
+    assert isinstance(local, LocalEmbeddings)
+    assert local.backend == "onnx"
+    assert local.pooling == "cls"
+    (onnx,) = FakeOnnxEncoder.instances
+    assert onnx.onnx_path == model_dir / "onnx" / "model.onnx"
+    assert onnx.num_threads == 3
+
+    texts = ["a", "abcd", "ab"]
+    embeddings = encoder.embed_documents(texts)
+    # Batched by length, with the document prompt
+    assert onnx.batches == [["passage: abcd", "passage: ab"], ["passage: a"]]
+    for text, embedding in zip(texts, embeddings):
+        expected = np.array([len("passage: " + text), 1.0])
+        assert embedding == pytest.approx(expected / np.linalg.norm(expected))
+
+    assert np.linalg.norm(encoder.embed_query("setup_well")) == pytest.approx(1.0)
+    assert onnx.batches[-1] == ["query: setup_well"]
+
+
+def test_missing_local_model(tmp_path):
+    with pytest.raises(ValueError, match="Local embedding model not found"):
+        retrieval.make_text_encoder(f"local:{tmp_path / 'missing'}")
+
+
+def test_mean_pooling_ignores_padding():
+    hidden_states = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]])
+    attention_mask = np.array([[1, 1, 0]])
+    assert pool(hidden_states, attention_mask, "mean").tolist() == [[2.0, 3.0]]
+    assert pool(hidden_states, attention_mask, "cls").tolist() == [[1.0, 2.0]]
@@ -0,0 +1,49 @@
+from jutulgpt.rag.manifest import FileEntry, SourceManifest
+
+
+def _manifest(split_func="split", deduplication="", **files) -> SourceManifest:
+    return SourceManifest(
+        split_func=split_func,
+        files={path: FileEntry(1, 0.0, sha) for path, sha in files.items()},
+        deduplication=deduplication,
+    )
+
+
+def test_diff_added_changed_removed():
+    old = _manifest(a="1", b="2", c="3")
+    new = _manifest(a="1", b="changed", d="4")
+    diff = old.diff(new)
+    assert diff.added == ["d"]
+    assert diff.changed == ["b"]
+    assert diff.removed == ["c"]
+    assert not diff.is_empty
+
+
+def test_diff_of_identical_manifests_is_empty():
+    assert _manifest(a="1").diff(_manifest(a="1")).is_empty
+
+
+def test_new_split_func_or_deduplication_changes_every_file():
+    old = _manifest(a="1", b="2")
+    assert old.diff(_manifest(split_func="other", a="1", b="2")).changed == ["a", "b"]
+    assert old.diff(_manifest(deduplication="other", a="1", b="2")).changed == [
+        "a",
+        "b",
+    ]
+
+
+def test_fingerprint():
+    assert _manifest(a="1").fingerprint() == _manifest(a="1").fingerprint()
+    assert _manifest(a="1").fingerprint() != _manifest(a="2").fingerprint()
+    assert (
+        _manifest(a="1").fingerprint()
+        != _manifest(deduplication="other", a="1").fingerprint()
+    )
+
+
+def test_save_and_load(tmp_path):
+    manifest = _manifest(deduplication="threshold=0.85", a="1")
+    path = str(tmp_path / "manifest.json")
+    manifest.save(path)
+    assert SourceManifest.load(path) == manifest
+    assert SourceManifest.load(str(tmp_path / "missing.json")) is None
@@ -0,0 +1,28 @@
+import numpy as np
+
+from jutulgpt.rag.mmr import maximal_marginal_relevance
+
+
+def test_selects_most_relevant_first():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.0, 1.0], [1.0, 0.1], [0.7, 0.7]])
+    assert maximal_marginal_relevance(query, candidates, k=1)[0] == 1
+
+
+def test_skips_duplicates_of_selected():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([[1.0, 0.1, 0.0], [1.0, 0.1, 0.0], [0.8, 0.0, 0.6]])
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_only_relevance_with_lambda_one():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([[1.0, 0.1, 0.0], [1.0, 0.1, 0.0], [0.8, 0.0, 0.6]])
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+
+
+def test_k_larger_than_candidates_and_empty():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[1.0, 0.0], [0.0, 1.0]])
+    assert sorted(maximal_marginal_relevance(query, candidates, k=5)) == [0, 1]
+    assert maximal_marginal_relevance(query, np.zeros((0, 2)), k=3) == []
@@ -0,0 +1,58 @@
+import random
+
+from langchain_core.documents import Document
+
+from jutulgpt.rag.near_duplicates import (
+    DUPLICATE_SOURCES_KEY,
+    N_DUPLICATES_KEY,
+    find_near_duplicate_clusters,
+    remove_near_duplicates,
+)
+
+
+def _words(seed: int, n: int = 300) -> list[str]:
+    rng = random.Random(seed)
+    return [f"w{rng.randrange(5000)}" for _ in range(n)]
+
+
+def _mutate(words: list[str], n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    words = list(words)
+    for i in rng.sample(range(len(words)), n):
+        words[i] = f"x{rng.randrange(5000)}"
+    return words
+
+
+def test_identical_texts_are_clustered():
+    text = " ".join(_words(0))
+    clusters = find_near_duplicate_clusters([text, " ".join(_words(1)), text])
+    assert clusters == [[0, 2]]
+
+
+def test_different_texts_are_not_clustered():
+    texts = [" ".join(_words(seed)) for seed in range(5)]
+    assert find_near_duplicate_clusters(texts) == []
+
+
+def test_clusters_do_not_chain():
+    # b is near-identical to a and to c, but c is too far from a, the representative
+    a = _words(0)
+    b = _mutate(a, 5, seed=1)
+    c = _mutate(b, 5, seed=2) + ["end"]
+    clusters = find_near_duplicate_clusters([" ".join(a), " ".join(b), " ".join(c)])
+    assert clusters == [[0, 1]]
+
+
+def test_remove_near_duplicates_keeps_longest_with_provenance():
+    text = " ".join(_words(0))
+    chunks = [
+        Document(page_content=text, metadata={"source": "a.jl"}),
+        Document(page_content="something else entirely", metadata={"source": "b.jl"}),
+        Document(page_content=text + " extra", metadata={"source": "c.jl"}),
+    ]
+    kept = remove_near_duplicates(chunks)
+    assert [chunk.metadata["source"] for chunk in kept] == ["b.jl", "c.jl"]
+    assert kept[1].metadata[DUPLICATE_SOURCES_KEY] == "a.jl"
+    assert kept[1].metadata[N_DUPLICATES_KEY] == 1
+    # The input chunks are not modified
+    assert DUPLICATE_SOURCES_KEY not in chunks[2].metadata
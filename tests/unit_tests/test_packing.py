@@ -0,0 +1,40 @@
+from langchain_core.documents import Document
+
+from jutulgpt.rag.packing import N_TOKENS_KEY, pack_chunks, split_blocks
+
+
+def _doc(text: str, n_tokens: int) -> Document:
+    return Document(page_content=text, metadata={N_TOKENS_KEY: n_tokens})
+
+
+def test_split_blocks_keeps_end_with_its_block():
+    text = "function f()\n    1\nend\nx = f()"
+    assert split_blocks(text) == ["function f()\n    1\nend", "x = f()"]
+
+
+def test_packs_in_rank_order_within_budget():
+    docs = [_doc("a", 100), _doc("b", 100), _doc("c", 100)]
+    packed = pack_chunks(docs, token_budget=250, min_trimmed_tokens=1000)
+    assert [doc.page_content for doc in packed.docs] == ["a", "b"]
+    assert packed.dropped == [docs[2]]
+    assert packed.n_tokens == 200
+
+
+def test_smaller_chunk_further_down_still_fits():
+    docs = [_doc("a", 100), _doc("b", 500), _doc("c", 50)]
+    packed = pack_chunks(docs, token_budget=200, min_trimmed_tokens=1000)
+    assert [doc.page_content for doc in packed.docs] == ["a", "c"]
+
+
+def test_best_chunk_is_always_included_trimmed():
+    text = "\n".join(f"x{i} = {i}" for i in range(200))
+    packed = pack_chunks([_doc(text, 2000)], token_budget=100)
+    assert len(packed.docs) == 1
+    assert packed.trimmed
+    assert packed.docs[0].page_content.endswith("# [...]")
+    assert packed.docs[0].metadata[N_TOKENS_KEY] <= 100
+    assert "trimmed 1" in packed.summary()
+
+
+def test_summary_is_empty_when_everything_fits():
+    assert pack_chunks([_doc("a", 10)], token_budget=1000).summary() == ""
@@ -0,0 +1,65 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from jutulgpt.rag.registry import VectorStoreKey, VectorStoreRegistry
+
+
+def _key(collection_name: str) -> VectorStoreKey:
+    return VectorStoreKey("faiss", collection_name, f"/tmp/{collection_name}", "model")
+
+
+def test_different_keys_load_concurrently():
+    registry = VectorStoreRegistry()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def factory(name):
+        # Only returns when both factories run at the same time
+        barrier.wait()
+        return name
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(
+                registry.get_vectorstore, _key(name), lambda name=name: factory(name)
+            )
+            for name in ("docs", "examples")
+        ]
+        assert [future.result() for future in futures] == ["docs", "examples"]
+
+
+def test_same_key_is_loaded_once():
+    registry = VectorStoreRegistry()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def factory():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(registry.get_vectorstore, _key("docs"), factory)
+        started.wait(timeout=5)
+        others = [
+            executor.submit(registry.get_vectorstore, _key("docs"), factory)
+            for _ in range(3)
+        ]
+        release.set()
+        results = [first.result()] + [future.result() for future in others]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_entry_dropped_while_loading_is_not_kept():
+    registry = VectorStoreRegistry()
+
+    def factory():
+        registry.invalidate(collection_name="docs")
+        return object()
+
+    first = registry.get_vectorstore(_key("docs"), factory)
+    second = registry.get_vectorstore(_key("docs"), object)
+    assert first is not second
@@ -0,0 +1,118 @@
+import pytest
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from jutulgpt.configuration import BaseConfiguration
+from jutulgpt.rag import rerank, retrieval
+from jutulgpt.rag.registry import VectorStoreKey, registry
+from jutulgpt.rag.rerank import FlashRerankRetriever, RerankScoreCache
+
+
+class ListRetriever(BaseRetriever):
+    """Returns the first `k` documents, ignoring the query."""
+
+    documents: list[Document]
+    k: int
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self.documents[: self.k]
+
+
+class StubRanker:
+    """Scores a passage by the number of times the query occurs in it."""
+
+    def __init__(self):
+        self.passages: list[str] = []
+
+    def rerank(self, request):
+        self.passages.extend(passage["id"] for passage in request.passages)
+        return [
+            {**passage, "score": passage["text"].count(request.query)}
+            for passage in request.passages
+        ]
+
+
+DOCUMENTS = [
+    Document(id=f"doc{i}", page_content=text, metadata={"source": f"{i}.md"})
+    for i, text in enumerate(
+        [
+            "unrelated",
+            "setup_well",
+            "setup_well setup_well setup_well",
+            "nothing here",
+            "setup_well setup_well",
+            "setup_well setup_well setup_well setup_well",
+        ]
+    )
+]
+
+
+@pytest.fixture
+def ranker(monkeypatch):
+    ranker = StubRanker()
+    monkeypatch.setattr(rerank, "get_ranker", lambda model: ranker)
+    monkeypatch.setattr(rerank, "score_cache", RerankScoreCache())
+    yield ranker
+    registry.clear()
+
+
+@pytest.fixture
+def base_kwargs(monkeypatch):
+    base_kwargs = []
+
+    def get_base_retriever(configuration, spec, search_type, search_kwargs):
+        base_kwargs.append(search_kwargs)
+        return ListRetriever(documents=DOCUMENTS, k=search_kwargs["k"])
+
+    monkeypatch.setattr(retrieval, "_get_base_retriever", get_base_retriever)
+    monkeypatch.setattr(
+        retrieval,
+        "get_vectorstore_key",
+        lambda configuration, spec: VectorStoreKey("faiss", "docs", "/tmp/docs", "m"),
+    )
+    return base_kwargs
+
+
+def test_rerank_retriever_reorders_and_keeps_top_n(ranker, base_kwargs):
+    configuration = BaseConfiguration(
+        rerank_provider="flash", rerank_kwargs={"top_n": 2, "candidates": 5}
+    )
+    retriever = retrieval._get_flash_rerank_retriever(
+        configuration, None, "similarity", {"k": 4}
+    )
+    assert isinstance(retriever, FlashRerankRetriever)
+    assert base_kwargs == [{"k": 5, "fetch_k": 5}]
+
+    found = retriever.invoke("setup_well")
+    # The best two of the five candidates, the last document is not a candidate
+    assert [doc.id for doc in found] == ["doc2", "doc4"]
+    assert [doc.metadata["relevance_score"] for doc in found] == [3.0, 2.0]
+    assert found[0].metadata["source"] == "2.md"
+
+
+def test_rerank_scores_are_cached(ranker):
+    retriever = FlashRerankRetriever(
+        base_retriever=ListRetriever(documents=DOCUMENTS, k=3), top_n=3
+    )
+    retriever.invoke("setup_well")
+    assert ranker.passages == ["doc0", "doc1", "doc2"]
+
+    retriever.base_retriever.k = 5
+    retriever.invoke("  Setup_Well ")
+    assert ranker.passages == ["doc0", "doc1", "doc2", "doc3", "doc4"]
+
+
+def test_score_threshold(ranker):
+    retriever = FlashRerankRetriever(
+        base_retriever=ListRetriever(documents=DOCUMENTS, k=6),
+        top_n=5,
+        score_threshold=2,
+    )
+    assert [doc.id for doc in retriever.invoke("setup_well")] == [
+        "doc5",
+        "doc2",
+        "doc4",
+    ]
@@ -0,0 +1,77 @@
+import math
+
+from langchain_core.documents import Document
+
+from jutulgpt.rag.semantic_cache import SemanticResultCache, result_cache_namespace
+
+RESULTS = [Document(page_content="setup_well(g, 1)", metadata={"source": "a.jl"})]
+
+
+def _rotated(angle: float) -> list[float]:
+    """Unit vector with the given angle to [1, 0, 0]."""
+    return [math.cos(angle), math.sin(angle), 0.0]
+
+
+def test_hit_above_threshold():
+    cache = SemanticResultCache()
+    cache.add("docs", 1, [2.0, 0.0, 0.0], RESULTS)
+
+    # The cosine similarity is 0.98, and the embeddings need not be normalized
+    found = cache.lookup("docs", 1, [3 * x for x in _rotated(0.2)], threshold=0.95)
+    assert found == RESULTS
+    found.clear()  # The cached results are not shared with the caller
+    assert cache.lookup("docs", 1, [1.0, 0.0, 0.0], threshold=0.95) == RESULTS
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_miss_below_threshold():
+    cache = SemanticResultCache()
+    assert cache.lookup("docs", 1, [1.0, 0.0, 0.0], threshold=0.95) is None
+    cache.add("docs", 1, [1.0, 0.0, 0.0], RESULTS)
+
+    # The cosine similarity is 0.92
+    assert cache.lookup("docs", 1, _rotated(0.4), threshold=0.95) is None
+    assert cache.lookup("docs", 1, _rotated(0.4), threshold=0.9) == RESULTS
+    # A threshold above 1 disables the cache
+    assert cache.lookup("docs", 1, [1.0, 0.0, 0.0], threshold=1.01) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_closest_query_is_used():
+    cache = SemanticResultCache()
+    other = [Document(page_content="simulate_reservoir(state0, model, dt)")]
+    cache.add("docs", 1, _rotated(0.1), RESULTS)
+    cache.add("docs", 1, _rotated(-0.05), other)
+    assert cache.lookup("docs", 1, [1.0, 0.0, 0.0], threshold=0.9) == other
+
+
+def test_invalidated_by_new_index_version():
+    cache = SemanticResultCache()
+    cache.add("docs", 1, [1.0, 0.0, 0.0], RESULTS)
+    assert cache.lookup("docs", 2, [1.0, 0.0, 0.0], threshold=0.95) is None
+    # The entries of the old version are dropped
+    assert cache.lookup("docs", 1, [1.0, 0.0, 0.0], threshold=0.95) is None
+
+    cache.add("docs", 1, [1.0, 0.0, 0.0], RESULTS)
+    cache.clear()
+    assert cache.lookup("docs", 1, [1.0, 0.0, 0.0], threshold=0.95) is None
+
+
+def test_namespaces_are_separate_and_bounded():
+    cache = SemanticResultCache(max_namespaces=2, max_entries_per_namespace=1)
+    docs = result_cache_namespace("docs", {"k": 3})
+    examples = result_cache_namespace("examples", {"k": 3})
+    assert docs != result_cache_namespace("docs", {"k": 4})
+
+    cache.add(docs, 1, [1.0, 0.0, 0.0], RESULTS)
+    assert cache.lookup(examples, 1, [1.0, 0.0, 0.0], threshold=0.95) is None
+    assert cache.lookup(docs, 1, [1.0, 0.0, 0.0], threshold=0.95) == RESULTS
+
+    # Only the newest query of a namespace is kept
+    cache.add(docs, 1, [0.0, 1.0, 0.0], RESULTS)
+    assert cache.lookup(docs, 1, [1.0, 0.0, 0.0], threshold=0.95) is None
+
+    # The least recently used namespace is dropped
+    cache.lookup(examples, 1, [1.0, 0.0, 0.0], threshold=0.95)
+    cache.add(result_cache_namespace("guide"), 1, [0.0, 1.0, 0.0], RESULTS)
+    assert cache.lookup(docs, 1, [0.0, 1.0, 0.0], threshold=0.95) is None
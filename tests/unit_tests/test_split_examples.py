@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+
+from jutulgpt.rag.split_examples import _n_tokens, split_julia_examples
+
+
+def _split(text: str, **kwargs) -> list[Document]:
+    return split_julia_examples(
+        Document(page_content=text, metadata={"source": "example.jl"}), **kwargs
+    )
+
+
+def test_headings_start_new_chunks():
+    chunks = _split("using JutulDarcy\nx = 1\n# # First\ny = 2\n# # Second\nz = 3\n")
+    assert [chunk.metadata["heading"] for chunk in chunks] == [None, "First", "Second"]
+    assert chunks[1].page_content == "# # First\ny = 2"
+    assert all(chunk.metadata["source"] == "example.jl" for chunk in chunks)
+
+
+def test_blocks_are_not_cut():
+    text = "function f(x)\n    if x > 0\n        return x\n    end\n    return -x\nend\ny = f(1)\n"
+    chunks = _split(text, min_tokens=1, max_tokens=30)
+    assert any(chunk.page_content.startswith("function f(x)") for chunk in chunks)
+    function_chunk = next(c for c in chunks if c.page_content.startswith("function"))
+    assert function_chunk.page_content.splitlines()[-1] in ("end", "y = f(1)")
+
+
+def test_small_piece_is_merged_within_its_section():
+    long_line = "x = " + " + ".join(f"a{i}" for i in range(60))
+    text = f"# # Setup\n{long_line}\n{long_line}\ny = 1\n"
+    chunks = _split(text, min_tokens=20, max_tokens=400)
+    assert len(chunks) == 1
+    assert chunks[0].page_content.endswith("y = 1")
+
+
+def test_small_piece_is_not_merged_across_headings():
+    long_line = "x = " + " + ".join(f"a{i}" for i in range(60))
+    text = f"# # Setup\n{long_line}\n# # Run\ny = 1\n"
+    chunks = _split(text, min_tokens=20, max_tokens=400)
+    assert [chunk.metadata["heading"] for chunk in chunks] == ["Setup", "Run"]
+    assert chunks[1].page_content == "# # Run\ny = 1"
+
+
+def test_large_section_is_not_merged_into_small_previous_section():
+    long_line = "x = " + " + ".join(f"a{i}" for i in range(60))
+    text = f"using JutulDarcy\n# # Setup\n{long_line}\n"
+    chunks = _split(text, min_tokens=20, max_tokens=400)
+    assert [chunk.page_content for chunk in chunks] == [
+        "using JutulDarcy",
+        f"# # Setup\n{long_line}",
+    ]
+    assert [chunk.metadata["heading"] for chunk in chunks] == [None, "Setup"]
+
+
+def test_chunks_respect_max_tokens():
+    text = "\n".join(
+        f"x{i} = " + " + ".join(f"a{j}" for j in range(10)) for i in range(100)
+    )
+    chunks = _split(text, min_tokens=10, max_tokens=120)
+    assert len(chunks) > 1
+    assert all(_n_tokens(chunk.page_content.splitlines()) <= 120 for chunk in chunks)
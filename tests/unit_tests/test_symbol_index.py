@@ -0,0 +1,131 @@
+import json
+from dataclasses import asdict
+from types import SimpleNamespace
+
+import pytest
+
+from jutulgpt.julia import symbol_index
+from jutulgpt.julia.symbol_index import (
+    JuliaSymbol,
+    SymbolIndex,
+    find_undefined_names,
+    format_symbol_suggestions,
+)
+
+SYMBOLS = [
+    JuliaSymbol(
+        "JutulDarcy", "setup_reservoir_model", "function", "setup_reservoir_model(...)"
+    ),
+    JuliaSymbol(
+        "JutulDarcy", "setup_reservoir_state", "function", "setup_reservoir_state(...)"
+    ),
+    JuliaSymbol(
+        "JutulDarcy", "simulate_reservoir", "function", "simulate_reservoir(...)"
+    ),
+    JuliaSymbol("JutulDarcy", "setup_well", "function", "setup_well(...)"),
+    JuliaSymbol("Jutul", "CartesianMesh", "type", "CartesianMesh"),
+    JuliaSymbol("Jutul", "si_unit", "function", "si_unit(...)"),
+]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = SymbolIndex(SYMBOLS)
+    monkeypatch.setattr(symbol_index, "_symbol_index", index)
+    monkeypatch.setattr(symbol_index, "_symbol_index_failed_at", None)
+    return index
+
+
+def test_lookup(index):
+    assert "setup_well" in index
+    assert "setup_wells" not in index
+    assert [symbol.module for symbol in index.lookup("si_unit")] == ["Jutul"]
+    assert index.lookup("missing") == []
+
+
+def test_suggest_close_names(index):
+    assert index.suggest("setup_reservoir_modl", n=1)[0].name == "setup_reservoir_model"
+    assert index.suggest("CartesianMsh", n=1)[0].name == "CartesianMesh"
+    assert index.suggest("simulate_reservoirs", n=1)[0].name == "simulate_reservoir"
+    assert "setup_well" not in [s.name for s in index.suggest("setup_well")]
+    assert index.suggest("xyz") == []
+
+
+def test_find_undefined_names():
+    message = (
+        "ERROR: UndefVarError: `setup_reservoir_modl` not defined\n"
+        "UndefVarError: JutulDarcy.simulate_reservoirs not defined\n"
+        "Missing reference: CartesianMsh\n"
+        "UndefVarError: `setup_reservoir_modl` not defined"
+    )
+    assert find_undefined_names(message) == [
+        "setup_reservoir_modl",
+        "simulate_reservoirs",
+        "CartesianMsh",
+    ]
+
+
+def test_format_symbol_suggestions(index):
+    text = format_symbol_suggestions(["setup_reservoir_modl", "xyz"], n=2)
+    assert text.startswith("## Suggestions for undefined names:")
+    assert "`setup_reservoir_modl` is not defined" in text
+    assert "`setup_reservoir_model(...)` (JutulDarcy)" in text
+    assert "xyz" not in text
+    assert format_symbol_suggestions(["xyz"]) == ""
+    assert format_symbol_suggestions([]) == ""
+
+
+def test_find_package_functions(index):
+    code = (
+        "model = setup_reservoir_model(domain)\nsi_unit(:day)\nsetup_well(g, 1)\nfoo(1)"
+    )
+    assert symbol_index.find_package_functions(code) == [
+        "setup_reservoir_model",
+        "si_unit",
+        "setup_well",
+    ]
+    assert symbol_index.find_package_functions(code, modules=("Jutul",)) == ["si_unit"]
+
+
+def test_parse_symbol_output():
+    output = (
+        "Precompiling...\nSYMBOLS:\nJutul\tsi_unit\tfunction\tsi_unit(...)\nbad line"
+    )
+    assert symbol_index._parse_symbol_output(output) == [SYMBOLS[-1]]
+    assert symbol_index._parse_symbol_output("no symbols") == []
+
+
+def test_cache_is_keyed_on_the_julia_environment(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "Project.toml").write_text('[deps]\nJutulDarcy = "1"\n')
+    path = str(tmp_path / "symbols.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "environment": symbol_index.julia_environment_fingerprint(),
+                "symbols": [asdict(symbol) for symbol in SYMBOLS],
+            },
+            f,
+        )
+    assert len(symbol_index.load_symbol_index(path)) == len(SYMBOLS)
+
+    (tmp_path / "Manifest.toml").write_text("# Other package versions\n")
+    assert symbol_index.load_symbol_index(path) is None
+
+
+def test_failed_listing_is_retried_later(monkeypatch):
+    monkeypatch.setattr(symbol_index, "_symbol_index", None)
+    monkeypatch.setattr(symbol_index, "_symbol_index_failed_at", None)
+    monkeypatch.setattr(symbol_index, "load_symbol_index", lambda: None)
+    results = [SymbolIndex([]), SymbolIndex(SYMBOLS)]
+    monkeypatch.setattr(symbol_index, "build_symbol_index", lambda: results.pop(0))
+    now = [1000.0]
+    monkeypatch.setattr(symbol_index, "time", SimpleNamespace(monotonic=lambda: now[0]))
+
+    assert len(symbol_index.get_symbol_index()) == 0
+    now[0] += 1
+    assert len(symbol_index.get_symbol_index()) == 0
+    assert len(results) == 1  # Not listed again yet
+
+    now[0] += symbol_index.SYMBOL_INDEX_RETRY_SECONDS + 1
+    assert len(symbol_index.get_symbol_index()) == len(SYMBOLS)